@@ -0,0 +1,387 @@
+"""Admission control: concurrency limits with bounded priority queues.
+
+Each limited endpoint and backend has a Limiter. A request that finds no free
+slot waits in that limiter's queue, ordered by priority (live calls first),
+until a slot frees up or its deadline passes. When a queue is full, the
+newest lowest-priority waiter is shed to make room for more urgent work, or
+the newcomer is turned away at once. Callers get Overloaded, which the apps
+turn into 429/503 with Retry-After, so an overload costs batch traffic a fast
+retry rather than costing live calls their latency.
+
+Limits are per worker process, like the other stats.
+"""
+import os
+import math
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager, asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+PRIORITIES = {"live": 0, "interactive": 1, "batch": 2}
+
+# Path -> (limiter, priority class). Unlisted paths (health, audio, stats, job status) are never limited.
+# Jobs and batches only hold their endpoint slot while submitting; their renders take backend slots
+# at batch priority through batch_slot().
+ENDPOINTS = {
+    "/vapi-webhook": ("vapi-webhook", "live"),
+    "/generate": ("generate", "interactive"),
+    "/tts/stream": ("tts", "interactive"),
+    "/stt/stream": ("stt-stream", "interactive"),
+    "/tts": ("tts", "batch"),
+    "/stt": ("stt", "batch"),
+    "/tts/batch": ("tts-batch", "batch"),
+    "/stt/jobs": ("stt-jobs", "batch")
+}
+
+
+def _parse(value):
+    result = {}
+    for part in value.split(","):
+        name, _, number = part.partition("=")
+        if name.strip() and number.strip():
+            result[name.strip()] = float(number)
+    return result
+
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+ADMISSION_ENDPOINT_LIMITS = _parse(os.getenv(
+    "ADMISSION_ENDPOINT_LIMITS", "vapi-webhook=64,generate=32,tts=16,stt=8,stt-stream=16,tts-batch=4,stt-jobs=4"))
+# Local Whisper defaults to one decode per pooled model instance
+ADMISSION_BACKEND_LIMITS = dict(
+    {"whisper": int(os.getenv("WHISPER_POOL_SIZE", 1)), "google": 8, "gtts": 4, "assemblyai": 32, "elevenlabs": 16,
+     # stt_jobs' spawned processes, each with its own model; not the in-process whisper pool
+     "whisper-jobs": int(os.getenv("STT_JOB_PROCESSES", 2))},
+    **_parse(os.getenv("ADMISSION_BACKEND_LIMITS", ""))
+)
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", 32))
+# Seconds a request may wait for a slot, by priority class
+ADMISSION_TIMEOUTS = dict({"live": 5.0, "interactive": 10.0, "batch": 20.0},
+                          **_parse(os.getenv("ADMISSION_TIMEOUTS", "")))
+# Share of a limiter's slots batch work may hold, so live calls always find one free.
+# Batch work still gets one slot, so a limit of 1 (e.g. the default whisper) reserves nothing.
+ADMISSION_BATCH_SHARE = float(os.getenv("ADMISSION_BATCH_SHARE", 0.75))
+# Limiters only background work uses, where holding back a share for live calls would only idle slots
+BATCH_ONLY = {"whisper-jobs"}
+
+_priority = contextvars.ContextVar("admission_priority", default=None)
+
+
+class Overloaded(Exception):
+    """No capacity for this request; status is 429 (queue full) or 503 (timed out or shed)."""
+
+    def __init__(self, message, status=503, retry_after=1):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("priority", "notify", "granted", "done", "shed")
+
+    def __init__(self, priority, notify):
+        self.priority = priority
+        self.notify = notify
+        self.granted = False
+        self.done = False
+        self.shed = False
+
+
+class Limiter:
+    """At most `limit` holders; others wait in a bounded queue, best priority first."""
+
+    def __init__(self, name, limit, queue_size=ADMISSION_QUEUE_SIZE, batch_share=ADMISSION_BATCH_SHARE):
+        self.name = name
+        self.limit = max(1, int(limit))
+        self.queue_size = queue_size
+        self.batch_share = batch_share
+        self._lock = threading.Lock()
+        self._active = 0
+        self._queued = 0
+        self._waiters = []  # heap of (priority, seq, waiter); finished waiters are dropped lazily
+        self._seq = itertools.count()
+        self._hold = None  # moving average of seconds a slot is held
+        self.counts = {"admitted": 0, "queued": 0, "rejected": 0, "timed_out": 0, "shed": 0}
+
+    def _cap(self, priority):
+        if priority >= PRIORITIES["batch"]:
+            return max(1, int(self.limit * self.batch_share))
+        return self.limit
+
+    def _ahead(self, priority):
+        # Waiters that a newcomer of this priority must not overtake
+        while self._waiters and self._waiters[0][2].done:
+            heapq.heappop(self._waiters)
+        return bool(self._waiters) and self._waiters[0][0] <= priority
+
+    def has_capacity(self, priority=None):
+        priority = current_priority() if priority is None else priority
+        with self._lock:
+            return self._active < self._cap(priority) and not self._ahead(priority)
+
+    def retry_after(self):
+        # Time for the queue ahead to drain through the slots, at least a second
+        hold = self._hold or 1.0
+        return max(1, math.ceil(hold * (self._queued + 1) / self.limit))
+
+    def _enter(self, priority, notify):
+        """Take a slot now (returns None) or queue a waiter (returns it); raises when full."""
+        with self._lock:
+            if self._active < self._cap(priority) and not self._ahead(priority):
+                self._active += 1
+                self.counts["admitted"] += 1
+                return None
+
+            if self._queued >= self.queue_size:
+                live = [w for w in self._waiters if not w[2].done]
+                worst = max(live, key=lambda w: (w[0], w[1])) if live else None
+                if worst is None or worst[0] <= priority:
+                    self.counts["rejected"] += 1
+                    raise Overloaded(f"{self.name} is at capacity", 429, self.retry_after())
+                # Make room by turning away the newest of the least urgent waiters
+                victim = worst[2]
+                victim.done = victim.shed = True
+                self._queued -= 1
+                self.counts["shed"] += 1
+                victim.notify()
+
+            waiter = _Waiter(priority, notify)
+            heapq.heappush(self._waiters, (priority, next(self._seq), waiter))
+            self._queued += 1
+            self.counts["queued"] += 1
+            return waiter
+
+    def _give_up(self, waiter):
+        """After a wait ends: True if the slot was granted after all, else raise."""
+        with self._lock:
+            if waiter.granted:
+                return True
+            if not waiter.done:
+                waiter.done = True
+                self._queued -= 1
+                self.counts["timed_out"] += 1
+            retry_after = self.retry_after()
+        if waiter.shed:
+            raise Overloaded(f"{self.name} shed this request for more urgent work", 503, retry_after)
+        raise Overloaded(f"Timed out waiting for {self.name}", 503, retry_after)
+
+    def _grant(self):
+        # Lock held
+        while self._waiters:
+            priority, _, waiter = self._waiters[0]
+            if waiter.done:
+                heapq.heappop(self._waiters)
+                continue
+            if self._active >= self._cap(priority):
+                return
+            heapq.heappop(self._waiters)
+            waiter.done = waiter.granted = True
+            self._queued -= 1
+            self._active += 1
+            self.counts["admitted"] += 1
+            waiter.notify()
+
+    def release(self, held=None):
+        with self._lock:
+            self._active -= 1
+            if held is not None:
+                self._hold = held if self._hold is None else 0.8 * self._hold + 0.2 * held
+            self._grant()
+
+    def acquire(self, priority=None, timeout=None):
+        priority = current_priority() if priority is None else priority
+        event = threading.Event()
+        waiter = self._enter(priority, event.set)
+        if waiter is None:
+            return
+        event.wait(_timeout(priority) if timeout is None else timeout)
+        self._give_up(waiter)
+
+    async def acquire_async(self, priority=None, timeout=None):
+        priority = current_priority() if priority is None else priority
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def notify():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        waiter = self._enter(priority, notify)
+        if waiter is None:
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(future), _timeout(priority) if timeout is None else timeout)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            # Client went away: hand back a slot granted meanwhile, or leave the queue
+            if self._give_up_quietly(waiter):
+                self.release()
+            raise
+        self._give_up(waiter)
+
+    def _give_up_quietly(self, waiter):
+        try:
+            return self._give_up(waiter)
+        except Overloaded:
+            return False
+
+    @contextmanager
+    def slot(self, priority=None, timeout=None):
+        self.acquire(priority, timeout)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - start)
+
+    @asynccontextmanager
+    async def slot_async(self, priority=None, timeout=None):
+        await self.acquire_async(priority, timeout)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - start)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts, limit=self.limit, active=self._active, queued=self._queued,
+                        batch_limit=self._cap(PRIORITIES["batch"]),
+                        hold_seconds=round(self._hold, 3) if self._hold is not None else None)
+
+
+def _timeout(priority):
+    name = next((n for n, p in PRIORITIES.items() if p == priority), "batch")
+    return ADMISSION_TIMEOUTS.get(name, ADMISSION_TIMEOUTS["batch"])
+
+
+def current_priority():
+    """Priority of the request being handled; work outside a request counts as interactive."""
+    priority = _priority.get()
+    return PRIORITIES["interactive"] if priority is None else priority
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def _get(kind, name, limits):
+    if not ADMISSION_ENABLED or name not in limits:
+        return None
+    with _limiters_lock:
+        limiter = _limiters.get((kind, name))
+        if limiter is None:
+            limiter = _limiters[(kind, name)] = Limiter(f"{kind} {name}", limits[name],
+                                                        batch_share=1.0 if name in BATCH_ONLY else ADMISSION_BATCH_SHARE)
+    return limiter
+
+
+def backend_limiter(name):
+    """Shared limiter for a backend (e.g. whisper), or None when it is unlimited."""
+    return _get("backend", name, ADMISSION_BACKEND_LIMITS)
+
+
+@contextmanager
+def batch_slot(backend):
+    """Hold a slot of a backend's limiter for background work (jobs, batches).
+
+    At batch priority, so live calls go first; an overload means asking again
+    after Retry-After rather than failing the job.
+    """
+    limiter = backend_limiter(backend)
+    if limiter is None:
+        yield
+        return
+    while True:
+        try:
+            limiter.acquire(PRIORITIES["batch"])
+            break
+        except Overloaded as e:
+            time.sleep(e.retry_after)
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        limiter.release(time.monotonic() - start)
+
+
+@asynccontextmanager
+async def batch_slot_async(backend):
+    limiter = backend_limiter(backend)
+    if limiter is None:
+        yield
+        return
+    while True:
+        try:
+            await limiter.acquire_async(PRIORITIES["batch"])
+            break
+        except Overloaded as e:
+            await asyncio.sleep(e.retry_after)
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        limiter.release(time.monotonic() - start)
+
+
+def _endpoint(path):
+    limiter_name, priority_class = ENDPOINTS.get(path, (None, None))
+    if limiter_name is None:
+        return None, None
+    return _get("endpoint", limiter_name, ADMISSION_ENDPOINT_LIMITS), PRIORITIES[priority_class]
+
+
+class Ticket:
+    """An admitted request; release() frees its endpoint slot and priority."""
+
+    def __init__(self, limiter, token):
+        self.limiter = limiter
+        self.token = token
+        self.start = time.monotonic()
+
+    def release(self):
+        if self.limiter is not None:
+            self.limiter.release(time.monotonic() - self.start)
+        try:
+            _priority.reset(self.token)
+        except ValueError:
+            # Released from another context (e.g. the end of a streamed response)
+            _priority.set(None)
+
+
+def admitted():
+    return _priority.get() is not None
+
+
+def admit(path):
+    """Admit a request for `path`, waiting for a slot if needed; returns a Ticket or raises Overloaded."""
+    limiter, priority = _endpoint(path)
+    if priority is None:
+        return None
+    if limiter is not None:
+        limiter.acquire(priority)
+    return Ticket(limiter, _priority.set(priority))
+
+
+async def admit_async(path):
+    limiter, priority = _endpoint(path)
+    if priority is None:
+        return None
+    if limiter is not None:
+        await limiter.acquire_async(priority)
+    return Ticket(limiter, _priority.set(priority))
+
+
+def stats():
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {
+        "enabled": ADMISSION_ENABLED,
+        "endpoints": {name: l.stats() for (kind, name), l in limiters.items() if kind == "endpoint"},
+        "backends": {name: l.stats() for (kind, name), l in limiters.items() if kind == "backend"}
+    }
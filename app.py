@@ -1,25 +1,84 @@
-from flask import Flask, request, jsonify, send_from_directory
+import time
+_import_start = time.perf_counter()
+
+from flask import Flask, Response, g, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
 import os
-import tempfile
 import logging
+import itertools
 from dotenv import load_dotenv
-import nltk
-
+import warmup
+import metrics
+import admission
 
-nltk.download('punkt', quiet=True) 
 # Initialize
 load_dotenv()
 app = Flask(__name__)
 CORS(app)  # Allow CORS for all routes
 logging.basicConfig(level=logging.INFO)
+metrics.install_log_context()
 logger = logging.getLogger(__name__)
 
+# --- Request Tracing ---
+# Under asgi.py the ASGI middleware has already opened the trace and timed the request
+@app.before_request
+def begin_trace():
+    if metrics.current_trace() is None:
+        g.trace_token = metrics.start_trace(request.headers.get('X-Request-Id'))
+        g.request_start = time.perf_counter()
+        metrics.add_gauge("http_requests_in_flight", 1)
+
+# --- Admission Control ---
+# Limited endpoints wait for a slot here, live-call webhooks first; asgi.py admits in its own middleware
+@app.before_request
+def admit_request():
+    if request.method != 'OPTIONS' and not admission.admitted():
+        g.admission = admission.admit(request.path)
+
+@app.errorhandler(admission.Overloaded)
+def overloaded(e):
+    response = jsonify({"error": str(e), "status": "overloaded"})
+    response.status_code = e.status
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+@app.after_request
+def record_request(response):
+    response.headers['X-Trace-Id'] = metrics.current_trace()
+    if 'request_start' in g:
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.observe("http_request_duration_seconds", time.perf_counter() - g.request_start,
+                        endpoint=endpoint, method=request.method, status=response.status_code)
+    return response
+
+@app.teardown_request
+def end_trace(exc):
+    ticket = g.pop('admission', None)
+    if ticket is not None:
+        ticket.release()
+    token = g.pop('trace_token', None)
+    if token is not None:
+        metrics.add_gauge("http_requests_in_flight", -1)
+        metrics.end_trace(token)
+
 # --- Health Check Endpoint ---
 @app.route('/health', methods=['GET'])
 def health():
     return jsonify({"status": "ok"})
 
+# --- Readiness Endpoint ---
+# Unlike /health, only reports ready once this worker has warmed its backends
+@app.route('/ready', methods=['GET'])
+def ready():
+    status = warmup.status()
+    return jsonify(status), (200 if warmup.is_ready() else 503)
+
+# --- Loaded Whisper Models ---
+@app.route('/stt/models', methods=['GET'])
+def stt_models():
+    from whisper_stt import model_stats
+    return jsonify({"models": model_stats()})
+
 # --- Speech-to-Text Endpoint ---
 # In app.py, modify the stt() function:
 @app.route('/stt', methods=['POST'])
@@ -28,34 +87,174 @@ def stt():
         return jsonify({"error": "No audio file provided"}), 400
 
     try:
-        # Create a temp file with explicit permissions
-        temp_dir = tempfile.mkdtemp()
-        temp_path = os.path.join(temp_dir, 'audio_input.wav')
-        
-        audio_file = request.files['audio']
-        audio_file.save(temp_path)
-        
-        if os.getenv("ASSEMBLYAI_API_KEY"):
-            from assemblyai_stt import transcribe_audio
-            transcript, lang = transcribe_audio(temp_path)
-        else:
-            from whisper_stt import transcribe_with_confidence
-            transcript, lang = transcribe_with_confidence(temp_path)
-            
-        # Clean up
-        os.remove(temp_path)
-        os.rmdir(temp_dir)
-        
+        from audio_io import load_audio
+        # Decode straight from the upload stream; no temp files on the hot path
+        with load_audio(request.files['audio'].stream) as audio:
+            if os.getenv("ASSEMBLYAI_API_KEY") and request.args.get('mode') == 'async':
+                # Hand the wait to AssemblyAI's webhook instead of holding this worker
+                from assemblyai_stt import submit_transcription
+                base_url = os.getenv('HOSTED_URL', request.host_url).rstrip('/')
+                transcript_id = submit_transcription(audio, f"{base_url}/assemblyai-webhook")
+
+                return jsonify({
+                    "transcript_id": transcript_id,
+                    "result_url": f"{base_url}/stt/result/{transcript_id}",
+                    "trimmed_seconds": round(audio.trimmed_seconds, 2),
+                    "status": "processing"
+                }), 202
+
+            from backend_router import get_router
+            transcript, lang = get_router("stt").call(audio)
+
         return jsonify({
             "text": transcript,
             "language": lang,
+            "trimmed_seconds": round(audio.trimmed_seconds, 2),
             "status": "success"
         })
 
+    except admission.Overloaded:
+        raise
     except Exception as e:
         logger.error(f"STT failed: {str(e)}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
+# --- AssemblyAI Completion Webhook ---
+@app.route('/assemblyai-webhook', methods=['POST'])
+def assemblyai_webhook():
+    from assemblyai_stt import verify_webhook, complete_transcription
+    if not verify_webhook(request.headers):
+        return jsonify({"error": "Unauthorized"}), 401
+
+    data = request.get_json(silent=True) or {}
+    transcript_id = data.get('transcript_id')
+    if not transcript_id:
+        return jsonify({"error": "Missing transcript_id"}), 400
+
+    try:
+        complete_transcription(transcript_id)
+        return jsonify({"status": "handled"})
+    except Exception as e:
+        logger.error(f"AssemblyAI webhook failed: {str(e)}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+# --- Async Transcription Result ---
+@app.route('/stt/result/<transcript_id>', methods=['GET'])
+def stt_result(transcript_id):
+    from assemblyai_stt import load_result, complete_transcription
+    try:
+        # Fall back to asking AssemblyAI if the webhook hasn't landed (or went to another host)
+        result = load_result(transcript_id) or complete_transcription(transcript_id)
+    except Exception as e:
+        logger.error(f"STT result lookup failed: {str(e)}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+    if result.get('status') == 'success':
+        return jsonify(result)
+    if result.get('status') == 'error':
+        return jsonify(result), 500
+    return jsonify({"transcript_id": transcript_id, "status": result.get('status', 'processing')}), 202
+
+# --- Long Audio Transcription Jobs ---
+@app.route('/stt/jobs', methods=['POST'])
+def stt_job_submit():
+    if 'audio' not in request.files:
+        return jsonify({"error": "No audio file provided"}), 400
+
+    from stt_jobs import submit
+    try:
+        job = submit(request.files['audio'].stream, request.form.get('backend'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"STT job submit failed: {str(e)}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+    base_url = os.getenv('HOSTED_URL', request.host_url).rstrip('/')
+    return jsonify({
+        "job_id": job['id'],
+        "backend": job['backend'],
+        "status_url": f"{base_url}/stt/jobs/{job['id']}",
+        "result_url": f"{base_url}/stt/jobs/{job['id']}/result",
+        "status": job['status']
+    }), 202
+
+@app.route('/stt/jobs/<job_id>', methods=['GET'])
+def stt_job_status(job_id):
+    from stt_jobs import load_job
+    job = load_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify({key: job.get(key) for key in
+                    ("id", "status", "backend", "duration", "chunks_total", "chunks_done", "error")})
+
+@app.route('/stt/jobs/<job_id>/result', methods=['GET'])
+def stt_job_result(job_id):
+    from stt_jobs import load_job
+    job = load_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if job['status'] == 'error':
+        return jsonify({"error": job.get('error'), "status": "error"}), 500
+    if job['status'] != 'completed':
+        return jsonify({"job_id": job_id, "status": job['status']}), 202
+    return jsonify({
+        "text": job['text'],
+        "language": job['language'],
+        "duration": job['duration'],
+        "segments": job['segments'],
+        "status": "success"
+    })
+
+# --- Text-to-Speech Helper ---
+def synthesize(text, lang):
+    """Synthesize text through the TTS cache and return the audio filename."""
+    from phrase_bank import lookup
+
+    phrase_file = lookup(text, lang)
+    if phrase_file:
+        return phrase_file
+
+    from backend_router import get_router
+    from audio_delivery import precompute
+    output_file = get_router("tts").call(text, lang)
+    precompute(output_file)
+    return output_file
+
+def synthesize_stream(text, lang):
+    """Like synthesize(), but returns (filename, chunks) so playback can start early."""
+    from tts_cache import stream_or_create, iter_file
+    from phrase_bank import lookup
+
+    phrase_file = lookup(text, lang)
+    if phrase_file:
+        return phrase_file, iter_file(os.path.join("audio_outputs", phrase_file))
+
+    def elevenlabs():
+        from elevenlabs_tts import stream_speech, get_voice_id, get_voice_settings, MODEL_ID
+        from http_transport import HTTP_LIVE_MAX_RETRIES
+        return stream_or_create(text, lang, get_voice_id(lang, text), MODEL_ID, get_voice_settings(lang, text),
+                                lambda path: stream_speech(text, lang, path, max_retries=HTTP_LIVE_MAX_RETRIES))
+
+    def gtts():
+        def stream(path):
+            from gtts import gTTS
+            with open(path, "wb") as f:
+                for chunk in gTTS(text=text, lang=lang).stream():
+                    f.write(chunk)
+                    yield chunk
+        return stream_or_create(text, lang, "gtts", "gtts", None, stream)
+
+    def primed(backend):
+        # Pull the first chunk so a failing backend falls over to the next one
+        output_file, chunks = {"elevenlabs": elevenlabs, "gtts": gtts}[backend.name]()
+        first = next(chunks, b"")
+        return output_file, itertools.chain([first], chunks)
+
+    # Same backend order and health stats as synthesize(), measured to the first chunk
+    from backend_router import get_router
+    return get_router("tts").call_with(primed)
+
 # --- Text-to-Speech Endpoint ---
 # In app.py, modify the tts() function:
 @app.route('/tts', methods=['POST'])
@@ -70,31 +269,116 @@ def tts():
     try:
         text = data['text']
         lang = data.get('language', 'en')
-        output_file = f"tts_{hash(text)}.mp3"
-        output_path = os.path.join("audio_outputs", output_file)
-        
-        # Ensure directory exists
-        os.makedirs("audio_outputs", exist_ok=True)
-
-        if os.getenv("ELEVENLABS_API_KEY"):
-            from elevenlabs_tts import generate_speech
-            success = generate_speech(text, lang, output_path)
-            if not success:
-                raise Exception("TTS generation failed")
-        else:
-            from gtts import gTTS
-            tts = gTTS(text=text, lang=lang)
-            tts.save(output_path)
+        output_file = synthesize(text, lang)
 
         return jsonify({
             "audio_url": f"{os.getenv('HOSTED_URL', request.host_url)}/audio/{output_file}",
             "status": "success"
         })
 
+    except admission.Overloaded:
+        raise
     except Exception as e:
         logger.error(f"TTS failed: {str(e)}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
+# --- Batch Text-to-Speech ---
+@app.route('/tts/batch', methods=['POST'])
+def tts_batch():
+    if not request.is_json:
+        return jsonify({"error": "Request must be JSON"}), 400
+
+    data = request.get_json() or {}
+    from batch_tts import submit, TTS_BATCH_CONCURRENCY
+    try:
+        batch = submit(data.get('items') or [], int(data.get('concurrency', TTS_BATCH_CONCURRENCY)))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"TTS batch submit failed: {str(e)}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+    base_url = os.getenv('HOSTED_URL', request.host_url).rstrip('/')
+    return jsonify({
+        "batch_id": batch['id'],
+        "status_url": f"{base_url}/tts/batch/{batch['id']}",
+        "status": batch['status']
+    }), 202
+
+@app.route('/tts/batch/<batch_id>', methods=['GET'])
+def tts_batch_status(batch_id):
+    from batch_tts import load_batch
+    batch = load_batch(batch_id)
+    if batch is None:
+        return jsonify({"error": "Batch not found"}), 404
+    base_url = os.getenv('HOSTED_URL', request.host_url).rstrip('/')
+    for item in batch.get('manifest', {}).get('items', []):
+        if item.get('file'):
+            item['audio_url'] = f"{base_url}/audio/{item['file']}"
+    return jsonify(batch), (500 if batch['status'] == 'error' else 200)
+
+# --- Streaming Text-to-Speech Endpoint ---
+@app.route('/tts/stream', methods=['POST'])
+def tts_stream():
+    if not request.is_json:
+        return jsonify({"error": "Request must be JSON"}), 400
+
+    data = request.get_json()
+    if not data or 'text' not in data:
+        return jsonify({"error": "Missing text"}), 400
+
+    try:
+        output_file, chunks = synthesize_stream(data['text'], data.get('language', 'en'))
+        # Pull the first chunk here so upstream errors still get a JSON 500
+        first = next(chunks, b"")
+    except admission.Overloaded:
+        raise
+    except Exception as e:
+        logger.error(f"TTS stream failed: {str(e)}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+    def generate():
+        yield first
+        yield from chunks
+
+    response = Response(stream_with_context(generate()), mimetype='audio/mpeg')
+    response.headers['X-Audio-Url'] = f"{os.getenv('HOSTED_URL', request.host_url)}/audio/{output_file}"
+    return response
+
+# --- TTS Cache Stats ---
+@app.route('/tts/cache', methods=['GET'])
+def tts_cache_stats():
+    from tts_cache import stats
+    return jsonify(stats())
+
+# --- Outbound HTTP Stats ---
+@app.route('/http/stats', methods=['GET'])
+def http_stats():
+    from http_transport import stats
+    return jsonify(stats())
+
+# --- Prometheus Metrics ---
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# --- Admission Control Stats ---
+@app.route('/admission/stats', methods=['GET'])
+def admission_stats():
+    return jsonify(admission.stats())
+
+# --- Backend Router Stats ---
+@app.route('/router/stats', methods=['GET'])
+def router_stats():
+    from backend_router import stats
+    return jsonify(stats())
+
+# --- Chat Cache Stats ---
+@app.route('/generate/cache', methods=['GET'])
+def chat_cache_stats():
+    from chat_cache import stats
+    return jsonify(stats())
+
 # --- AI Response Endpoint ---
 # In app.py, modify the generate() function:
 @app.route('/generate', methods=['POST'])
@@ -122,15 +406,52 @@ def generate():
         return jsonify({"error": str(e)}), 500
 
 # --- Serve Audio Files ---
+# Range requests and If-None-Match/If-Range are handled by send_from_directory
+# against the strong content ETag; ?format= or Accept picks a compact variant
 @app.route('/audio/<path:filename>')
 def serve_audio(filename):
+    import audio_delivery
+    requested = request.args.get('format')
+    negotiated = filename.endswith('.mp3')
+    if negotiated:
+        try:
+            fmt = audio_delivery.negotiate(requested, request.headers.get('Accept'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    else:
+        # Playlists and direct variant URLs are served as they are, typed by extension
+        fmt = audio_delivery.format_of(filename)
+
     try:
-        return send_from_directory(
-            os.path.abspath('audio_outputs'),
-            filename,
-            mimetype='audio/mpeg',
-            as_attachment=False
-        )
+        with metrics.stage("audio_serve", format=fmt):
+            served = filename
+            if negotiated:
+                try:
+                    served = audio_delivery.variant_file(filename, fmt)
+                except FileNotFoundError:
+                    raise
+                except Exception as e:
+                    logger.warning(f"No {fmt} variant of {filename}, serving MP3: {str(e)}")
+                    fmt = "mp3"
+            if fmt:
+                mimetype = audio_delivery.FORMATS[fmt]["mimetype"]
+            elif filename.endswith('.m3u'):
+                mimetype = 'audio/x-mpegurl'
+            else:
+                mimetype = None  # guessed from the name
+            response = send_from_directory(
+                os.path.abspath(audio_delivery.AUDIO_DIR),
+                served,
+                mimetype=mimetype,
+                as_attachment=False,
+                conditional=True,
+                etag=audio_delivery.content_etag(audio_delivery.source_path(served))
+            )
+        response.headers['Cache-Control'] = audio_delivery.cache_control(filename)
+        if negotiated and not requested:
+            response.vary.add('Accept')
+        metrics.count_bytes("audio_serve", "out", response.content_length or 0, format=fmt)
+        return response
     except Exception as e:
         logger.error(f"Audio serve failed: {str(e)}")
         return jsonify({"error": "File not found"}), 404
@@ -160,29 +481,63 @@ def vapi_webhook():
                 user_text = last_user_msg.get('content', '')
                 logger.info(f"💬 Processing user message: {user_text}")
                 
+                call_id = data['message'].get('call', {}).get('id')
+                if call_id:
+                    # Rolling, token-budgeted history for this call instead of a single turn
+                    from call_sessions import get_store
+                    messages = get_store().sync(call_id, conversation).prompt_messages()
+                else:
+                    messages = [{"role": "user", "content": user_text}]
+                base_url = f"{os.getenv('HOSTED_URL', request.host_url)}audio/"
+
+                pipeline_mode = os.getenv("VAPI_TTS_PIPELINE", "off").lower()
+                if pipeline_mode in ("first", "playlist"):
+                    # Stream the reply and answer as soon as the first sentence has audio
+                    from voice_pipeline import start_pipeline
+                    pipeline = start_pipeline(messages, 'en', synthesize)
+                    first = pipeline.first_segment(timeout=float(os.getenv("VAPI_FIRST_SEGMENT_TIMEOUT", 20)))
+                    # "message" is the reply so far unless waiting for all of it is opted into
+                    full_text_timeout = float(os.getenv("VAPI_PIPELINE_FULL_TEXT_TIMEOUT", 0))
+                    ai_text = pipeline.full_text(full_text_timeout) if full_text_timeout > 0 else pipeline.text()
+                    if pipeline_mode == "playlist":
+                        audio_file, audio_text = pipeline.playlist_file, ai_text
+                    else:
+                        audio_file, audio_text = first.filename, first.text
+
+                    return jsonify({
+                        "type": "audio",
+                        "message": ai_text,
+                        "audioUrl": f"{base_url}{audio_file}",
+                        "audioText": audio_text,
+                        "messageComplete": pipeline.generated(),
+                        "playlistUrl": f"{base_url}{pipeline.playlist_file}"
+                    })
+
                 # Generate response
                 from openai_chat import get_ai_response
-                ai_text = get_ai_response([{"role": "user", "content": user_text}])
+                ai_text = get_ai_response(messages)
                 
                 # Generate audio
-                output_file = f"tts_{hash(ai_text)}.mp3"
-                output_path = os.path.join("audio_outputs", output_file)
-                os.makedirs("audio_outputs", exist_ok=True)
-                
-                if os.getenv("ELEVENLABS_API_KEY"):
-                    from elevenlabs_tts import generate_speech
-                    if not generate_speech(ai_text, 'en', output_path):
-                        raise Exception("TTS generation failed")
+                output_file = synthesize(ai_text, 'en')
                 
                 return jsonify({
                     "type": "audio",
                     "message": ai_text,
-                    "audioUrl": f"{os.getenv('HOSTED_URL', request.host_url)}audio/{output_file}"
+                    "audioUrl": f"{base_url}{output_file}"
                 })
         
+        if message_type == 'end-of-call-report' or (
+                message_type == 'status-update' and data['message'].get('status') == 'ended'):
+            call_id = data['message'].get('call', {}).get('id')
+            if call_id:
+                from call_sessions import get_store
+                get_store().end(call_id)
+
         # For status updates or other message types
         return jsonify({"status": "handled"})
 
+    except admission.Overloaded:
+        raise
     except Exception as e:
         logger.error(f"❌ Webhook error: {str(e)}", exc_info=True)
         return jsonify({"error": str(e)}), 500
@@ -191,6 +546,12 @@ def vapi_webhook():
 
 
 
+warmup.record_import_time(time.perf_counter() - _import_start)
+# Import and load the enabled backends in the background, so the first calls
+# on a fresh worker don't pay for it (see WARMUP_BACKENDS).
+warmup.start()
+
+
 if __name__ == '__main__':
     os.makedirs("audio_outputs", exist_ok=True)
-    app.run(host='0.0.0.0', port=5000)
+    app.run(host='0.0.0.0', port=int(os.getenv('PORT', 5000)))
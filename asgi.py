@@ -0,0 +1,360 @@
+"""Async serving mode: uvicorn asgi:app
+
+/stt, /tts, /generate and /vapi-webhook are served by async handlers with the
+same JSON contracts as app.py, plus the /stt/stream WebSocket, which only
+exists here; every other route falls through to the Flask app.
+"""
+import os
+import re
+import json
+import time
+import asyncio
+import logging
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.wsgi import WSGIMiddleware
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route, WebSocketRoute
+from starlette.websockets import WebSocketDisconnect
+
+import admission
+import metrics
+from app import app as flask_app, synthesize
+
+logger = logging.getLogger(__name__)
+
+# Path segments that are ids, so request metrics aren't labelled per job or file
+_ID_SEGMENT = re.compile(r"^(?=.*\d)[A-Za-z0-9_.-]{8,}$")
+
+
+class TraceMiddleware:
+    """Trace id and request metrics for every HTTP request, async or mounted Flask."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        token = metrics.start_trace(headers.get(b"x-request-id", b"").decode("latin-1"))
+        start = time.perf_counter()
+        status = {"code": 500}
+        metrics.add_gauge("http_requests_in_flight", 1)
+
+        async def send_with_trace(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message["headers"] = list(message.get("headers") or []) + [
+                    (b"x-trace-id", metrics.current_trace().encode("latin-1"))
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            endpoint = "/".join(":id" if _ID_SEGMENT.match(s) else s for s in scope["path"].split("/"))
+            metrics.add_gauge("http_requests_in_flight", -1)
+            metrics.observe("http_request_duration_seconds", time.perf_counter() - start,
+                            endpoint=endpoint, method=scope["method"], status=status["code"])
+            metrics.end_trace(token)
+
+
+def _overloaded(e):
+    return JSONResponse({"error": str(e), "status": "overloaded"}, status_code=e.status,
+                        headers={"Retry-After": str(e.retry_after)})
+
+
+class AdmissionMiddleware:
+    """Endpoint concurrency limits and priority for async handlers and mounted Flask routes alike.
+
+    A WebSocket holds its slot for as long as it stays open.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        try:
+            ticket = await admission.admit_async(scope["path"])
+        except admission.Overloaded as e:
+            if scope["type"] == "websocket":
+                # 1013: try again later; a socket is refused before it is accepted
+                await send({"type": "websocket.close", "code": 1013, "reason": str(e)})
+            else:
+                await _overloaded(e)(scope, receive, send)
+            return
+        if ticket is None:
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            ticket.release()
+
+
+def _host_url(request):
+    return str(request.base_url)
+
+
+async def _json_body(request):
+    if not request.headers.get('content-type', '').startswith('application/json'):
+        return None
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+async def synthesize_async(text, lang):
+    from phrase_bank import lookup
+    from backend_router import get_router
+    from audio_delivery import precompute
+
+    phrase_file = lookup(text, lang)
+    if phrase_file:
+        return phrase_file
+    output_file = await get_router("tts").call_async(text, lang)
+    precompute(output_file)
+    return output_file
+
+
+# --- Speech-to-Text Endpoint ---
+async def stt(request):
+    form = await request.form()
+    upload = form.get('audio')
+    if upload is None or isinstance(upload, str):
+        return JSONResponse({"error": "No audio file provided"}, status_code=400)
+
+    try:
+        from audio_io import load_audio
+        loop = asyncio.get_running_loop()
+        # Decoding is CPU-bound, keep it off the event loop
+        audio = await loop.run_in_executor(None, load_audio, upload.file)
+        try:
+            if os.getenv("ASSEMBLYAI_API_KEY") and request.query_params.get('mode') == 'async':
+                from assemblyai_stt import submit_transcription_async
+                base_url = os.getenv('HOSTED_URL', _host_url(request)).rstrip('/')
+                transcript_id, _ = await submit_transcription_async(audio, f"{base_url}/assemblyai-webhook")
+                return JSONResponse({
+                    "transcript_id": transcript_id,
+                    "result_url": f"{base_url}/stt/result/{transcript_id}",
+                    "trimmed_seconds": round(audio.trimmed_seconds, 2),
+                    "status": "processing"
+                }, status_code=202)
+
+            from backend_router import get_router
+            transcript, lang = await get_router("stt").call_async(audio)
+        finally:
+            audio.close()
+
+        return JSONResponse({
+            "text": transcript,
+            "language": lang,
+            "trimmed_seconds": round(audio.trimmed_seconds, 2),
+            "status": "success"
+        })
+
+    except admission.Overloaded as e:
+        return _overloaded(e)
+    except Exception as e:
+        logger.error(f"STT failed: {str(e)}", exc_info=True)
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+# --- Streaming Speech-to-Text (WebSocket) ---
+async def stt_stream(websocket):
+    from streaming_stt import create_backend
+    await websocket.accept()
+    try:
+        backend = create_backend(websocket.query_params.get('backend'))
+    except ValueError as e:
+        await websocket.send_json({"type": "error", "error": str(e)})
+        await websocket.close(code=1003)
+        return
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("text") is not None:
+                # {"type": "end"} flushes the open utterance as a final transcript
+                try:
+                    control = json.loads(message["text"])
+                except ValueError:
+                    control = None
+                if isinstance(control, dict) and control.get("type") == "end":
+                    break
+                continue
+            for event in await backend.feed(message.get("bytes") or b""):
+                await websocket.send_json(event)
+
+        for event in await backend.finish():
+            await websocket.send_json(event)
+        await websocket.close()
+
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"Streaming STT failed: {str(e)}", exc_info=True)
+        try:
+            await websocket.send_json({"type": "error", "error": str(e)})
+            await websocket.close(code=1011)
+        except Exception:
+            pass
+    finally:
+        backend.close()
+
+
+# --- Text-to-Speech Endpoint ---
+async def tts(request):
+    data = await _json_body(request)
+    if data is None:
+        return JSONResponse({"error": "Request must be JSON"}, status_code=400)
+    if not data or 'text' not in data:
+        return JSONResponse({"error": "Missing text"}, status_code=400)
+
+    try:
+        output_file = await synthesize_async(data['text'], data.get('language', 'en'))
+        return JSONResponse({
+            "audio_url": f"{os.getenv('HOSTED_URL', _host_url(request))}/audio/{output_file}",
+            "status": "success"
+        })
+
+    except admission.Overloaded as e:
+        return _overloaded(e)
+    except Exception as e:
+        logger.error(f"TTS failed: {str(e)}", exc_info=True)
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+# --- AI Response Endpoint ---
+async def generate(request):
+    data = await _json_body(request)
+    if data is None:
+        return JSONResponse({"error": "Request must be JSON"}, status_code=400)
+    if not data or 'messages' not in data:
+        return JSONResponse({"error": "Missing messages"}, status_code=400)
+
+    try:
+        from openai_chat import get_ai_response_async
+        if not isinstance(data['messages'], list):
+            raise ValueError("Messages must be a list")
+
+        response = await get_ai_response_async(data['messages'])
+        return JSONResponse({
+            "response": response,
+            "status": "success"
+        })
+
+    except Exception as e:
+        logger.error(f"Generation failed: {str(e)}", exc_info=True)
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+# --- VAPI Webhook Endpoint ---
+async def vapi_webhook(request):
+    try:
+        logger.info("🔥 VAPI WEBHOOK TRIGGERED 🔥")
+
+        data = await _json_body(request)
+        if data is None:
+            return JSONResponse({"error": "Request must be JSON"}, status_code=400)
+
+        message_type = data.get('message', {}).get('type')
+        logger.info(f"📦 Received payload type: {message_type}")
+
+        if message_type == 'conversation-update':
+            conversation = data['message'].get('conversation', [])
+            last_user_msg = next((m for m in reversed(conversation) if m.get('role') == 'user'), None)
+
+            if last_user_msg:
+                user_text = last_user_msg.get('content', '')
+                logger.info(f"💬 Processing user message: {user_text}")
+
+                call_id = data['message'].get('call', {}).get('id')
+                if call_id:
+                    # Rolling, token-budgeted history for this call instead of a single turn
+                    from call_sessions import get_store
+                    # The disk store does file I/O, so keep it off the event loop
+                    session = await asyncio.get_running_loop().run_in_executor(
+                        None, get_store().sync, call_id, conversation)
+                    messages = session.prompt_messages()
+                else:
+                    messages = [{"role": "user", "content": user_text}]
+                base_url = f"{os.getenv('HOSTED_URL', _host_url(request))}audio/"
+
+                pipeline_mode = os.getenv("VAPI_TTS_PIPELINE", "off").lower()
+                if pipeline_mode in ("first", "playlist"):
+                    from voice_pipeline import start_pipeline
+                    pipeline = start_pipeline(messages, 'en', synthesize)
+                    loop = asyncio.get_running_loop()
+                    first = await loop.run_in_executor(
+                        None, pipeline.first_segment, float(os.getenv("VAPI_FIRST_SEGMENT_TIMEOUT", 20)))
+                    full_text_timeout = float(os.getenv("VAPI_PIPELINE_FULL_TEXT_TIMEOUT", 0))
+                    if full_text_timeout > 0:
+                        ai_text = await loop.run_in_executor(None, pipeline.full_text, full_text_timeout)
+                    else:
+                        ai_text = pipeline.text()
+                    if pipeline_mode == "playlist":
+                        audio_file, audio_text = pipeline.playlist_file, ai_text
+                    else:
+                        audio_file, audio_text = first.filename, first.text
+
+                    return JSONResponse({
+                        "type": "audio",
+                        "message": ai_text,
+                        "audioUrl": f"{base_url}{audio_file}",
+                        "audioText": audio_text,
+                        "messageComplete": pipeline.generated(),
+                        "playlistUrl": f"{base_url}{pipeline.playlist_file}"
+                    })
+
+                from openai_chat import get_ai_response_async
+                ai_text = await get_ai_response_async(messages)
+                output_file = await synthesize_async(ai_text, 'en')
+
+                return JSONResponse({
+                    "type": "audio",
+                    "message": ai_text,
+                    "audioUrl": f"{base_url}{output_file}"
+                })
+
+        if message_type == 'end-of-call-report' or (
+                message_type == 'status-update' and data['message'].get('status') == 'ended'):
+            call_id = data['message'].get('call', {}).get('id')
+            if call_id:
+                from call_sessions import get_store
+                await asyncio.get_running_loop().run_in_executor(None, get_store().end, call_id)
+
+        return JSONResponse({"status": "handled"})
+
+    except admission.Overloaded as e:
+        return _overloaded(e)
+    except Exception as e:
+        logger.error(f"❌ Webhook error: {str(e)}", exc_info=True)
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+app = Starlette(routes=[
+    Route('/stt', stt, methods=['POST']),
+    Route('/tts', tts, methods=['POST']),
+    Route('/generate', generate, methods=['POST']),
+    Route('/vapi-webhook', vapi_webhook, methods=['POST']),
+    WebSocketRoute('/stt/stream', stt_stream),
+    # Everything else (health, audio, streaming TTS, stats) stays on Flask
+    Mount('/', WSGIMiddleware(flask_app))
+], middleware=[
+    Middleware(TraceMiddleware),
+    # Replaces rather than duplicates the headers flask-cors sets on mounted routes
+    Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*']),
+    # Inside CORS, so preflights aren't queued and 429/503s still carry CORS headers
+    Middleware(AdmissionMiddleware)
+])
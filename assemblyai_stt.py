@@ -1,5 +1,13 @@
 import os
-import requests
+import io
+import hmac
+import json
+import wave
+import asyncio
+import threading
+import http_transport
+import script_detect
+import metrics
 from dotenv import load_dotenv
 import time
 import logging
@@ -8,60 +16,205 @@ load_dotenv()
 logger = logging.getLogger(__name__)
 
 ASSEMBLYAI_API_KEY = os.getenv("ASSEMBLYAI_API_KEY")
-BASE_URL = "https://api.assemblyai.com/v2"
+ASSEMBLYAI_WEBHOOK_SECRET = os.getenv("ASSEMBLYAI_WEBHOOK_SECRET")
+BASE_URL = os.getenv("ASSEMBLYAI_API_BASE", "https://api.assemblyai.com/v2").rstrip("/")
+RESULTS_DIR = "stt_results"
 
-def is_devanagari(char):
-    return '\u0900' <= char <= '\u097F'
+POLL_MIN_INTERVAL = 0.5
+POLL_MAX_INTERVAL = 10.0
+POLL_BACKOFF = 1.5
+# Bytes per second used to guess duration when the upload isn't a WAV (~128 kbps)
+COMPRESSED_BYTES_PER_SECOND = 16000
+# Decoded (and trimmed) audio is re-encoded before upload: opus, flac or wav
+UPLOAD_CODECS = {"opus": ("ogg", "libopus", 32000), "flac": ("flac", "flac", None)}
+ASSEMBLYAI_UPLOAD_CODEC = os.getenv("ASSEMBLYAI_UPLOAD_CODEC", "opus").lower()
+WEBHOOK_AUTH_HEADER = "X-Webhook-Secret"
 
-def is_telugu(char):
-    return '\u0C00' <= char <= '\u0C7F'
+_loop = None
+_loop_lock = threading.Lock()
 
-def transcribe_audio(file_path):
+
+def _get_loop():
+    """One event loop per process, so every call shares the same pooled session."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="assemblyai-loop", daemon=True).start()
+    return _loop
+
+
+def run_sync(coro):
+    """Run a coroutine on the shared loop from synchronous (Flask) code."""
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result()
+
+
+def _read_audio(audio):
+    """(bytes to upload, duration in seconds or None if unknown)."""
+    if isinstance(audio, (bytes, bytearray)):
+        return bytes(audio), None
+    if hasattr(audio, "wav_bytes"):
+        return _compress(audio), audio.duration
+    with open(audio, 'rb') as f:
+        return f.read(), None
+
+
+def _compress(audio):
+    # A trimmed 16 kHz WAV is ~32 KB/s, several times the phone MP3/Opus it was decoded from
+    if ASSEMBLYAI_UPLOAD_CODEC in UPLOAD_CODECS and len(audio.pcm):
+        try:
+            return audio.encoded_bytes(*UPLOAD_CODECS[ASSEMBLYAI_UPLOAD_CODEC])
+        except Exception as e:
+            logger.warning(f"Encoding upload as {ASSEMBLYAI_UPLOAD_CODEC} failed, sending WAV: {str(e)}")
+    return audio.wav_bytes()
+
+
+def estimate_duration(data):
+    try:
+        with wave.open(io.BytesIO(data)) as w:
+            return w.getnframes() / float(w.getframerate())
+    except (wave.Error, EOFError, ZeroDivisionError):
+        return len(data) / COMPRESSED_BYTES_PER_SECOND
+
+
+def poll_schedule(duration):
+    """Return (first_delay, timeout) for a recording of the given length.
+
+    AssemblyAI usually finishes in a fraction of real time, so short clips are
+    polled almost immediately and long ones aren't hammered early.
+    """
+    first_delay = min(max(duration * 0.1, POLL_MIN_INTERVAL), 5.0)
+    timeout = float(os.getenv("ASSEMBLYAI_POLL_TIMEOUT", 0)) or max(60.0, duration * 1.5 + 30)
+    return first_delay, timeout
+
+
+def _finalize(result):
+    transcript = result['text']
+    lang_code = result['language_code']
+
+    # Adjust for mixed language
+    if 'en' in lang_code.lower():
+        lang_code = script_detect.strongest(transcript) or lang_code
+
+    return transcript, lang_code
+
+
+def _headers():
+    return {"authorization": ASSEMBLYAI_API_KEY}
+
+
+async def _upload(data, max_retries):
+    resp = await http_transport.async_request("POST", f"{BASE_URL}/upload", headers=_headers(), data=data,
+                                              max_retries=max_retries)
+    resp.raise_for_status()
+    return (await resp.json())['upload_url']
+
+
+async def submit_transcription_async(audio, webhook_url=None, max_retries=http_transport.HTTP_MAX_RETRIES):
+    data, duration = await asyncio.get_running_loop().run_in_executor(None, _read_audio, audio)
+    metrics.count_bytes("stt", "in", len(data), backend="assemblyai")
+    upload_url = await _upload(data, max_retries)
+
+    body = {"audio_url": upload_url, "language_detection": True}
+    if webhook_url:
+        body["webhook_url"] = webhook_url
+        if ASSEMBLYAI_WEBHOOK_SECRET:
+            body["webhook_auth_header_name"] = WEBHOOK_AUTH_HEADER
+            body["webhook_auth_header_value"] = ASSEMBLYAI_WEBHOOK_SECRET
+
+    resp = await http_transport.async_request("POST", f"{BASE_URL}/transcript", headers=_headers(), json=body,
+                                              max_retries=max_retries)
+    resp.raise_for_status()
+    transcript_id = (await resp.json())['id']
+    return transcript_id, duration if duration is not None else estimate_duration(data)
+
+
+async def fetch_transcript_async(transcript_id, max_retries=http_transport.HTTP_MAX_RETRIES):
+    resp = await http_transport.async_request("GET", f"{BASE_URL}/transcript/{transcript_id}", headers=_headers(),
+                                              max_retries=max_retries)
+    resp.raise_for_status()
+    return await resp.json()
+
+
+async def transcribe_audio_async(audio, max_retries=http_transport.HTTP_MAX_RETRIES):
+    with metrics.stage("stt", backend="assemblyai") as labels:
+        transcript, lang = await _transcribe_async(audio, max_retries)
+        labels["language"] = lang
+    return transcript, lang
+
+
+async def _transcribe_async(audio, max_retries):
     try:
-        # Upload file
-        with open(file_path, 'rb') as f:
-            upload_response = requests.post(
-                f"{BASE_URL}/upload",
-                headers={"authorization": ASSEMBLYAI_API_KEY},
-                files={"file": f}
-            )
-            upload_url = upload_response.json()['upload_url']
-
-        # Start transcription (auto language detection)
-        transcript_response = requests.post(
-            f"{BASE_URL}/transcript",
-            headers={"authorization": ASSEMBLYAI_API_KEY},
-            json={"audio_url": upload_url, "language_detection": True}
-        )
-        transcript_id = transcript_response.json()['id']
+        transcript_id, duration = await submit_transcription_async(audio, max_retries=max_retries)
+        delay, timeout = poll_schedule(duration)
+        deadline = time.monotonic() + timeout
 
         # Poll for results
-        for _ in range(30):
-            result_response = requests.get(
-                f"{BASE_URL}/transcript/{transcript_id}",
-                headers={"authorization": ASSEMBLYAI_API_KEY}
-            )
-            result = result_response.json()
-            
+        while True:
+            await asyncio.sleep(delay)
+            result = await fetch_transcript_async(transcript_id, max_retries)
+
             if result['status'] == 'completed':
-                transcript = result['text']
-                lang_code = result['language_code']
-                
-                # Adjust for mixed language
-                if 'en' in lang_code.lower():
-                    if any(is_devanagari(c) for c in transcript):
-                        lang_code = 'hi'
-                    elif any(is_telugu(c) for c in transcript):
-                        lang_code = 'te'
-                
-                return transcript, lang_code
+                return _finalize(result)
             elif result['status'] == 'error':
                 raise RuntimeError(result.get('error', 'Transcription failed'))
-            
-            time.sleep(2)
 
-        raise TimeoutError("Transcription timeout")
-    
+            if time.monotonic() >= deadline:
+                raise TimeoutError("Transcription timeout")
+            delay = min(delay * POLL_BACKOFF, POLL_MAX_INTERVAL, max(deadline - time.monotonic(), 0))
+
     except Exception as e:
         logger.error(f"Transcription failed: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+
+def transcribe_audio(audio, max_retries=http_transport.HTTP_MAX_RETRIES):
+    """Transcribe a file path, raw bytes or an audio_io.AudioBuffer."""
+    return run_sync(transcribe_audio_async(audio, max_retries))
+
+
+def submit_transcription(audio, webhook_url):
+    transcript_id, _ = run_sync(submit_transcription_async(audio, webhook_url))
+    return transcript_id
+
+
+def verify_webhook(headers):
+    if not ASSEMBLYAI_WEBHOOK_SECRET:
+        return True
+    return hmac.compare_digest(headers.get(WEBHOOK_AUTH_HEADER, ''), ASSEMBLYAI_WEBHOOK_SECRET)
+
+
+def _result_path(transcript_id):
+    # Transcript ids come from callers, so keep them out of other directories
+    return os.path.join(RESULTS_DIR, f"{os.path.basename(transcript_id)}.json")
+
+
+def save_result(transcript_id, result):
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = _result_path(transcript_id)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def load_result(transcript_id):
+    try:
+        with open(_result_path(transcript_id), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def complete_transcription(transcript_id):
+    """Fetch a finished transcript (e.g. on webhook) and store its summary."""
+    result = run_sync(fetch_transcript_async(transcript_id))
+    if result['status'] == 'completed':
+        transcript, lang = _finalize(result)
+        summary = {"text": transcript, "language": lang, "status": "success"}
+    elif result['status'] == 'error':
+        summary = {"error": result.get('error', 'Transcription failed'), "status": "error"}
+    else:
+        return {"status": result['status']}
+    save_result(transcript_id, summary)
+    return summary
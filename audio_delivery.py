@@ -0,0 +1,196 @@
+"""Serving generated audio: content ETags, cache policy and compact codec variants.
+
+Phone legs play 8-16 kHz audio, so a 44.1 kHz MP3 is mostly wasted egress.
+/audio can instead serve the same clip re-encoded as 16 kHz Opus or 8 kHz
+mu-law WAV, picked with ?format= or the Accept header. Variants are rendered
+on first request (or right after synthesis, see AUDIO_PRECOMPUTE_FORMATS)
+into audio_outputs/variants/<format>/ and evicted with their source by the
+TTS cache sweep.
+"""
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+from tts_cache import AUDIO_DIR, VARIANTS_DIR
+
+logger = logging.getLogger(__name__)
+
+# Original files are MP3; the rest are re-encoded from them
+FORMATS = {
+    "mp3": {"mimetype": "audio/mpeg", "ext": ".mp3"},
+    "opus": {"mimetype": "audio/ogg; codecs=opus", "ext": ".ogg", "container": "ogg", "codec": "libopus",
+             "rate": 16000, "bit_rate": 24000},
+    "ulaw": {"mimetype": "audio/wav", "ext": ".wav", "container": "wav", "codec": "pcm_mulaw", "rate": 8000}
+}
+ACCEPT_TYPES = {
+    "audio/mpeg": "mp3",
+    "audio/mp3": "mp3",
+    "audio/ogg": "opus",
+    "audio/opus": "opus",
+    "audio/basic": "ulaw",
+    "audio/pcmu": "ulaw",
+    "audio/mulaw": "ulaw",
+    "audio/x-mulaw": "ulaw"
+}
+AUDIO_VARIANT_FORMATS = [f.strip() for f in os.getenv("AUDIO_VARIANT_FORMATS", "opus,ulaw").split(",")
+                         if f.strip() in FORMATS and f.strip() != "mp3"]
+# Variants rendered in the background as soon as a clip is synthesized
+AUDIO_PRECOMPUTE_FORMATS = [f.strip() for f in os.getenv("AUDIO_PRECOMPUTE_FORMATS", "").split(",")
+                            if f.strip() in AUDIO_VARIANT_FORMATS]
+AUDIO_CACHE_MAX_AGE = int(os.getenv("AUDIO_CACHE_MAX_AGE", 365 * 24 * 3600))
+ETAG_CACHE_SIZE = 4096
+
+_etags = OrderedDict()  # (path, inode, size) -> digest
+_etags_lock = threading.Lock()
+_render_locks = {}
+_render_locks_lock = threading.Lock()
+_precompute = ThreadPoolExecutor(max_workers=1, thread_name_prefix="audio-variants")
+
+
+def negotiate(requested=None, accept=None):
+    """Return the format to serve for a request.
+
+    An explicit ?format= wins and raises ValueError when unknown or disabled.
+    Otherwise the highest-q audio type in Accept that we can produce is used;
+    wildcards and missing headers get the original MP3.
+    """
+    if requested:
+        requested = requested.lower()
+        if requested != "mp3" and requested not in AUDIO_VARIANT_FORMATS:
+            raise ValueError(f"Unsupported audio format: {requested}")
+        return requested
+
+    candidates = []
+    for index, part in enumerate((accept or "").split(",")):
+        mimetype, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        fmt = ACCEPT_TYPES.get(mimetype.lower())
+        if fmt and q > 0 and (fmt == "mp3" or fmt in AUDIO_VARIANT_FORMATS):
+            candidates.append((-q, index, fmt))
+    return min(candidates)[2] if candidates else "mp3"
+
+
+def format_of(filename):
+    """Format whose extension the file has (e.g. variants/opus/*.ogg), or None."""
+    ext = os.path.splitext(filename)[1].lower()
+    return next((name for name, spec in FORMATS.items() if spec["ext"] == ext), None)
+
+
+def source_path(filename):
+    """Path of a requested file under AUDIO_DIR; FileNotFoundError for anything outside it."""
+    normalized = os.path.normpath(filename)
+    if os.path.isabs(normalized) or normalized == ".." or normalized.startswith(".." + os.sep):
+        raise FileNotFoundError(filename)
+    return os.path.join(AUDIO_DIR, normalized)
+
+
+def variant_name(filename, fmt):
+    """Path of a variant relative to AUDIO_DIR, e.g. variants/opus/tts_<key>.ogg."""
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(os.path.relpath(VARIANTS_DIR, AUDIO_DIR), fmt, stem + FORMATS[fmt]["ext"])
+
+
+def _render_lock(path):
+    with _render_locks_lock:
+        return _render_locks.setdefault(path, threading.Lock())
+
+
+def variant_file(filename, fmt):
+    """Relative path of `filename` in `fmt`, rendering the variant on first use.
+
+    Raises FileNotFoundError when the source itself doesn't exist.
+    """
+    if fmt == "mp3":
+        return filename
+    source = source_path(filename)
+    name = variant_name(os.path.normpath(filename), fmt)
+    path = os.path.join(AUDIO_DIR, name)
+
+    os.stat(source)
+    # Sources are named by a hash of text, voice and settings, so an existing
+    # variant is still a rendering of the same clip even if the source was
+    # evicted and rendered again since
+    if os.path.exists(path):
+        return name
+    with _render_lock(path):
+        if os.path.exists(path):
+            return name
+
+        spec = FORMATS[fmt]
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            from audio_io import transcode
+            with metrics.stage("audio_transcode", format=fmt):
+                transcode(source, tmp_path, spec["container"], spec["codec"], spec["rate"], spec.get("bit_rate"))
+            # Atomic, so other workers never serve a half-written variant
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    with _render_locks_lock:
+        _render_locks.pop(path, None)
+    logger.info(f"Rendered {fmt} variant of {filename}: "
+                f"{os.path.getsize(source)} -> {os.path.getsize(path)} bytes")
+    return name
+
+
+def precompute(filename):
+    """Render the AUDIO_PRECOMPUTE_FORMATS variants of a new clip in the background."""
+    if not AUDIO_PRECOMPUTE_FORMATS or not filename.endswith(".mp3"):
+        return
+
+    def run():
+        for fmt in AUDIO_PRECOMPUTE_FORMATS:
+            try:
+                variant_file(filename, fmt)
+            except Exception as e:
+                logger.warning(f"Precomputing {fmt} variant of {filename} failed: {str(e)}")
+
+    _precompute.submit(metrics.copy_context().run, run)
+
+
+def content_etag(path):
+    """Strong ETag: SHA-256 of the file's bytes, cached per (path, inode, size).
+
+    Not keyed on mtime: the TTS cache touches files on every hit, while
+    every rewrite goes through os.replace() and so gets a new inode.
+    """
+    st = os.stat(path)
+    key = (path, st.st_ino, st.st_size)
+    with _etags_lock:
+        digest = _etags.get(key)
+        if digest is not None:
+            _etags.move_to_end(key)
+            return digest
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(65536), b""):
+            h.update(block)
+    digest = h.hexdigest()[:32]
+
+    with _etags_lock:
+        _etags[key] = digest
+        while len(_etags) > ETAG_CACHE_SIZE:
+            _etags.popitem(last=False)
+    return digest
+
+
+def cache_control(filename):
+    # Cached clips, phrase bank files and their variants are named by a hash of
+    # everything that went into them, so a URL never changes meaning. Playlists
+    # grow while their segments render and must be revalidated.
+    if filename.endswith(".m3u"):
+        return "no-cache"
+    return f"public, max-age={AUDIO_CACHE_MAX_AGE}, immutable"
@@ -0,0 +1,217 @@
+import io
+import os
+import wave
+import logging
+import tempfile
+import av
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+# Decoded audio above this size spills to a temp file (16 kHz mono s16 is ~32 KB/s)
+AUDIO_SPOOL_MAX_BYTES = int(os.getenv("AUDIO_SPOOL_MAX_BYTES", 20 * 1024 * 1024))
+
+# Energy-based trimming of leading/trailing silence and compression of long pauses
+AUDIO_TRIM_SILENCE = os.getenv("AUDIO_TRIM_SILENCE", "true").lower() == "true"
+AUDIO_VAD_FRAME_MS = 30
+# A frame is speech when it is this far above the noise floor (10th percentile frame) ...
+AUDIO_VAD_MARGIN_DB = float(os.getenv("AUDIO_VAD_MARGIN_DB", 12))
+# ... and above this absolute level, so clean digital silence never counts as speech
+AUDIO_VAD_MIN_DB = float(os.getenv("AUDIO_VAD_MIN_DB", -50))
+# ... but never more than this far below the loud (95th percentile) frames, so
+# recordings that are speech throughout are not mistaken for noise
+AUDIO_VAD_RANGE_DB = 30
+AUDIO_VAD_PADDING = float(os.getenv("AUDIO_VAD_PADDING", 0.2))
+AUDIO_MAX_SILENCE = float(os.getenv("AUDIO_MAX_SILENCE", 0.6))
+
+
+class AudioBuffer:
+    """16 kHz mono 16-bit PCM, decoded once and shared by every STT backend."""
+
+    def __init__(self, pcm, spool=None, trimmed_seconds=0.0):
+        self.pcm = pcm
+        self.sample_rate = SAMPLE_RATE
+        self._spool = spool
+        # Silence removed by trim_silence() before this buffer reached an STT backend
+        self.trimmed_seconds = trimmed_seconds
+
+    @property
+    def duration(self):
+        return len(self.pcm) / float(self.sample_rate)
+
+    def float_samples(self):
+        # faster-whisper expects float32 in [-1, 1]
+        return self.pcm.astype(np.float32) / 32768.0
+
+    def pcm_bytes(self):
+        return self.pcm.tobytes()
+
+    def encoded_bytes(self, container_format, codec, bit_rate=None):
+        """The PCM compressed in memory, e.g. FLAC or Opus for uploads (a WAV is ~32 KB/s)."""
+        frame = av.AudioFrame.from_ndarray(self.pcm.reshape(1, -1), format="s16", layout="mono")
+        frame.sample_rate = self.sample_rate
+        out = io.BytesIO()
+        with av.open(out, mode="w", format=container_format) as container:
+            _encode([frame], container, codec, self.sample_rate, bit_rate)
+        return out.getvalue()
+
+    def wav_bytes(self):
+        out = io.BytesIO()
+        with wave.open(out, "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(self.sample_rate)
+            w.writeframes(self.pcm.tobytes())
+        return out.getvalue()
+
+    def close(self):
+        if self._spool is not None:
+            self.pcm = np.zeros(0, dtype=np.int16)
+            self._spool.close()
+            self._spool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _buffer_from_spool(spool, trimmed_seconds=0.0):
+    size = spool.tell()
+    if size > AUDIO_SPOOL_MAX_BYTES:
+        spool.rollover()
+        spool.flush()
+        pcm = np.memmap(spool, dtype=np.int16, mode="r") if size else np.zeros(0, dtype=np.int16)
+        logger.info(f"Decoded audio spilled to disk ({size} bytes)")
+        return AudioBuffer(pcm, spool, trimmed_seconds)
+
+    spool.seek(0)
+    pcm = np.frombuffer(spool.read(), dtype=np.int16)
+    spool.close()
+    return AudioBuffer(pcm, trimmed_seconds=trimmed_seconds)
+
+
+def frame_levels(pcm, frame):
+    """dBFS of each frame, computed in blocks so memmapped audio isn't loaded at once."""
+    n_frames = len(pcm) // frame
+    levels = np.empty(n_frames, dtype=np.float32)
+    block = 2000
+    for start in range(0, n_frames, block):
+        stop = min(start + block, n_frames)
+        samples = np.asarray(pcm[start * frame:stop * frame], dtype=np.float32).reshape(-1, frame) / 32768.0
+        rms = np.sqrt(np.mean(samples * samples, axis=1))
+        levels[start:stop] = 20 * np.log10(np.maximum(rms, 1e-6))
+    return levels
+
+
+def speech_spans(audio, padding=None, max_silence=None):
+    """Sample ranges to keep: speech plus padding, with pauses capped at max_silence."""
+    padding = AUDIO_VAD_PADDING if padding is None else padding
+    max_silence = AUDIO_MAX_SILENCE if max_silence is None else max_silence
+    frame = audio.sample_rate * AUDIO_VAD_FRAME_MS // 1000
+    levels = frame_levels(audio.pcm, frame)
+    if not len(levels):
+        return [(0, len(audio.pcm))]
+
+    floor, loud = np.percentile(levels, [10, 95])
+    threshold = max(min(floor + AUDIO_VAD_MARGIN_DB, loud - AUDIO_VAD_RANGE_DB), AUDIO_VAD_MIN_DB)
+    voiced = np.flatnonzero(levels > threshold)
+    if not len(voiced):
+        return []
+
+    pad = int(padding * 1000 / AUDIO_VAD_FRAME_MS)
+    gap = max(int(max_silence * 1000 / AUDIO_VAD_FRAME_MS), 2 * pad)
+    spans = []
+    start = prev = voiced[0]
+    for index in voiced[1:]:
+        if index - prev > gap:
+            spans.append((start, prev))
+            start = index
+        prev = index
+    spans.append((start, prev))
+
+    total = len(audio.pcm)
+    # Pauses longer than the gap keep `padding` of silence on each side
+    return [(max(0, (a - pad) * frame), min(total, (b + 1 + pad) * frame)) for a, b in spans]
+
+
+def trim_silence(audio, padding=None, max_silence=None):
+    """Drop leading/trailing silence and shorten long pauses.
+
+    Returns a new AudioBuffer (closing `audio`) whose trimmed_seconds says how
+    much was removed, or `audio` itself when there is nothing worth removing.
+    Recordings with no detectable speech are returned untouched, so a backend
+    still gets the chance to decide they are empty.
+    """
+    spans = speech_spans(audio, padding, max_silence)
+    kept = sum(b - a for a, b in spans)
+    if not spans or kept >= len(audio.pcm):
+        return audio
+
+    spool = tempfile.SpooledTemporaryFile(max_size=AUDIO_SPOOL_MAX_BYTES)
+    try:
+        for a, b in spans:
+            spool.write(np.asarray(audio.pcm[a:b]).tobytes())
+    except Exception:
+        spool.close()
+        raise
+    removed = (len(audio.pcm) - kept) / float(audio.sample_rate)
+    logger.info(f"Trimmed {removed:.2f}s of silence from {audio.duration:.2f}s of audio")
+    audio.close()
+    return _buffer_from_spool(spool, trimmed_seconds=audio.trimmed_seconds + removed)
+
+
+def load_audio(source, trim=None):
+    """Decode a path, bytes or file-like object straight to an AudioBuffer.
+
+    Decoding and resampling happen in memory with PyAV; only recordings larger
+    than AUDIO_SPOOL_MAX_BYTES once decoded are backed by a temp file. Silence
+    is trimmed unless `trim` (default AUDIO_TRIM_SILENCE) is false.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    if trim is None:
+        trim = AUDIO_TRIM_SILENCE
+
+    spool = tempfile.SpooledTemporaryFile(max_size=AUDIO_SPOOL_MAX_BYTES)
+    resampler = av.audio.resampler.AudioResampler(format="s16", layout="mono", rate=SAMPLE_RATE)
+    try:
+        with av.open(source, mode="r", metadata_errors="ignore") as container:
+            for frame in container.decode(audio=0):
+                frame.pts = None
+                for resampled in resampler.resample(frame):
+                    spool.write(resampled.to_ndarray().tobytes())
+            # Flush samples still buffered in the resampler
+            for resampled in resampler.resample(None):
+                spool.write(resampled.to_ndarray().tobytes())
+    except Exception:
+        spool.close()
+        raise
+
+    audio = _buffer_from_spool(spool)
+    return trim_silence(audio) if trim else audio
+
+
+def transcode(source, dest, container_format, codec, rate, bit_rate=None):
+    """Re-encode an audio file as mono `codec` at `rate` Hz, e.g. telephony variants of TTS MP3s."""
+    with av.open(source, mode="r", metadata_errors="ignore") as inp, \
+            av.open(dest, mode="w", format=container_format) as out:
+        _encode(inp.decode(audio=0), out, codec, rate, bit_rate)
+
+
+def _encode(frames, out, codec, rate, bit_rate=None):
+    stream = out.add_stream(codec, rate=rate)
+    stream.layout = "mono"
+    if bit_rate:
+        stream.bit_rate = bit_rate
+    resampler = av.audio.resampler.AudioResampler(format=stream.format.name, layout="mono", rate=rate)
+    for frame in frames:
+        frame.pts = None
+        for resampled in resampler.resample(frame):
+            out.mux(stream.encode(resampled))
+    for resampled in resampler.resample(None):
+        out.mux(stream.encode(resampled))
+    # Flush the encoder
+    out.mux(stream.encode(None))
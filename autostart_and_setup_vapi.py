@@ -2,12 +2,14 @@ import subprocess
 import time
 import requests
 import os
+import http_transport
 from dotenv import load_dotenv
 
 load_dotenv()
 
 VAPI_API_KEY = os.getenv("VAPI_API_KEY")
 ASSISTANT_ID = os.getenv("ASSISTANT_ID")
+VAPI_API_BASE = os.getenv("VAPI_API_BASE", "https://api.vapi.ai").rstrip("/")
 
 if not VAPI_API_KEY or not ASSISTANT_ID:
     print("❌ Please set VAPI_API_KEY and ASSISTANT_ID in your .env file.")
@@ -55,8 +57,9 @@ body = {
     }
 }
 
-response = requests.patch(
-    f"https://api.vapi.ai/assistant/{ASSISTANT_ID}",
+response = http_transport.request(
+    "PATCH",
+    f"{VAPI_API_BASE}/assistant/{ASSISTANT_ID}",
     headers=headers,
     json=body
 )
@@ -67,8 +70,9 @@ if response.status_code == 200:
         print(f"✅ Webhook updated successfully: {updated_data['server']['url']}")
         
         # Verify the update
-        verify_response = requests.get(
-            f"https://api.vapi.ai/assistant/{ASSISTANT_ID}",
+        verify_response = http_transport.request(
+            "GET",
+            f"{VAPI_API_BASE}/assistant/{ASSISTANT_ID}",
             headers=headers
         )
         print("Current assistant config:", verify_response.json())
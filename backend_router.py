@@ -0,0 +1,450 @@
+"""Health-aware routing across interchangeable STT and TTS backends.
+
+Each router tries its backends in configured preference order, demoting any
+whose circuit breaker is open, whose recent error rate is too high, or whose
+p95 latency is far behind the best alternative. Optionally the next backend
+is started as a hedge when the first hasn't answered within its own p95.
+"""
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, CancelledError, wait, FIRST_COMPLETED
+import admission
+import metrics
+
+logger = logging.getLogger(__name__)
+
+STT_BACKENDS = os.getenv("STT_BACKENDS", "assemblyai,whisper,google")
+TTS_BACKENDS = os.getenv("TTS_BACKENDS", "elevenlabs,gtts")
+# Routers (stt, tts) that send a hedged request to the next backend
+ROUTER_HEDGE = {r.strip() for r in os.getenv("ROUTER_HEDGE", "").lower().split(",") if r.strip()}
+ROUTER_HEDGE_MIN_DELAY = float(os.getenv("ROUTER_HEDGE_MIN_DELAY", 0.5))
+ROUTER_WINDOW = int(os.getenv("ROUTER_WINDOW", 100))
+ROUTER_MIN_SAMPLES = 10
+ROUTER_MAX_ERROR_RATE = float(os.getenv("ROUTER_MAX_ERROR_RATE", 0.5))
+ROUTER_SLOW_FACTOR = float(os.getenv("ROUTER_SLOW_FACTOR", 3.0))
+ROUTER_BREAKER_FAILURES = int(os.getenv("ROUTER_BREAKER_FAILURES", 5))
+ROUTER_BREAKER_COOLDOWN = float(os.getenv("ROUTER_BREAKER_COOLDOWN", 30))
+
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("ROUTER_WORKERS", 16)), thread_name_prefix="router")
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Backend:
+    """One provider behind a router, with rolling stats and a circuit breaker."""
+
+    def __init__(self, name, call, call_async=None, available=None):
+        self.name = name
+        self._call = call
+        self._call_async = call_async
+        self._available = available or (lambda: True)
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=ROUTER_WINDOW)  # (latency, ok)
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+        self.counts = {"calls": 0, "errors": 0, "hedges": 0, "breaker_trips": 0}
+        # Concurrency limit shared by every router and request using this backend
+        self.limiter = admission.backend_limiter(name)
+
+    def available(self):
+        return self._available()
+
+    def has_capacity(self):
+        return self.limiter is None or self.limiter.has_capacity()
+
+    def breaker_state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at < ROUTER_BREAKER_COOLDOWN:
+            return "open"
+        return "half_open"
+
+    def admit(self):
+        """Whether to send a request now; half-open lets a single trial through."""
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record(self, latency, ok):
+        with self._lock:
+            self._samples.append((latency, ok))
+            self.counts["calls"] += 1
+            self._trial = False
+            if ok:
+                self._failures = 0
+                self._opened_at = None
+                return
+            self.counts["errors"] += 1
+            self._failures += 1
+            if self._failures >= ROUTER_BREAKER_FAILURES and self._state() != "open":
+                self._opened_at = time.monotonic()
+                self.counts["breaker_trips"] += 1
+                logger.warning(f"Circuit breaker open for {self.name} after {self._failures} failures")
+
+    def latencies(self):
+        with self._lock:
+            return [latency for latency, ok in self._samples if ok]
+
+    def error_rate(self):
+        with self._lock:
+            if len(self._samples) < ROUTER_MIN_SAMPLES:
+                return 0.0
+            return sum(1 for _, ok in self._samples if not ok) / len(self._samples)
+
+    def p95(self):
+        latencies = self.latencies()
+        return _percentile(latencies, 0.95) if len(latencies) >= ROUTER_MIN_SAMPLES else None
+
+    def hedge_delay(self):
+        p95 = self.p95()
+        return max(ROUTER_HEDGE_MIN_DELAY, p95) if p95 is not None else None
+
+    def run(self, *args, race=None):
+        return self.measure(self._call, *args, race=race)
+
+    def measure(self, fn, *args, race=None):
+        """Run fn, recording its latency and outcome.
+
+        `race` is set once a hedged call has its answer; a loser still running
+        then records nothing, as its inputs (e.g. a closed AudioBuffer) may be gone.
+        """
+        # Time spent waiting for a slot is neither latency nor an error of the backend
+        with self.limiter.slot() if self.limiter else nullcontext():
+            if race is not None and race.is_set():
+                raise CancelledError()
+            start = time.perf_counter()
+            try:
+                result = fn(*args)
+            except Exception:
+                if race is None or not race.is_set():
+                    self.record(time.perf_counter() - start, False)
+                raise
+            if race is None or not race.is_set():
+                self.record(time.perf_counter() - start, True)
+            return result
+
+    async def run_async(self, *args):
+        if self.limiter is None:
+            return await self._run_async(*args)
+        async with self.limiter.slot_async():
+            return await self._run_async(*args)
+
+    async def _run_async(self, *args):
+        start = time.perf_counter()
+        try:
+            if self._call_async is not None:
+                result = await self._call_async(*args)
+            else:
+                result = await asyncio.get_running_loop().run_in_executor(_executor, self._call, *args)
+        except Exception:
+            self.record(time.perf_counter() - start, False)
+            raise
+        self.record(time.perf_counter() - start, True)
+        return result
+
+    def stats(self):
+        latencies = self.latencies()
+        with self._lock:
+            result = dict(self.counts, breaker=self._state(), window=len(self._samples))
+        result["error_rate"] = round(self.error_rate(), 4)
+        result["p50"] = round(_percentile(latencies, 0.5), 3) if latencies else None
+        result["p95"] = round(_percentile(latencies, 0.95), 3) if latencies else None
+        result["available"] = self.available()
+        if self.limiter is not None:
+            result["admission"] = self.limiter.stats()
+        return result
+
+
+class Router:
+    def __init__(self, name, backends, hedge=False):
+        self.name = name
+        self.backends = backends
+        self.hedge = hedge
+
+    def order(self):
+        """Available backends, healthy ones first, each group in preference order."""
+        candidates = [b for b in self.backends if b.available()]
+        p95s = {b.name: b.p95() for b in candidates}
+        known = [p for p in p95s.values() if p is not None]
+        fastest = min(known) if known else None
+
+        def healthy(backend):
+            if backend.breaker_state() == "open" or backend.error_rate() >= ROUTER_MAX_ERROR_RATE:
+                return False
+            p95 = p95s[backend.name]
+            return p95 is None or fastest is None or p95 <= fastest * ROUTER_SLOW_FACTOR
+
+        return sorted(candidates, key=lambda b: not healthy(b))
+
+    def _next(self, pending):
+        # Backends are admitted only when actually tried, so a half-open breaker's
+        # single trial slot isn't taken by a fallback that never runs. One with a
+        # free slot goes first, so a saturated backend (e.g. local Whisper) spills
+        # over to the next instead of queueing; if all are full, wait on the first.
+        for free_only in (True, False):
+            for backend in list(pending):
+                if free_only and not backend.has_capacity():
+                    continue
+                pending.remove(backend)
+                if backend.admit():
+                    return backend
+        return None
+
+    def call(self, *args):
+        """Run the request on the best backend, failing over (and hedging) down the list."""
+        pending = self.order()
+        if self.hedge:
+            return self._call_hedged(pending, args)
+
+        last = None
+        while True:
+            backend = self._next(pending)
+            if backend is None:
+                raise last or RuntimeError(f"No {self.name} backend available")
+            try:
+                return backend.run(*args)
+            except Exception as e:
+                logger.warning(f"{self.name} backend {backend.name} failed: {str(e)}")
+                last = e
+
+    def call_with(self, fn):
+        """Fail over like call(), but run fn(backend) instead of the backend's own call."""
+        pending = self.order()
+        last = None
+        while True:
+            backend = self._next(pending)
+            if backend is None:
+                raise last or RuntimeError(f"No {self.name} backend available")
+            try:
+                return backend.measure(fn, backend)
+            except Exception as e:
+                logger.warning(f"{self.name} backend {backend.name} failed: {str(e)}")
+                last = e
+
+    def _call_hedged(self, pending, args):
+        backend = self._next(pending)
+        if backend is None:
+            raise RuntimeError(f"No {self.name} backend available")
+        race = threading.Event()
+        futures = {_executor.submit(metrics.copy_context().run, backend.run, *args, race=race): backend}
+        # No hedging until the backend has enough history for a p95
+        delay = backend.hedge_delay()
+        last = None
+        try:
+            while futures:
+                done, _ = wait(futures, timeout=delay if pending else None, return_when=FIRST_COMPLETED)
+                for future in done:
+                    backend = futures.pop(future)
+                    try:
+                        return future.result()
+                    except Exception as e:
+                        logger.warning(f"{self.name} backend {backend.name} failed: {str(e)}")
+                        last = e
+                if not done:
+                    backend.counts["hedges"] += 1
+                backend = self._next(pending)
+                if backend is not None:
+                    futures[_executor.submit(metrics.copy_context().run, backend.run, *args, race=race)] = backend
+                    delay = backend.hedge_delay()
+            raise last
+        finally:
+            # Losers that haven't started never will; running ones finish unrecorded
+            race.set()
+            for future in futures:
+                future.cancel()
+
+    async def call_async(self, *args):
+        pending = self.order()
+        if self.hedge:
+            return await self._call_hedged_async(pending, args)
+
+        last = None
+        while True:
+            backend = self._next(pending)
+            if backend is None:
+                raise last or RuntimeError(f"No {self.name} backend available")
+            try:
+                return await backend.run_async(*args)
+            except Exception as e:
+                logger.warning(f"{self.name} backend {backend.name} failed: {str(e)}")
+                last = e
+
+    def _start(self, backend, args):
+        task = asyncio.ensure_future(backend.run_async(*args))
+        # A hedge that loses may fail after we've returned; don't warn about it
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return task
+
+    async def _call_hedged_async(self, pending, args):
+        backend = self._next(pending)
+        if backend is None:
+            raise RuntimeError(f"No {self.name} backend available")
+        tasks = {self._start(backend, args): backend}
+        delay = backend.hedge_delay()
+        last = None
+        try:
+            while tasks:
+                done, _ = await asyncio.wait(tasks, timeout=delay if pending else None,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    backend = tasks.pop(task)
+                    if task.exception() is None:
+                        return task.result()
+                    logger.warning(f"{self.name} backend {backend.name} failed: {str(task.exception())}")
+                    last = task.exception()
+                if not done:
+                    backend.counts["hedges"] += 1
+                backend = self._next(pending)
+                if backend is not None:
+                    tasks[self._start(backend, args)] = backend
+                    delay = backend.hedge_delay()
+            raise last
+        finally:
+            # Cancelled losers release their slots and record no stats
+            for task in tasks:
+                task.cancel()
+
+    def stats(self):
+        return {
+            "hedge": self.hedge,
+            "order": [b.name for b in self.order()],
+            "backends": {b.name: b.stats() for b in self.backends}
+        }
+
+
+# --- STT backends: each takes an audio_io.AudioBuffer and returns (text, language) ---
+
+# The router fails over and hedges, so vendor calls made through it retry little themselves
+
+def _assemblyai(audio):
+    from assemblyai_stt import transcribe_audio
+    from http_transport import HTTP_LIVE_MAX_RETRIES
+    return transcribe_audio(audio, max_retries=HTTP_LIVE_MAX_RETRIES)
+
+
+async def _assemblyai_async(audio):
+    from assemblyai_stt import transcribe_audio_async
+    from http_transport import HTTP_LIVE_MAX_RETRIES
+    return await transcribe_audio_async(audio, max_retries=HTTP_LIVE_MAX_RETRIES)
+
+
+def _whisper(audio):
+    from whisper_stt import transcribe_with_confidence
+    return transcribe_with_confidence(audio)
+
+
+async def _whisper_async(audio):
+    from whisper_stt import submit
+    return await asyncio.wrap_future(submit(audio))
+
+
+def _google(audio):
+    from stt_google import transcribe_audio
+    return transcribe_audio(audio)
+
+
+# --- TTS backends: each takes (text, language) and returns a cached audio filename ---
+
+def _elevenlabs_identity(text, lang):
+    from elevenlabs_tts import get_voice_id, get_voice_settings, MODEL_ID
+    return get_voice_id(lang, text), MODEL_ID, get_voice_settings(lang, text)
+
+
+def _elevenlabs(text, lang):
+    from tts_cache import get_or_create
+    from elevenlabs_tts import generate_speech
+    from http_transport import HTTP_LIVE_MAX_RETRIES
+
+    def render(path):
+        if not generate_speech(text, lang, path, max_retries=HTTP_LIVE_MAX_RETRIES):
+            raise Exception("TTS generation failed")
+
+    return get_or_create(text, lang, *_elevenlabs_identity(text, lang), render)
+
+
+async def _elevenlabs_async(text, lang):
+    from tts_cache import get_or_create_async
+    from elevenlabs_tts import generate_speech_async
+    from http_transport import HTTP_LIVE_MAX_RETRIES
+
+    async def render(path):
+        if not await generate_speech_async(text, lang, path, max_retries=HTTP_LIVE_MAX_RETRIES):
+            raise Exception("TTS generation failed")
+
+    return await get_or_create_async(text, lang, *_elevenlabs_identity(text, lang), render)
+
+
+def _gtts(text, lang):
+    from tts_cache import get_or_create
+
+    def render(path):
+        from gtts import gTTS
+        with metrics.stage("tts", backend="gtts", language=lang):
+            gTTS(text=text, lang=lang).save(path)
+
+    return get_or_create(text, lang, "gtts", "gtts", None, render)
+
+
+async def _gtts_async(text, lang):
+    from tts_cache import get_or_create_async
+
+    async def render(path):
+        from gtts import gTTS
+        with metrics.stage("tts", backend="gtts", language=lang):
+            await asyncio.get_running_loop().run_in_executor(None, lambda: gTTS(text=text, lang=lang).save(path))
+
+    return await get_or_create_async(text, lang, "gtts", "gtts", None, render)
+
+
+def _google_configured():
+    return os.path.exists(os.getenv("GOOGLE_APPLICATION_CREDENTIALS", "google_creds.json"))
+
+
+BACKENDS = {
+    "stt": {
+        "assemblyai": lambda: Backend("assemblyai", _assemblyai, _assemblyai_async,
+                                      lambda: bool(os.getenv("ASSEMBLYAI_API_KEY"))),
+        "whisper": lambda: Backend("whisper", _whisper, _whisper_async),
+        "google": lambda: Backend("google", _google, available=_google_configured)
+    },
+    "tts": {
+        "elevenlabs": lambda: Backend("elevenlabs", _elevenlabs, _elevenlabs_async,
+                                      lambda: bool(os.getenv("ELEVENLABS_API_KEY"))),
+        "gtts": lambda: Backend("gtts", _gtts, _gtts_async)
+    }
+}
+PREFERENCES = {"stt": STT_BACKENDS, "tts": TTS_BACKENDS}
+
+_routers = {}
+_routers_lock = threading.Lock()
+
+
+def get_router(name):
+    with _routers_lock:
+        router = _routers.get(name)
+        if router is None:
+            names = [n.strip() for n in PREFERENCES[name].split(",") if n.strip() in BACKENDS[name]]
+            router = _routers[name] = Router(name, [BACKENDS[name][n]() for n in names], hedge=name in ROUTER_HEDGE)
+    return router
+
+
+def stats():
+    return {name: get_router(name).stats() for name in BACKENDS}
@@ -0,0 +1,255 @@
+"""Bulk TTS rendering for IVR menus and campaign prompts.
+
+    python batch_tts.py prompts.json [--manifest manifest.json] [--output-dir DIR] [--concurrency N]
+
+Input is a JSON list (or JSONL) of {"text": ..., "language": ..., "id": optional}.
+Items are deduplicated by TTS cache key, so repeated prompts and audio that
+is already cached cost nothing, and the rest are rendered concurrently.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import asyncio
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+import admission
+import http_transport
+import metrics
+import tts_cache
+from phrase_bank import voice_identity
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+TTS_BATCH_DIR = os.getenv("TTS_BATCH_DIR", "tts_batches")
+# Starting and maximum number of renders in flight; 429s shrink it, successes grow it back
+TTS_BATCH_CONCURRENCY = int(os.getenv("TTS_BATCH_CONCURRENCY", 4))
+TTS_BATCH_MAX_ITEMS = int(os.getenv("TTS_BATCH_MAX_ITEMS", 1000))
+TTS_BATCH_RETRIES = 2
+THROTTLE_URL = os.getenv("ELEVENLABS_API_BASE", "https://api.elevenlabs.io/v1")
+
+_batches = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts-batch")
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit: halve on a 429, add one after `limit` clean renders."""
+
+    def __init__(self, limit):
+        self.max_limit = max(1, limit)
+        self.limit = self.max_limit
+        self._active = 0
+        self._streak = 0
+        self._cond = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._active < self.limit)
+            self._active += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        async with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    async def observe(self, throttled):
+        async with self._cond:
+            if throttled:
+                self._streak = 0
+                if self.limit > 1:
+                    self.limit = max(1, self.limit // 2)
+                    logger.warning(f"Rate limited, batch concurrency down to {self.limit}")
+            else:
+                self._streak += 1
+                if self._streak >= self.limit and self.limit < self.max_limit:
+                    self._streak = 0
+                    self.limit += 1
+            self._cond.notify_all()
+
+
+def load_items(path):
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+        return json.load(f)
+
+
+def plan(items):
+    """Validate items and group them by cache key; returns (entries, unique)."""
+    entries, unique = [], {}
+    for index, item in enumerate(items):
+        text = (item.get("text") or "").strip()
+        language = item.get("language", "en")
+        if not text:
+            raise ValueError(f"Item {index} has no text")
+        voice_id, model_id, settings = voice_identity(language, text)
+        key = tts_cache.cache_key(text, language, voice_id, model_id, settings)
+        entries.append({"id": item.get("id", index), "text": text, "language": language, "key": key})
+        unique.setdefault(key, (text, language, voice_id, model_id, settings))
+    return entries, unique
+
+
+async def _render(text, language, voice_id, model_id, settings):
+    if os.getenv("ELEVENLABS_API_KEY"):
+        from elevenlabs_tts import generate_speech_async
+
+        async def render(path):
+            # Shares the router's elevenlabs slots, behind live synthesis
+            async with admission.batch_slot_async("elevenlabs"):
+                if not await generate_speech_async(text, language, path):
+                    raise Exception("TTS generation failed")
+    else:
+        async def render(path):
+            from gtts import gTTS
+            async with admission.batch_slot_async("gtts"):
+                await asyncio.get_running_loop().run_in_executor(None, lambda: gTTS(text=text, lang=language).save(path))
+
+    return await tts_cache.get_or_create_async(text, language, voice_id, model_id, settings, render)
+
+
+async def run_batch(items, concurrency=TTS_BATCH_CONCURRENCY, on_progress=None):
+    """Render every item, returning the manifest dict."""
+    entries, unique = plan(items)
+    results = {}  # key -> {"file", "status", "error"}
+    for key in unique:
+        filename = tts_cache.lookup(key)
+        if filename:
+            results[key] = {"file": filename, "status": "cached"}
+
+    limiter = AdaptiveLimiter(concurrency)
+    started = time.perf_counter()
+
+    async def one(key):
+        for attempt in range(TTS_BATCH_RETRIES + 1):
+            async with limiter:
+                before = http_transport.throttled(THROTTLE_URL)
+                try:
+                    filename = await _render(*unique[key])
+                    results[key] = {"file": filename, "status": "rendered"}
+                except Exception as e:
+                    results[key] = {"file": None, "status": "failed", "error": str(e)}
+                throttled = http_transport.throttled(THROTTLE_URL) > before
+            await limiter.observe(throttled)
+            if results[key]["status"] != "failed":
+                break
+        if on_progress:
+            on_progress(sum(1 for r in results.values() if r["status"] != "failed"), len(unique))
+
+    try:
+        await asyncio.gather(*(one(key) for key in unique if key not in results))
+    finally:
+        await http_transport.close_async_sessions()
+
+    for entry in entries:
+        entry.update(results[entry.pop("key")])
+    counts = {status: sum(1 for e in entries if e["status"] == status) for status in ("cached", "rendered", "failed")}
+    return {
+        "items": entries,
+        "unique": len(unique),
+        "counts": counts,
+        "seconds": round(time.perf_counter() - started, 2),
+        "final_concurrency": limiter.limit
+    }
+
+
+def export(manifest, output_dir):
+    """Link (or copy) rendered files into output_dir under the manifest's file names."""
+    os.makedirs(output_dir, exist_ok=True)
+    for entry in manifest["items"]:
+        if not entry.get("file"):
+            continue
+        src = os.path.join(tts_cache.AUDIO_DIR, entry["file"])
+        dest = os.path.join(output_dir, entry["file"])
+        if os.path.exists(dest):
+            continue
+        try:
+            os.link(src, dest)
+        except OSError:
+            shutil.copyfile(src, dest)
+
+
+# --- Background batches for the /tts/batch endpoint ---
+
+def _path(batch_id):
+    # Batch ids come from callers, so keep them out of other directories
+    return os.path.join(TTS_BATCH_DIR, f"{os.path.basename(batch_id)}.json")
+
+
+def _save(batch):
+    path = _path(batch["id"])
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(batch, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def load_batch(batch_id):
+    try:
+        with open(_path(batch_id), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def submit(items, concurrency=TTS_BATCH_CONCURRENCY):
+    if not items:
+        raise ValueError("No items provided")
+    if len(items) > TTS_BATCH_MAX_ITEMS:
+        raise ValueError(f"At most {TTS_BATCH_MAX_ITEMS} items per batch")
+    plan(items)  # reject bad input now rather than in the background
+
+    os.makedirs(TTS_BATCH_DIR, exist_ok=True)
+    batch = {"id": uuid.uuid4().hex, "status": "queued", "created_at": time.time(), "done": 0, "total": None}
+    _save(batch)
+
+    def progress(done, total):
+        batch.update(done=done, total=total)
+        _save(batch)
+
+    def run():
+        batch["status"] = "running"
+        _save(batch)
+        try:
+            batch["manifest"] = asyncio.run(run_batch(items, concurrency, progress))
+            batch["status"] = "completed"
+        except Exception as e:
+            logger.error(f"TTS batch {batch['id']} failed: {str(e)}", exc_info=True)
+            batch.update(status="error", error=str(e))
+        _save(batch)
+
+    _batches.submit(metrics.copy_context().run, run)
+    return batch
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render a batch of TTS prompts through the TTS cache")
+    parser.add_argument("items", help="JSON list or JSONL file of {text, language, id}")
+    parser.add_argument("--manifest", default="tts_manifest.json")
+    parser.add_argument("--output-dir", help="also link the audio files into this directory")
+    parser.add_argument("--concurrency", type=int, default=TTS_BATCH_CONCURRENCY)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    manifest = asyncio.run(run_batch(load_items(args.items), args.concurrency))
+    with open(args.manifest, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    if args.output_dir:
+        export(manifest, args.output_dir)
+
+    counts = manifest["counts"]
+    print(f"✅ {len(manifest['items'])} items ({manifest['unique']} unique): {counts['cached']} cached, "
+          f"{counts['rendered']} rendered in {manifest['seconds']}s. Manifest: {args.manifest}")
+    if counts["failed"]:
+        print(f"❌ {counts['failed']} failed")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,627 @@
+"""Offline performance benchmarks; nothing here calls a paid API.
+
+    python benchmark.py app [--profile realistic] [--mix vapi=4,tts=2,generate=1,stt=1]
+                            [--concurrency 8] [--requests 200 | --duration 60]
+                            [--output report.json] [--baseline report.json]
+    python benchmark.py whisper [--model-size tiny,small] [--compute-type int8,float32] [--runs 5]
+
+`app` starts mock_vendors.py and the app pointed at it, replays the payloads
+and recordings in bench_fixtures/ at the given concurrency and reports
+p50/p95/p99 per endpoint (measured here) and per stage (from the app's
+/metrics), throughput and the app's peak RSS. With --baseline it exits 1 when
+a p95 or the throughput regressed by more than --tolerance.
+
+`whisper` times the local faster-whisper path in-process for each model size
+and compute type.
+"""
+import os
+import re
+import sys
+import json
+import glob
+import math
+import time
+import wave
+import array
+import random
+import signal
+import tempfile
+import asyncio
+import logging
+import argparse
+import itertools
+import threading
+import subprocess
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_fixtures")
+QUANTILES = (0.5, 0.95, 0.99)
+DEFAULT_MIX = "vapi=4,tts=2,generate=1,stt=1"
+STARTUP_TIMEOUT = 120
+SERVERS = {
+    "flask": lambda port, workers: [sys.executable, "app.py"],
+    "gunicorn": lambda port, workers: ["gunicorn", "-w", str(workers), "-b", f"127.0.0.1:{port}", "app:app"],
+    "asgi": lambda port, workers: ["uvicorn", "asgi:app", "--port", str(port), "--workers", str(workers)]
+}
+
+
+# --- Statistics ---
+
+def percentile(values, q):
+    """Linear-interpolated quantile of a list of numbers."""
+    if not values:
+        return None
+    values = sorted(values)
+    pos = (len(values) - 1) * q
+    low = int(pos)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (pos - low)
+
+
+def summarize(latencies):
+    summary = {"count": len(latencies)}
+    for q in QUANTILES:
+        value = percentile(latencies, q)
+        summary[f"p{int(q * 100)}"] = round(value, 4) if value is not None else None
+    summary["mean"] = round(sum(latencies) / len(latencies), 4) if latencies else None
+    return summary
+
+
+_SAMPLE = re.compile(r'^(\w+)(?:\{(.*)\})? (\S+)$')
+_LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def parse_histograms(text, name="stage_duration_seconds"):
+    """{labels: {"buckets": {le: count}, "sum": s, "count": n}} for one histogram in /metrics text."""
+    series = defaultdict(lambda: {"buckets": {}, "sum": 0.0, "count": 0})
+    for line in text.splitlines():
+        match = _SAMPLE.match(line)
+        if not match or not match.group(1).startswith(name):
+            continue
+        metric, value = match.group(1), float(match.group(3))
+        labels = dict(_LABEL.findall(match.group(2) or ""))
+        le = labels.pop("le", None)
+        key = tuple(sorted(labels.items()))
+        if metric == f"{name}_bucket":
+            series[key]["buckets"][math.inf if le == "+Inf" else float(le)] = value
+        elif metric == f"{name}_sum":
+            series[key]["sum"] = value
+        elif metric == f"{name}_count":
+            series[key]["count"] = value
+    return dict(series)
+
+
+def histogram_delta(before, after):
+    """What was observed between two parse_histograms() snapshots."""
+    delta = {}
+    for key, b in after.items():
+        a = before.get(key, {"buckets": {}, "sum": 0.0, "count": 0})
+        count = b["count"] - a["count"]
+        if count > 0:
+            delta[key] = {
+                "buckets": {le: n - a["buckets"].get(le, 0) for le, n in b["buckets"].items()},
+                "sum": b["sum"] - a["sum"],
+                "count": count
+            }
+    return delta
+
+
+def bucket_quantile(buckets, q):
+    """Quantile estimated from cumulative buckets, like Prometheus' histogram_quantile."""
+    bounds = sorted(buckets)
+    total = buckets[bounds[-1]]
+    if not total:
+        return None
+    rank = q * total
+    lower, below = 0.0, 0
+    for le in bounds:
+        if buckets[le] >= rank:
+            if math.isinf(le):
+                return lower  # past the last finite bucket; its bound is the best we know
+            return lower + (le - lower) * (rank - below) / max(buckets[le] - below, 1e-9)
+        lower, below = le, buckets[le]
+    return lower
+
+
+def stage_summary(delta):
+    """Per stage/backend/outcome summaries, summed over the other labels (language, model)."""
+    merged = {}
+    for key, h in delta.items():
+        labels = dict(key)
+        name = "/".join(labels[k] for k in ("stage", "backend", "outcome") if k in labels)
+        total = merged.setdefault(name, {"buckets": defaultdict(float), "sum": 0.0, "count": 0})
+        for le, n in h["buckets"].items():
+            total["buckets"][le] += n
+        total["sum"] += h["sum"]
+        total["count"] += h["count"]
+
+    stages = {}
+    for name, h in sorted(merged.items()):
+        summary = {"count": int(h["count"])}
+        for q in QUANTILES:
+            value = bucket_quantile(h["buckets"], q)
+            summary[f"p{int(q * 100)}"] = round(value, 4) if value is not None else None
+        summary["mean"] = round(h["sum"] / h["count"], 4)
+        stages[name] = summary
+    return stages
+
+
+# --- Memory ---
+
+def _children():
+    children = defaultdict(list)
+    for stat in glob.glob("/proc/[0-9]*/stat"):
+        try:
+            with open(stat) as f:
+                # The command name may contain spaces; fields after it are fixed
+                fields = f.read().rsplit(")", 1)[1].split()
+            children[int(fields[1])].append(int(stat.split("/")[2]))
+        except (OSError, IndexError, ValueError):
+            pass
+    return children
+
+
+def tree_rss_bytes(pid):
+    """RSS of a process and its descendants (gunicorn/uvicorn workers), Linux only."""
+    children = _children()
+    total, pending = 0, [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/statm") as f:
+                total += int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, IndexError):
+            continue
+        pending.extend(children.get(current, []))
+    return total or None
+
+
+class MemorySampler(threading.Thread):
+    def __init__(self, pid, interval=0.5):
+        super().__init__(name="rss-sampler", daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.start_bytes = tree_rss_bytes(pid)
+        self.peak_bytes = self.start_bytes or 0
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            rss = tree_rss_bytes(self.pid)
+            if rss:
+                self.peak_bytes = max(self.peak_bytes, rss)
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        return {
+            "start_mb": round(self.start_bytes / 2**20, 1) if self.start_bytes else None,
+            "peak_mb": round(self.peak_bytes / 2**20, 1) if self.peak_bytes else None,
+            "end_mb": round((tree_rss_bytes(self.pid) or 0) / 2**20, 1)
+        }
+
+
+# --- Fixtures and scenarios ---
+
+def synthetic_audio(path, seconds=6.0, rate=16000):
+    """Voice-band tone bursts separated by pauses, for runs without recorded fixtures."""
+    samples = array.array("h")
+    for i in range(int(seconds * rate)):
+        t = i / rate
+        on = (t % 1.5) < 1.1
+        tone = math.sin(2 * math.pi * 220 * t) + 0.5 * math.sin(2 * math.pi * 660 * t) if on else 0.0
+        samples.append(int(9000 * tone + random.uniform(-60, 60)))
+    with wave.open(path, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(samples.tobytes())
+    return path
+
+
+def load_fixtures(directory=FIXTURES_DIR):
+    def load(name, default):
+        path = os.path.join(directory, name)
+        if not os.path.exists(path):
+            return default
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    vapi = []
+    for path in sorted(glob.glob(os.path.join(directory, "vapi", "*.json"))):
+        with open(path, encoding="utf-8") as f:
+            vapi.append(json.load(f))
+
+    audio = sorted(p for p in glob.glob(os.path.join(directory, "audio", "*")) if os.path.isfile(p))
+    if not audio:
+        audio = [synthetic_audio(os.path.join(tempfile.gettempdir(), "bench_synthetic.wav"))]
+    audio_bytes = []
+    for path in audio:
+        with open(path, "rb") as f:
+            audio_bytes.append((os.path.basename(path), f.read()))
+
+    return {
+        "vapi": vapi,
+        "tts": load("tts.json", [{"text": "Please hold while I check that for you.", "language": "en"}]),
+        "generate": load("generate.json", [[{"role": "user", "content": "Hello"}]]),
+        "audio": audio_bytes
+    }
+
+
+def _vary(text, n, unique):
+    # A per-request suffix defeats the TTS and chat caches when measuring the uncached path
+    return f"{text} ({n})" if unique else text
+
+
+def _stt(fixtures, n, worker, unique):
+    import aiohttp
+    name, data = fixtures["audio"][n % len(fixtures["audio"])]
+    form = aiohttp.FormData()
+    form.add_field("audio", data, filename=name)
+    return "POST", "/stt", {"data": form}
+
+
+def _tts(fixtures, n, worker, unique):
+    item = dict(fixtures["tts"][n % len(fixtures["tts"])])
+    item["text"] = _vary(item["text"], n, unique)
+    return "POST", "/tts", {"json": item}
+
+
+def _generate(fixtures, n, worker, unique):
+    messages = [dict(m) for m in fixtures["generate"][n % len(fixtures["generate"])]]
+    messages[-1]["content"] = _vary(messages[-1]["content"], n, unique)
+    return "POST", "/generate", {"json": {"messages": messages}}
+
+
+def _vapi(fixtures, n, worker, unique):
+    # Each worker plays one caller: its payloads share a call id, so call
+    # sessions grow and end as they would on a live call
+    payload = json.loads(json.dumps(fixtures["vapi"][n % len(fixtures["vapi"])]))
+    message = payload.get("message", {})
+    if message.get("call", {}).get("id"):
+        message["call"]["id"] = f"{message['call']['id']}-{worker}"
+    for turn in reversed(message.get("conversation", [])):
+        if turn.get("role") == "user":
+            turn["content"] = _vary(turn["content"], n, unique)
+            break
+    return "POST", "/vapi-webhook", {"json": payload}
+
+
+SCENARIOS = {
+    "stt": _stt,
+    "tts": _tts,
+    "generate": _generate,
+    "vapi": _vapi
+}
+
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario: {name} (choose from {', '.join(SCENARIOS)})")
+        weights[name] = int(weight or 1)
+    return weights
+
+
+# --- Load generation ---
+
+async def run_load(base_url, fixtures, weights, concurrency, requests=None, duration=None, unique=False, seed=0):
+    """Closed loop: `concurrency` workers each send their next request when the last one returns."""
+    import aiohttp
+
+    rng = random.Random(seed)
+    names = [name for name, weight in weights.items() for _ in range(weight)]
+    counter = itertools.count()
+    results = []
+    deadline = time.monotonic() + duration if duration else None
+
+    async def worker(index, session):
+        while True:
+            n = next(counter)
+            if (requests is not None and n >= requests) or (deadline and time.monotonic() >= deadline):
+                return
+            scenario = rng.choice(names)
+            method, path, kwargs = SCENARIOS[scenario](fixtures, n, index, unique)
+            start = time.perf_counter()
+            try:
+                async with session.request(method, f"{base_url}{path}", **kwargs) as response:
+                    body = await response.read()
+                    status = response.status
+            except Exception as e:
+                logger.warning(f"{scenario} request failed: {str(e)}")
+                body, status = b"", None
+            results.append((scenario, path, status, time.perf_counter() - start, len(body)))
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=300)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(i, session) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return results, elapsed
+
+
+def endpoint_summary(results, elapsed):
+    by_endpoint = defaultdict(list)
+    for scenario, path, status, latency, size in results:
+        by_endpoint[path].append((status, latency))
+    endpoints = {}
+    for path, rows in sorted(by_endpoint.items()):
+        summary = summarize([latency for _, latency in rows])
+        summary["errors"] = sum(1 for status, _ in rows if status is None or status >= 400)
+        summary["rps"] = round(len(rows) / elapsed, 2)
+        endpoints[path] = summary
+    return endpoints
+
+
+def _get(url, timeout=5):
+    import requests
+    return requests.get(url, timeout=timeout)
+
+
+def _wait_for(url, process, timeout=STARTUP_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} never came up; the process exited with {process.returncode}")
+        try:
+            if _get(url, timeout=2).status_code == 200:
+                return
+        except Exception:
+            pass
+        time.sleep(0.25)
+    raise TimeoutError(f"{url} not ready after {timeout}s")
+
+
+def _stop(process):
+    if process and process.poll() is None:
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def _scrape(base_url):
+    try:
+        return parse_histograms(_get(f"{base_url}/metrics").text)
+    except Exception as e:
+        logger.warning(f"Could not scrape /metrics: {str(e)}")
+        return {}
+
+
+def bench_app(args):
+    from mock_vendors import env_for
+
+    fixtures = load_fixtures(args.fixtures)
+    weights = parse_mix(args.mix)
+    if "vapi" in weights and not fixtures["vapi"]:
+        raise ValueError(f"No Vapi payloads in {args.fixtures}/vapi")
+
+    mocks = app = None
+    env = dict(os.environ)
+    try:
+        if args.url:
+            base_url = args.url.rstrip("/")
+        else:
+            mocks = subprocess.Popen([sys.executable, "mock_vendors.py", "--profile", args.profile,
+                                      "--port", str(args.mock_port), "--seed", str(args.seed)],
+                                     stdout=subprocess.DEVNULL)
+            _wait_for(f"http://127.0.0.1:{args.mock_port}/health", mocks)
+
+            # Explicit backends, so a .env with real credentials can't route around the mocks
+            env.update(env_for("127.0.0.1", args.mock_port))
+            env.update({"PORT": str(args.port), "STT_BACKENDS": args.stt_backends,
+                        "TTS_BACKENDS": args.tts_backends, "NLTK_DOWNLOAD": "never"})
+            env.pop("GOOGLE_APPLICATION_CREDENTIALS", None)
+            app = subprocess.Popen(SERVERS[args.server](args.port, args.workers), env=env,
+                                   stdout=None if args.verbose else subprocess.DEVNULL,
+                                   stderr=None if args.verbose else subprocess.DEVNULL)
+            base_url = f"http://127.0.0.1:{args.port}"
+            _wait_for(f"{base_url}/ready", app)
+
+        if args.warmup:
+            asyncio.run(run_load(base_url, fixtures, weights, args.concurrency, requests=args.warmup,
+                                 unique=args.unique, seed=args.seed + 1))
+
+        sampler = MemorySampler(app.pid if app else args.pid) if (app or args.pid) else None
+        if sampler:
+            sampler.start()
+        before = _scrape(base_url)
+        results, elapsed = asyncio.run(run_load(base_url, fixtures, weights, args.concurrency,
+                                                requests=None if args.duration else args.requests,
+                                                duration=args.duration, unique=args.unique, seed=args.seed))
+        stages = stage_summary(histogram_delta(before, _scrape(base_url)))
+        memory = sampler.stop() if sampler else None
+    finally:
+        _stop(app)
+        _stop(mocks)
+
+    return {
+        "mode": "app",
+        "config": {"profile": args.profile, "server": args.server, "workers": args.workers, "mix": weights,
+                   "concurrency": args.concurrency, "unique": args.unique},
+        "requests": len(results),
+        "errors": sum(1 for r in results if r[2] is None or r[2] >= 400),
+        "seconds": round(elapsed, 2),
+        "throughput_rps": round(len(results) / elapsed, 2) if elapsed else None,
+        "endpoints": endpoint_summary(results, elapsed),
+        "stages": stages,
+        "memory": memory
+    }
+
+
+# --- Whisper ---
+
+def bench_whisper(args):
+    # Read by whisper_stt at import
+    os.environ["WHISPER_POOL_SIZE"] = str(args.concurrency)
+    os.environ["WHISPER_PROFILE"] = args.whisper_profile
+    os.environ["WHISPER_IDLE_TIMEOUT"] = "0"
+    from concurrent.futures import ThreadPoolExecutor
+    import whisper_stt
+    from audio_io import load_audio
+
+    paths = args.audio or sorted(p for p in glob.glob(os.path.join(FIXTURES_DIR, "audio", "*")) if os.path.isfile(p))
+    if not paths:
+        paths = [synthetic_audio(os.path.join(tempfile.gettempdir(), "bench_synthetic.wav"))]
+    clips = [load_audio(path) for path in paths]
+    audio_seconds = sum(clip.duration for clip in clips)
+
+    runs = []
+    try:
+        for size, compute_type in itertools.product(args.model_size.split(","), args.compute_type.split(",")):
+            pool = whisper_stt.get_model_pool(size, compute_type)
+            pool.warm_up(args.concurrency)
+            loaded = pool.stats()
+
+            def decode(clip):
+                start = time.perf_counter()
+                whisper_stt.transcribe_with_confidence(clip, size, compute_type)
+                return time.perf_counter() - start
+
+            latencies = []
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+                for _ in range(args.runs):
+                    latencies += list(executor.map(decode, clips))
+            elapsed = time.perf_counter() - started
+
+            summary = summarize(latencies)
+            summary.update({
+                "model_size": size,
+                "compute_type": compute_type,
+                "load_seconds": loaded["load_seconds"],
+                "model_memory_mb": round(loaded["memory_bytes"] / 2**20, 1),
+                # Seconds of compute per second of audio; below 1 is faster than real time
+                "real_time_factor": round(sum(latencies) / (audio_seconds * args.runs), 3),
+                "audio_seconds_per_second": round(audio_seconds * args.runs / elapsed, 2)
+            })
+            runs.append(summary)
+            # Free this model before loading the next one
+            pool.evict_idle(max_idle=-1, keep=0)
+    finally:
+        for clip in clips:
+            clip.close()
+
+    return {
+        "mode": "whisper",
+        "config": {"profile": args.whisper_profile, "concurrency": args.concurrency, "runs": args.runs,
+                   "clips": len(clips), "audio_seconds": round(audio_seconds, 2)},
+        "models": runs
+    }
+
+
+# --- Reporting ---
+
+def compare(report, baseline, tolerance):
+    """Regressions of report against baseline: p95s more than `tolerance` slower, or lower throughput."""
+    regressions = []
+
+    def check(kind, name, current, previous, higher_is_worse=True):
+        if current is None or not previous:
+            return
+        change = (current - previous) / previous
+        if (change if higher_is_worse else -change) > tolerance:
+            regressions.append(f"{kind} {name}: {previous} -> {current} ({change:+.0%})")
+
+    for section, key in (("endpoints", "p95"), ("stages", "p95")):
+        for name, current in report.get(section, {}).items():
+            previous = baseline.get(section, {}).get(name)
+            if previous:
+                check(f"{section[:-1]} p95", name, current.get(key), previous.get(key))
+    for current in report.get("models", []):
+        for previous in baseline.get("models", []):
+            if (previous["model_size"], previous["compute_type"]) == (current["model_size"], current["compute_type"]):
+                check("whisper p95", f"{current['model_size']}/{current['compute_type']}", current["p95"], previous["p95"])
+    check("throughput", "rps", report.get("throughput_rps"), baseline.get("throughput_rps"), higher_is_worse=False)
+    return regressions
+
+
+def _table(title, rows, columns):
+    print(f"\n{title}")
+    print("  " + "".join(f"{c:>10}" for c in columns[1:]) + f"  {columns[0]}")
+    for name, row in rows:
+        cells = "".join(f"{'-' if row.get(c) is None else row.get(c):>10}" for c in columns[1:])
+        print(f"  {cells}  {name}")
+
+
+def print_report(report):
+    if report["mode"] == "app":
+        print(f"{report['requests']} requests in {report['seconds']}s: {report['throughput_rps']} req/s, "
+              f"{report['errors']} errors")
+        _table("Endpoints (seconds)", report["endpoints"].items(),
+               ["endpoint", "count", "errors", "p50", "p95", "p99", "rps"])
+        _table("Stages (seconds, from /metrics buckets)", report["stages"].items(),
+               ["stage", "count", "p50", "p95", "p99", "mean"])
+        if report["memory"]:
+            memory = report["memory"]
+            print(f"\nApp RSS: {memory['start_mb']} MB at start, {memory['peak_mb']} MB peak, {memory['end_mb']} MB at end")
+    else:
+        _table("Whisper (seconds per clip)", [(f"{m['model_size']}/{m['compute_type']}", m) for m in report["models"]],
+               ["model", "count", "p50", "p95", "p99", "real_time_factor", "load_seconds", "model_memory_mb"])
+
+
+def main(argv=None):
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--output", help="write the report as JSON")
+    common.add_argument("--baseline", help="report from an earlier run to compare against")
+    common.add_argument("--tolerance", type=float, default=0.2, help="allowed p95/throughput regression (0.2 = 20%%)")
+    common.add_argument("--concurrency", type=int, default=8, help="requests (app) or decodes (whisper) in flight")
+    common.add_argument("--seed", type=int, default=0)
+    common.add_argument("--verbose", action="store_true")
+
+    parser = argparse.ArgumentParser(description="Offline benchmarks against mock vendor APIs")
+    modes = parser.add_subparsers(dest="mode", required=True)
+
+    app = modes.add_parser("app", parents=[common], help="load test the app against mock vendors")
+    app.add_argument("--profile", default="realistic", help="mock_vendors.py profile name or JSON file")
+    app.add_argument("--mix", default=DEFAULT_MIX, help="weighted scenarios, e.g. vapi=4,tts=2,generate=1,stt=1")
+    app.add_argument("--requests", type=int, default=200)
+    app.add_argument("--duration", type=float, help="run for this many seconds instead of --requests")
+    app.add_argument("--warmup", type=int, default=10, help="requests sent before measuring")
+    app.add_argument("--unique", action="store_true", help="vary texts so the TTS and chat caches miss")
+    app.add_argument("--server", choices=sorted(SERVERS), default="flask")
+    app.add_argument("--workers", type=int, default=2, help="gunicorn/uvicorn workers")
+    app.add_argument("--port", type=int, default=5099)
+    app.add_argument("--mock-port", type=int, default=8900)
+    app.add_argument("--stt-backends", default="assemblyai")
+    app.add_argument("--tts-backends", default="elevenlabs")
+    app.add_argument("--fixtures", default=FIXTURES_DIR)
+    app.add_argument("--url", help="benchmark an already running app instead of starting one")
+    app.add_argument("--pid", type=int, help="with --url, sample this process tree's memory")
+
+    whisper = modes.add_parser("whisper", parents=[common], help="time local faster-whisper decodes")
+    whisper.add_argument("--model-size", default="small", help="comma-separated sizes")
+    whisper.add_argument("--compute-type", default="int8", help="comma-separated compute types")
+    whisper.add_argument("--whisper-profile", default="quality", choices=["quality", "latency"])
+    whisper.add_argument("--runs", type=int, default=3, help="passes over the clips per model")
+    whisper.add_argument("--audio", nargs="*", help="clips to decode (default: bench_fixtures/audio)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    report = bench_app(args) if args.mode == "app" else bench_whisper(args)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"\n✅ No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,260 @@
+import os
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+CALL_SESSION_BACKEND = os.getenv("CALL_SESSION_BACKEND", "memory")
+CALL_SESSION_DIR = os.getenv("CALL_SESSION_DIR", "call_sessions")
+CALL_SESSION_TTL = float(os.getenv("CALL_SESSION_TTL", 1800))
+CALL_HISTORY_TOKEN_BUDGET = int(os.getenv("CALL_HISTORY_TOKEN_BUDGET", 1500))
+CALL_SUMMARY_TOKEN_BUDGET = int(os.getenv("CALL_SUMMARY_TOKEN_BUDGET", 300))
+PURGE_INTERVAL = 60
+# Always keep this many recent turns verbatim, whatever the budget says
+MIN_RECENT_TURNS = 2
+
+
+def estimate_tokens(text):
+    # ~4 bytes per token holds up for English; Indic scripts are 3 bytes per
+    # character in UTF-8 and tokenize worse, so bytes track cost better than chars.
+    return len(text.encode("utf-8")) // 4 + 1
+
+
+class CallSession:
+    def __init__(self, call_id, system=None, summary="", turns=None, unsummarized=None, seen=0, updated_at=None):
+        self.call_id = call_id
+        self.system = system
+        self.summary = summary
+        self.turns = turns or []
+        self.unsummarized = unsummarized or []
+        self.seen = seen
+        self.updated_at = updated_at or time.time()
+
+    def ingest(self, conversation):
+        """Append only the messages we haven't seen yet."""
+        if len(conversation) < self.seen:
+            # Vapi sent a shorter history than last time; start over
+            self.summary, self.turns, self.unsummarized, self.seen = "", [], [], 0
+
+        for message in conversation[self.seen:]:
+            role = message.get('role')
+            content = message.get('content') or ''
+            if role == 'system':
+                self.system = content
+            elif role in ('user', 'assistant') and content.strip():
+                self.turns.append({"role": role, "content": content})
+        self.seen = len(conversation)
+        self.updated_at = time.time()
+
+    def history_tokens(self):
+        return sum(estimate_tokens(t['content']) for t in self.turns) + estimate_tokens(self.summary)
+
+    def compact(self, budget=CALL_HISTORY_TOKEN_BUDGET):
+        """Move the oldest turns out of the prompt until it fits the budget.
+
+        Moved turns wait in `unsummarized` until the background summarizer
+        folds them into `summary`, so compaction never adds LLM latency.
+        """
+        while len(self.turns) > MIN_RECENT_TURNS and self.history_tokens() > budget:
+            self.unsummarized.append(self.turns.pop(0))
+
+    def prompt_messages(self):
+        messages = []
+        if self.system:
+            messages.append({"role": "system", "content": self.system})
+        if self.summary:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation: {self.summary}"})
+        return messages + list(self.turns)
+
+    def to_dict(self):
+        return {
+            "call_id": self.call_id,
+            "system": self.system,
+            "summary": self.summary,
+            "turns": self.turns,
+            "unsummarized": self.unsummarized,
+            "seen": self.seen,
+            "updated_at": self.updated_at
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+class MemoryBackend:
+    def __init__(self, ttl=CALL_SESSION_TTL):
+        self.ttl = ttl
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def get(self, call_id):
+        with self._lock:
+            data = self._sessions.get(call_id)
+        if data is None or time.time() - data['updated_at'] > self.ttl:
+            return None
+        return CallSession.from_dict(json.loads(json.dumps(data)))
+
+    def put(self, session):
+        with self._lock:
+            self._sessions[session.call_id] = session.to_dict()
+
+    def delete(self, call_id):
+        with self._lock:
+            self._sessions.pop(call_id, None)
+
+    def purge_expired(self):
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [k for k, v in self._sessions.items() if v['updated_at'] < cutoff]
+            for call_id in expired:
+                del self._sessions[call_id]
+        return len(expired)
+
+
+class DiskBackend:
+    """One JSON file per call, so sessions survive restarts and are shared by workers on one host."""
+
+    def __init__(self, directory=CALL_SESSION_DIR, ttl=CALL_SESSION_TTL):
+        self.directory = directory
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, call_id):
+        return os.path.join(self.directory, f"{os.path.basename(call_id)}.json")
+
+    def get(self, call_id):
+        try:
+            with open(self._path(call_id), encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if time.time() - data['updated_at'] > self.ttl:
+            return None
+        return CallSession.from_dict(data)
+
+    def put(self, session):
+        path = self._path(session.call_id)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(session.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def delete(self, call_id):
+        try:
+            os.remove(self._path(call_id))
+        except FileNotFoundError:
+            pass
+
+    def purge_expired(self):
+        cutoff = time.time() - self.ttl
+        removed = 0
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                continue
+        return removed
+
+
+BACKENDS = {
+    "memory": MemoryBackend,
+    "disk": DiskBackend
+}
+
+
+def _fallback_summary(summary, turns):
+    # Used when the summarizer is unavailable: keep the most recent text that fits
+    text = " ".join(f"{t['role']}: {t['content']}" for t in turns)
+    combined = f"{summary} {text}".strip()
+    max_chars = CALL_SUMMARY_TOKEN_BUDGET * 4
+    return combined[-max_chars:]
+
+
+class CallSessionStore:
+    def __init__(self, backend, summarize=None):
+        self.backend = backend
+        self.summarize = summarize
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        self._last_purge = 0.0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="call-summary")
+
+    def _call_lock(self, call_id):
+        with self._locks_lock:
+            return self._locks.setdefault(call_id, threading.Lock())
+
+    def sync(self, call_id, conversation):
+        """Fold a Vapi conversation into the call's session and return it."""
+        self._maybe_purge()
+        with self._call_lock(call_id):
+            session = self.backend.get(call_id) or CallSession(call_id)
+            session.ingest(conversation)
+            session.compact()
+            self.backend.put(session)
+        if session.unsummarized and self.summarize:
+            self._executor.submit(self._summarize, call_id)
+        return session
+
+    def _summarize(self, call_id):
+        with self._call_lock(call_id):
+            session = self.backend.get(call_id)
+            if session is None or not session.unsummarized:
+                return
+            summary, pending = session.summary, list(session.unsummarized)
+
+        try:
+            new_summary = self.summarize(summary, pending)
+        except Exception as e:
+            logger.error(f"Call summary failed for {call_id}: {str(e)}")
+            new_summary = _fallback_summary(summary, pending)
+
+        with self._call_lock(call_id):
+            session = self.backend.get(call_id)
+            if session is None:
+                return
+            # Only drop what was summarized; more turns may have overflowed meanwhile
+            session.unsummarized = session.unsummarized[len(pending):]
+            session.summary = new_summary
+            self.backend.put(session)
+
+    def end(self, call_id):
+        self.backend.delete(call_id)
+        with self._locks_lock:
+            self._locks.pop(call_id, None)
+
+    def _maybe_purge(self):
+        now = time.time()
+        if now - self._last_purge < PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        try:
+            removed = self.backend.purge_expired()
+            if removed:
+                logger.info(f"Purged {removed} expired call session(s)")
+            with self._locks_lock:
+                stale = [k for k, lock in self._locks.items() if not lock.locked() and self.backend.get(k) is None]
+                for call_id in stale:
+                    del self._locks[call_id]
+        except Exception as e:
+            logger.error(f"Call session purge failed: {str(e)}")
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            from openai_chat import summarize_conversation
+            backend = BACKENDS[CALL_SESSION_BACKEND]()
+            _store = CallSessionStore(backend, summarize_conversation)
+    return _store
@@ -0,0 +1,142 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+# off: no caching; exact: identical messages; normalized: ignore case, punctuation and spacing
+OPENAI_CACHE_MODE = os.getenv("OPENAI_CACHE_MODE", "off").lower()
+OPENAI_CACHE_TTL = float(os.getenv("OPENAI_CACHE_TTL", 3600))
+OPENAI_CACHE_SIZE = int(os.getenv("OPENAI_CACHE_SIZE", 1000))
+
+_lock = threading.Lock()
+_entries = OrderedDict()  # key -> (expires_at, response)
+_inflight = {}
+_inflight_async = {}
+_stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0}
+
+
+def enabled():
+    return OPENAI_CACHE_MODE in ("exact", "normalized")
+
+
+def normalize(text):
+    text = unicodedata.normalize("NFKC", text).casefold()
+    # Drop punctuation in any script (incl. the danda), keep letters and combining marks
+    text = "".join(c for c in text if not unicodedata.category(c).startswith("P"))
+    return " ".join(text.split())
+
+
+def _normalized_content(content):
+    # Multi-part content (a list of text/image parts) goes into the key as it is
+    return normalize(content) if isinstance(content, str) else content
+
+
+def cache_key(messages, **params):
+    if OPENAI_CACHE_MODE == "normalized":
+        messages = [{"role": m.get('role'), "content": _normalized_content(m.get('content') or '')}
+                    for m in messages]
+    else:
+        messages = [{"role": m.get('role'), "content": m.get('content')} for m in messages]
+    payload = json.dumps({"messages": messages, "params": params}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get(key):
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None or entry[0] < now:
+            if entry is not None:
+                del _entries[key]
+            _stats["misses"] += 1
+            return None
+        _entries.move_to_end(key)
+        _stats["hits"] += 1
+        return entry[1]
+
+
+def put(key, response):
+    with _lock:
+        _entries[key] = (time.monotonic() + OPENAI_CACHE_TTL, response)
+        _entries.move_to_end(key)
+        while len(_entries) > OPENAI_CACHE_SIZE:
+            _entries.popitem(last=False)
+            _stats["evictions"] += 1
+
+
+def get_or_compute(key, compute):
+    """Return a cached response, or compute it once for all concurrent callers with the same key."""
+    cached = get(key)
+    if cached is not None:
+        return cached
+
+    with _lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = _inflight[key] = Future()
+        else:
+            # Counted as a miss by get(); it never reaches upstream, so reclassify it
+            _stats["misses"] -= 1
+            _stats["coalesced"] += 1
+
+    if not leader:
+        return future.result()
+
+    try:
+        response = compute()
+        put(key, response)
+        future.set_result(response)
+        return response
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
+
+
+async def get_or_compute_async(key, compute):
+    """get_or_compute() for coroutine callers; compute is a coroutine function."""
+    cached = get(key)
+    if cached is not None:
+        return cached
+
+    future = _inflight_async.get(key)
+    if future is not None:
+        with _lock:
+            _stats["misses"] -= 1
+            _stats["coalesced"] += 1
+        return await asyncio.shield(future)
+
+    future = _inflight_async[key] = asyncio.get_running_loop().create_future()
+    try:
+        response = await compute()
+        put(key, response)
+        future.set_result(response)
+        return response
+    except BaseException as e:
+        future.set_exception(e)
+        # Nobody may be waiting; don't let asyncio warn about an unretrieved error
+        future.exception()
+        raise
+    finally:
+        _inflight_async.pop(key, None)
+
+
+def stats():
+    with _lock:
+        result = dict(_stats, size=len(_entries), mode=OPENAI_CACHE_MODE)
+    lookups = result["hits"] + result["misses"] + result["coalesced"]
+    result["hit_rate"] = round(result["hits"] / lookups, 4) if lookups else 0.0
+    # Share of calls that didn't need their own upstream request
+    result["saved_rate"] = round((result["hits"] + result["coalesced"]) / lookups, 4) if lookups else 0.0
+    return result
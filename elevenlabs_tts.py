@@ -1,5 +1,9 @@
 import os
-import requests
+import time
+import aiohttp
+import http_transport
+import script_detect
+import metrics
 import logging
 from dotenv import load_dotenv
 
@@ -12,19 +16,23 @@ FALLBACK_VOICES = {
     'te': 'ktIdXisRrub2VKRszryF'
 }
 
+MODEL_ID = "eleven_multilingual_v2"
+# Point at a mock server for benchmarks (see mock_vendors.py)
+API_BASE = os.getenv("ELEVENLABS_API_BASE", "https://api.elevenlabs.io/v1").rstrip("/")
+
 def validate_text(text, language):
     if not text.strip():
         raise ValueError("Empty text provided")
     
-    if language == 'hi':
-        if not any('\u0900' <= c <= '\u097F' for c in text):
-            logger.warning("Hindi text validation failed.")
-    elif language == 'te':
-        if not any('\u0C00' <= c <= '\u0C7F' for c in text):
-            logger.warning("Telugu text validation failed.")
-
-def get_voice_id(language):
+    if language in ('hi', 'te') and not script_detect.has_script(text, language):
+        if not (language == 'hi' and script_detect.detect(text).hinglish):
+            logger.warning(f"{language} text validation failed: no {script_detect.LANGUAGE_SCRIPT[language]} characters.")
+
+def get_voice_id(language, text=None):
+    """Voice for language; pass text to route mislabelled or code-mixed text to the voice its script needs."""
     language = language.lower()[:2]
+    if text is not None:
+        language = script_detect.voice_language(text, language)
     
     env_var_mapping = {
         'en': 'ENGLISH_VOICE_ID',
@@ -47,7 +55,37 @@ def get_voice_id(language):
     logger.info(f"Using voice ID: {voice_id[:4]}... for {language}")
     return voice_id
 
-def generate_speech(text, language, output_path="response.mp3"):
+def get_voice_settings(language, text=None):
+    if text is not None:
+        language = script_detect.voice_language(text, language.lower()[:2])
+    return {
+        "stability": 0.7,
+        "similarity_boost": 0.8,
+        "speed": 0.95 if language == 'hi' else 1.0
+    }
+
+def _request_body(text, language):
+    return {
+        "text": text,
+        "model_id": MODEL_ID,
+        "voice_settings": get_voice_settings(language, text)
+    }
+
+def _error_message(response):
+    try:
+        return response.json().get('detail', {}).get('message') or response.text
+    except Exception:
+        return response.text
+
+def generate_speech(text, language, output_path="response.mp3", max_retries=http_transport.HTTP_MAX_RETRIES):
+    with metrics.stage("tts", backend="elevenlabs", language=language) as labels:
+        ok = _generate_speech(text, language, output_path, max_retries)
+        labels["outcome"] = "ok" if ok else "error"
+    if ok:
+        metrics.count_bytes("tts", "out", os.path.getsize(output_path), backend="elevenlabs")
+    return ok
+
+def _generate_speech(text, language, output_path, max_retries):
     try:
         dir_name = os.path.dirname(output_path)
         if dir_name:
@@ -55,32 +93,22 @@ def generate_speech(text, language, output_path="response.mp3"):
 
         logger.info(f"Generating {language} speech...")
         validate_text(text, language)
-        voice_id = get_voice_id(language)
+        voice_id = get_voice_id(language, text)
 
-        response = requests.post(
-            f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}",
+        response = http_transport.request(
+            "POST",
+            f"{API_BASE}/text-to-speech/{voice_id}",
             headers={
                 "xi-api-key": os.getenv("ELEVENLABS_API_KEY"),
                 "Content-Type": "application/json"
             },
-            json={
-                "text": text,
-                "model_id": "eleven_multilingual_v2",
-                "voice_settings": {
-                    "stability": 0.7,
-                    "similarity_boost": 0.8,
-                    "speed": 0.95 if language == 'hi' else 1.0
-                }
-            },
-            timeout=int(os.getenv("TTS_TIMEOUT", 30))
+            json=_request_body(text, language),
+            timeout=int(os.getenv("TTS_TIMEOUT", 30)),
+            max_retries=max_retries
         )
         
         if response.status_code != 200:
-            try:
-                error_msg = response.json().get('detail', {}).get('message') or response.text
-            except Exception:
-                error_msg = response.text
-            logger.error(f"TTS API Error {response.status_code}: {error_msg}")
+            logger.error(f"TTS API Error {response.status_code}: {_error_message(response)}")
             return False
 
         with open(output_path, "wb") as f:
@@ -97,3 +125,106 @@ def generate_speech(text, language, output_path="response.mp3"):
     except Exception as e:
         logger.error(f"TTS failed: {str(e)}", exc_info=True)
         return False
+
+async def generate_speech_async(text, language, output_path="response.mp3", max_retries=http_transport.HTTP_MAX_RETRIES):
+    with metrics.stage("tts", backend="elevenlabs", language=language) as labels:
+        ok = await _generate_speech_async(text, language, output_path, max_retries)
+        labels["outcome"] = "ok" if ok else "error"
+    if ok:
+        metrics.count_bytes("tts", "out", os.path.getsize(output_path), backend="elevenlabs")
+    return ok
+
+async def _generate_speech_async(text, language, output_path, max_retries):
+    try:
+        dir_name = os.path.dirname(output_path)
+        if dir_name:
+            os.makedirs(dir_name, exist_ok=True)
+
+        logger.info(f"Generating {language} speech...")
+        validate_text(text, language)
+        voice_id = get_voice_id(language, text)
+
+        response = await http_transport.async_request(
+            "POST",
+            f"{API_BASE}/text-to-speech/{voice_id}",
+            headers={
+                "xi-api-key": os.getenv("ELEVENLABS_API_KEY"),
+                "Content-Type": "application/json"
+            },
+            json=_request_body(text, language),
+            timeout=aiohttp.ClientTimeout(total=int(os.getenv("TTS_TIMEOUT", 30))),
+            max_retries=max_retries
+        )
+
+        content = await response.read()
+        if response.status != 200:
+            logger.error(f"TTS API Error {response.status}: {content[:500].decode('utf-8', 'replace')}")
+            return False
+
+        with open(output_path, "wb") as f:
+            f.write(content)
+
+        logger.info(f"Generated {len(content)} bytes to {output_path}")
+        return True
+
+    except Exception as e:
+        logger.error(f"TTS failed: {str(e)}", exc_info=True)
+        return False
+
+def stream_speech(text, language, output_path=None, chunk_size=4096, max_retries=http_transport.HTTP_MAX_RETRIES):
+    """Yield MP3 bytes as ElevenLabs produces them, teeing them into output_path.
+
+    Errors before the first chunk are raised, so callers can prime the
+    generator with next() before committing to a streamed response.
+    """
+    validate_text(text, language)
+    voice_id = get_voice_id(language, text)
+    logger.info(f"Streaming {language} speech...")
+    start = time.perf_counter()
+
+    response = http_transport.request(
+        "POST",
+        f"{API_BASE}/text-to-speech/{voice_id}/stream",
+        headers={
+            "xi-api-key": os.getenv("ELEVENLABS_API_KEY"),
+            "Content-Type": "application/json"
+        },
+        json=_request_body(text, language),
+        timeout=int(os.getenv("TTS_TIMEOUT", 30)),
+        stream=True,
+        max_retries=max_retries
+    )
+
+    try:
+        if response.status_code != 200:
+            error_msg = _error_message(response)
+            logger.error(f"TTS API Error {response.status_code}: {error_msg}")
+            raise RuntimeError(f"TTS API Error {response.status_code}: {error_msg}")
+
+        out = None
+        if output_path:
+            dir_name = os.path.dirname(output_path)
+            if dir_name:
+                os.makedirs(dir_name, exist_ok=True)
+            out = open(output_path, "wb")
+
+        written = 0
+        try:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if not chunk:
+                    continue
+                if out:
+                    out.write(chunk)
+                if not written:
+                    metrics.observe("stage_duration_seconds", time.perf_counter() - start,
+                                    stage="tts_first_chunk", backend="elevenlabs", language=language, outcome="ok")
+                written += len(chunk)
+                yield chunk
+        finally:
+            if out:
+                out.close()
+
+        metrics.count_bytes("tts", "out", written, backend="elevenlabs")
+        logger.info(f"Streamed {written} bytes{f' to {output_path}' if output_path else ''}")
+    finally:
+        response.close()
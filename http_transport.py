@@ -0,0 +1,183 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from urllib.parse import urlsplit
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 20))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", 3))
+# For calls on a live turn, where the backend router fails over sooner than a retry would succeed
+HTTP_LIVE_MAX_RETRIES = int(os.getenv("HTTP_LIVE_MAX_RETRIES", 1))
+HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", 0.25))
+HTTP_BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", 8.0))
+HTTP_KEEPALIVE = float(os.getenv("HTTP_KEEPALIVE", 60))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_lock = threading.Lock()
+_sessions = {}
+_async_sessions = {}
+_stats = {}
+
+
+def _host(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def get_session(url):
+    """Keep-alive session with its own connection pool for the URL's host."""
+    host = _host(url)
+    with _lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[host] = session
+    return session
+
+
+async def get_async_session(url):
+    # aiohttp sessions are bound to the loop that created them
+    key = (id(asyncio.get_running_loop()), _host(url))
+    session = _async_sessions.get(key)
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit_per_host=HTTP_POOL_SIZE, keepalive_timeout=HTTP_KEEPALIVE)
+        )
+        _async_sessions[key] = session
+    return session
+
+
+async def close_async_sessions():
+    """Close this loop's sessions; for callers that run their own short-lived loop."""
+    loop_id = id(asyncio.get_running_loop())
+    for key in [k for k in _async_sessions if k[0] == loop_id]:
+        await _async_sessions.pop(key).close()
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Full-jitter exponential backoff, never shorter than a server's Retry-After."""
+    delay = random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * (2 ** attempt)))
+    if retry_after:
+        try:
+            delay = max(delay, min(float(retry_after), HTTP_BACKOFF_MAX))
+        except ValueError:
+            pass
+    return delay
+
+
+# Connect timeouts got their own aiohttp exception in 3.10; before that they can't be told apart
+_ASYNC_CONNECT_TIMEOUT = getattr(aiohttp, "ConnectionTimeoutError", aiohttp.ClientConnectorError)
+
+
+def _retryable(error):
+    """Connection failures are retried. A read timeout is not: the server may still be working on
+    the request (a POST would run twice) and waiting that long again only delays the failover."""
+    if isinstance(error, requests.Timeout):
+        return isinstance(error, requests.ConnectTimeout)
+    if isinstance(error, asyncio.TimeoutError):
+        return isinstance(error, _ASYNC_CONNECT_TIMEOUT)
+    return True
+
+
+def _record(url, elapsed, status=None, error=False, retried=False):
+    host = _host(url)
+    with _lock:
+        stats = _stats.setdefault(host, {
+            "requests": 0, "errors": 0, "retries": 0,
+            "latency_sum": 0.0, "latency_max": 0.0, "status": {}
+        })
+        if retried:
+            stats["retries"] += 1
+            return
+        stats["requests"] += 1
+        stats["latency_sum"] += elapsed
+        stats["latency_max"] = max(stats["latency_max"], elapsed)
+        if error or (status is not None and status >= 400):
+            stats["errors"] += 1
+        if status is not None:
+            stats["status"][str(status)] = stats["status"].get(str(status), 0) + 1
+
+
+def request(method, url, max_retries=HTTP_MAX_RETRIES, **kwargs):
+    """requests.request() over a pooled session, retrying 429/5xx and connection errors.
+
+    Live callers pass max_retries=HTTP_LIVE_MAX_RETRIES (or 0).
+    """
+    session = get_session(url)
+    attempt = 0
+    while True:
+        start = time.monotonic()
+        try:
+            response = session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            _record(url, time.monotonic() - start, error=True)
+            if attempt >= max_retries or not _retryable(e):
+                raise
+            delay = backoff_delay(attempt)
+            logger.warning(f"{method} {_host(url)} failed ({str(e)}), retrying in {delay:.2f}s")
+        else:
+            _record(url, time.monotonic() - start, status=response.status_code)
+            if response.status_code not in RETRY_STATUSES or attempt >= max_retries:
+                return response
+            delay = backoff_delay(attempt, response.headers.get("Retry-After"))
+            logger.warning(f"{method} {_host(url)} returned {response.status_code}, retrying in {delay:.2f}s")
+            response.close()
+
+        _record(url, 0, retried=True)
+        attempt += 1
+        time.sleep(delay)
+
+
+async def async_request(method, url, max_retries=HTTP_MAX_RETRIES, **kwargs):
+    """aiohttp equivalent of request(). The body is read before returning."""
+    attempt = 0
+    while True:
+        session = await get_async_session(url)
+        start = time.monotonic()
+        try:
+            response = await session.request(method, url, **kwargs)
+            await response.read()
+            response.release()
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            _record(url, time.monotonic() - start, error=True)
+            if attempt >= max_retries or not _retryable(e):
+                raise
+            delay = backoff_delay(attempt)
+            logger.warning(f"{method} {_host(url)} failed ({str(e)}), retrying in {delay:.2f}s")
+        else:
+            _record(url, time.monotonic() - start, status=response.status)
+            if response.status not in RETRY_STATUSES or attempt >= max_retries:
+                return response
+            delay = backoff_delay(attempt, response.headers.get("Retry-After"))
+            logger.warning(f"{method} {_host(url)} returned {response.status}, retrying in {delay:.2f}s")
+
+        _record(url, 0, retried=True)
+        attempt += 1
+        await asyncio.sleep(delay)
+
+
+def throttled(url):
+    """How many 429s the URL's host has returned to this process so far."""
+    with _lock:
+        return _stats.get(_host(url), {}).get("status", {}).get("429", 0)
+
+
+def stats():
+    with _lock:
+        result = {}
+        for host, s in _stats.items():
+            entry = dict(s, status=dict(s["status"]))
+            entry["latency_avg"] = round(s["latency_sum"] / s["requests"], 4) if s["requests"] else 0.0
+            result[host] = entry
+        return result
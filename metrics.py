@@ -0,0 +1,209 @@
+"""Per-stage timers, counters and gauges, exposed in Prometheus text format at /metrics.
+
+Metrics are per worker process, like the other /stats endpoints; scrape each
+worker (or run a single worker per container) for fleet-wide numbers.
+"""
+import re
+import sys
+import time
+import uuid
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0)
+LOG_FORMAT = "%(levelname)s:%(name)s:[%(trace_id)s] %(message)s"
+
+_lock = threading.Lock()
+_counters = {}    # (name, labels) -> value
+_gauges = {}      # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+_help = {}
+
+_trace_id = contextvars.ContextVar("trace_id", default=None)
+
+
+def _labels(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def describe(name, kind, text):
+    _help[name] = (kind, text)
+
+
+def inc(name, value=1, **labels):
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def add_gauge(name, value, **labels):
+    key = (name, _labels(labels))
+    with _lock:
+        _gauges[key] = _gauges.get(key, 0) + value
+
+
+def observe(name, value, **labels):
+    key = (name, _labels(labels))
+    with _lock:
+        buckets = _histograms.get(key)
+        if buckets is None:
+            buckets = _histograms[key] = [0] * len(DURATION_BUCKETS) + [0.0, 0]
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if value <= bound:
+                buckets[i] += 1
+        buckets[-2] += value
+        buckets[-1] += 1
+
+
+def count_bytes(stage, direction, n, **labels):
+    """Audio bytes moved by a stage: direction is "in" (received/uploaded) or "out"."""
+    if n:
+        inc("audio_bytes_total", n, stage=stage, direction=direction, **labels)
+
+
+@contextmanager
+def stage(name, **labels):
+    """Time a pipeline stage into stage_duration_seconds{stage, backend, language, outcome}.
+
+    Yields the labels dict, so a label only known afterwards (e.g. the language
+    an STT backend detected) can be filled in before the block exits.
+    """
+    add_gauge("stage_in_flight", 1, stage=name)
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield labels
+        outcome = "ok"
+    finally:
+        elapsed = time.perf_counter() - start
+        # Callers whose failures are return values (not exceptions) set labels["outcome"]
+        outcome = labels.pop("outcome", outcome)
+        add_gauge("stage_in_flight", -1, stage=name)
+        observe("stage_duration_seconds", elapsed, stage=name, outcome=outcome, **labels)
+        logger.debug(f"stage {name} {labels} {outcome} in {elapsed:.3f}s")
+
+
+# --- Trace ids ---
+
+def current_trace():
+    return _trace_id.get()
+
+
+def start_trace(trace_id=None):
+    """Bind a trace id to this request's context; returns a token for end_trace()."""
+    trace_id = re.sub(r"[^A-Za-z0-9._-]", "", trace_id or "")[:64] or uuid.uuid4().hex[:16]
+    return _trace_id.set(trace_id)
+
+
+def end_trace(token):
+    _trace_id.reset(token)
+
+
+class TraceFilter(logging.Filter):
+    def filter(self, record):
+        record.trace_id = _trace_id.get() or "-"
+        return True
+
+
+def install_log_context():
+    """Add the current trace id to every log line from the root handlers."""
+    for handler in logging.getLogger().handlers:
+        handler.addFilter(TraceFilter())
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+
+def copy_context():
+    """For executor.submit(copy_context().run, fn, ...) so worker threads log the caller's trace."""
+    return contextvars.copy_context()
+
+
+# --- Exposition ---
+
+def _format_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in items)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+
+def _collect_stats():
+    """Gauges mirrored from the existing per-module stats, for modules already in use."""
+    samples = []
+    if "tts_cache" in sys.modules:
+        for k, v in sys.modules["tts_cache"].stats().items():
+            if k in ("hits", "misses", "evictions"):
+                samples.append(("tts_cache_events", (("event", k),), v))
+    if "chat_cache" in sys.modules:
+        for k, v in sys.modules["chat_cache"].stats().items():
+            if k in ("hits", "misses", "coalesced", "evictions", "size"):
+                samples.append(("chat_cache_events", (("event", k),), v))
+    if "backend_router" in sys.modules:
+        for router, data in sys.modules["backend_router"].stats().items():
+            for backend, s in data["backends"].items():
+                labels = (("router", router), ("backend", backend))
+                samples.append(("router_breaker_open", labels, 0 if s["breaker"] == "closed" else 1))
+                samples.append(("router_hedges", labels, s["hedges"]))
+    if "admission" in sys.modules:
+        data = sys.modules["admission"].stats()
+        for kind in ("endpoints", "backends"):
+            for name, s in data[kind].items():
+                labels = (("kind", kind[:-1]), ("name", name))
+                samples.append(("admission_active", labels, s["active"]))
+                samples.append(("admission_queued", labels, s["queued"]))
+                for event in ("rejected", "timed_out", "shed"):
+                    samples.append(("admission_events", labels + (("event", event),), s[event]))
+    if "http_transport" in sys.modules:
+        for host, s in sys.modules["http_transport"].stats().items():
+            samples.append(("vendor_requests", (("host", host),), s["requests"]))
+            samples.append(("vendor_retries", (("host", host),), s["retries"]))
+    return samples
+
+
+describe("stage_duration_seconds", "histogram", "Time spent in a pipeline stage")
+describe("stage_in_flight", "gauge", "Stage calls currently running")
+describe("http_request_duration_seconds", "histogram", "Request latency by endpoint")
+describe("http_requests_in_flight", "gauge", "Requests currently being handled")
+describe("audio_bytes_total", "counter", "Audio bytes received or produced by a stage")
+
+
+def render():
+    lines = []
+    emitted = set()
+
+    def header(name):
+        if name not in emitted and name in _help:
+            kind, text = _help[name]
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+        emitted.add(name)
+
+    with _lock:
+        counters = sorted(_counters.items())
+        gauges = sorted(_gauges.items())
+        histograms = sorted(_histograms.items())
+
+    for (name, labels), value in counters:
+        header(name)
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+    for (name, labels), value in gauges:
+        header(name)
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+    for (name, labels), buckets in histograms:
+        header(name)
+        for bound, count in zip(DURATION_BUCKETS, buckets):
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {count}")
+        lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {buckets[-1]}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {round(buckets[-2], 6)}")
+        lines.append(f"{name}_count{_format_labels(labels)} {buckets[-1]}")
+
+    try:
+        for name, labels, value in _collect_stats():
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+    except Exception as e:
+        logger.warning(f"Failed to collect module stats: {str(e)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,352 @@
+"""Local stand-ins for the OpenAI, ElevenLabs, AssemblyAI and Vapi APIs.
+
+    python mock_vendors.py [--profile realistic|fast|degraded|profile.json] [--port 8900]
+
+Each vendor listens on its own port (port+1 .. port+4) so per-host stats and
+connection pools behave as they do against the real APIs. Point the app at
+them with the environment printed on startup; benchmark.py does this itself.
+Responses only have the fields this app reads, and audio is filler bytes.
+"""
+import io
+import sys
+import json
+import wave
+import time
+import uuid
+import random
+import asyncio
+import logging
+import argparse
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+VENDORS = ("openai", "elevenlabs", "assemblyai", "vapi")
+
+# latency: seconds before the first byte; jitter: extra uniform random delay;
+# error_rate / throttle_rate: share of requests answered 500 / 429;
+# chunks and chunk_delay: streamed response shape; processing: AssemblyAI
+# seconds of queue plus processing per second of uploaded audio
+PROFILES = {
+    "fast": {
+        "openai": {"latency": 0.0, "jitter": 0.0, "chunks": 10, "chunk_delay": 0.0},
+        "elevenlabs": {"latency": 0.0, "jitter": 0.0, "chunks": 8, "chunk_delay": 0.0, "audio_bytes": 16000},
+        "assemblyai": {"latency": 0.0, "jitter": 0.0, "processing": 0.0},
+        "vapi": {"latency": 0.0, "jitter": 0.0}
+    },
+    "realistic": {
+        "openai": {"latency": 0.45, "jitter": 0.3, "chunks": 30, "chunk_delay": 0.03},
+        "elevenlabs": {"latency": 0.35, "jitter": 0.2, "chunks": 16, "chunk_delay": 0.04, "audio_bytes": 48000},
+        "assemblyai": {"latency": 0.08, "jitter": 0.05, "processing": 0.3},
+        "vapi": {"latency": 0.1, "jitter": 0.05}
+    },
+    "degraded": {
+        "openai": {"latency": 1.5, "jitter": 1.5, "chunks": 30, "chunk_delay": 0.08, "error_rate": 0.05},
+        "elevenlabs": {"latency": 1.0, "jitter": 1.0, "chunks": 16, "chunk_delay": 0.1, "audio_bytes": 48000,
+                       "error_rate": 0.05, "throttle_rate": 0.1},
+        "assemblyai": {"latency": 0.3, "jitter": 0.3, "processing": 1.0, "error_rate": 0.05},
+        "vapi": {"latency": 0.3, "jitter": 0.3, "error_rate": 0.02}
+    }
+}
+DEFAULTS = {"latency": 0.0, "jitter": 0.0, "error_rate": 0.0, "throttle_rate": 0.0, "retry_after": 1,
+            "chunks": 10, "chunk_delay": 0.0, "audio_bytes": 16000, "processing": 0.0}
+
+MOCK_TEXT = "Thanks for calling. I can help you with that, let me check the details for you right now."
+# Start of an MPEG-1 Layer III frame header, so sniffers see an MP3
+MP3_FRAME = b"\xff\xfb\x90\x64" + bytes(413)
+
+
+def load_profile(name):
+    """A preset from PROFILES or a JSON file of per-vendor overrides."""
+    if name in PROFILES:
+        profile = PROFILES[name]
+    else:
+        with open(name, encoding="utf-8") as f:
+            profile = json.load(f)
+    return {vendor: dict(DEFAULTS, **profile.get(vendor, {})) for vendor in VENDORS}
+
+
+def env_for(host, port):
+    """Environment that sends the app's vendor calls to mocks started with this port."""
+    base = f"http://{host}"
+    return {
+        "OPENAI_BASE_URL": f"{base}:{port + 1}/v1",
+        "OPENAI_API_KEY": "mock",
+        "ELEVENLABS_API_BASE": f"{base}:{port + 2}/v1",
+        "ELEVENLABS_API_KEY": "mock",
+        "ASSEMBLYAI_API_BASE": f"{base}:{port + 3}/v2",
+        "ASSEMBLYAI_API_KEY": "mock",
+        "VAPI_API_BASE": f"{base}:{port + 4}",
+        "VAPI_API_KEY": "mock"
+    }
+
+
+class Vendor:
+    """Latency and failure injection shared by every route of one mock vendor."""
+
+    def __init__(self, name, profile):
+        self.name = name
+        self.profile = profile
+        self.requests = 0
+        self.injected = {"500": 0, "429": 0}
+
+    async def delay(self, seconds=None):
+        p = self.profile
+        await asyncio.sleep(p["latency"] + random.uniform(0, p["jitter"]) if seconds is None else seconds)
+
+    def fault(self):
+        """A 429/500 response to return instead of the real one, or None."""
+        self.requests += 1
+        roll = random.random()
+        if roll < self.profile["throttle_rate"]:
+            self.injected["429"] += 1
+            return web.json_response({"error": {"message": "Rate limited (mock)"}}, status=429,
+                                     headers={"Retry-After": str(self.profile["retry_after"])})
+        if roll < self.profile["throttle_rate"] + self.profile["error_rate"]:
+            self.injected["500"] += 1
+            return web.json_response({"error": {"message": "Internal error (mock)"}}, status=500)
+        return None
+
+    def stats(self):
+        return {"requests": self.requests, "injected": dict(self.injected), "profile": self.profile}
+
+
+def _words(count):
+    words = MOCK_TEXT.split()
+    per_chunk = max(1, len(words) // max(1, count))
+    return [" ".join(words[i:i + per_chunk]) + " " for i in range(0, len(words), per_chunk)]
+
+
+# --- OpenAI ---
+
+def openai_app(vendor):
+    async def completions(request):
+        body = await request.json()
+        await vendor.delay()
+        fault = vendor.fault()
+        if fault:
+            return fault
+
+        model = body.get("model", "gpt-4")
+        created = int(time.time())
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        if not body.get("stream"):
+            return web.json_response({
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": MOCK_TEXT},
+                             "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 50, "completion_tokens": 20, "total_tokens": 70}
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+
+        async def event(delta, finish_reason=None):
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+
+        await event({"role": "assistant", "content": ""})
+        for piece in _words(vendor.profile["chunks"]):
+            await vendor.delay(vendor.profile["chunk_delay"])
+            await event({"content": piece})
+        await event({}, "stop")
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", completions)
+    return app
+
+
+# --- ElevenLabs ---
+
+def elevenlabs_app(vendor):
+    def audio():
+        size = vendor.profile["audio_bytes"]
+        return (MP3_FRAME * (size // len(MP3_FRAME) + 1))[:size]
+
+    async def speech(request):
+        await request.read()
+        await vendor.delay()
+        return vendor.fault() or web.Response(body=audio(), content_type="audio/mpeg")
+
+    async def stream(request):
+        await request.read()
+        await vendor.delay()
+        fault = vendor.fault()
+        if fault:
+            return fault
+
+        data = audio()
+        chunks = max(1, vendor.profile["chunks"])
+        size = -(-len(data) // chunks)
+        response = web.StreamResponse(headers={"Content-Type": "audio/mpeg"})
+        await response.prepare(request)
+        for i in range(0, len(data), size):
+            if i:
+                await vendor.delay(vendor.profile["chunk_delay"])
+            await response.write(data[i:i + size])
+        await response.write_eof()
+        return response
+
+    app = web.Application()
+    app.router.add_post("/v1/text-to-speech/{voice_id}", speech)
+    app.router.add_post("/v1/text-to-speech/{voice_id}/stream", stream)
+    return app
+
+
+# --- AssemblyAI ---
+
+def audio_seconds(data):
+    """Duration of an upload as assemblyai_stt sends it: Ogg/Opus, FLAC or WAV."""
+    if data[:4] == b"OggS":
+        # Granule position of the last page; Opus counts it at 48 kHz
+        last = data.rfind(b"OggS")
+        return int.from_bytes(data[last + 6:last + 14], "little") / 48000
+    if data[:4] == b"fLaC" and len(data) >= 26:
+        # STREAMINFO: 20-bit sample rate, then 36-bit total samples
+        info = int.from_bytes(data[18:26], "big")
+        rate, samples = info >> 44, info & (2 ** 36 - 1)
+        return samples / rate if rate else 0.0
+    try:
+        with wave.open(io.BytesIO(data)) as w:
+            return w.getnframes() / float(w.getframerate())
+    except (wave.Error, EOFError, ZeroDivisionError):
+        return len(data) / 16000  # some other compressed upload, ~128 kbps
+
+
+def assemblyai_app(vendor):
+    uploads = {}      # upload url -> seconds of audio received
+    transcripts = {}  # id -> (ready_at, failed)
+
+    async def upload(request):
+        data = await request.read()
+        await vendor.delay()
+        fault = vendor.fault()
+        if fault:
+            return fault
+        url = f"{request.url.origin()}/files/{uuid.uuid4().hex}"
+        uploads[url] = audio_seconds(data)
+        return web.json_response({"upload_url": url})
+
+    async def create(request):
+        body = await request.json()
+        await vendor.delay()
+        fault = vendor.fault()
+        if fault:
+            return fault
+        seconds = uploads.pop(body.get("audio_url"), 0)
+        transcript_id = uuid.uuid4().hex
+        transcripts[transcript_id] = time.monotonic() + vendor.profile["processing"] * max(seconds, 1.0)
+        return web.json_response({"id": transcript_id, "status": "queued"})
+
+    async def fetch(request):
+        await vendor.delay()
+        fault = vendor.fault()
+        if fault:
+            return fault
+        transcript_id = request.match_info["transcript_id"]
+        ready_at = transcripts.get(transcript_id)
+        if ready_at is None:
+            return web.json_response({"error": "Transcript not found"}, status=404)
+        if time.monotonic() < ready_at:
+            return web.json_response({"id": transcript_id, "status": "processing"})
+        return web.json_response({"id": transcript_id, "status": "completed", "text": MOCK_TEXT,
+                                  "language_code": "en", "confidence": 0.93})
+
+    app = web.Application(client_max_size=512 * 1024 * 1024)
+    app.router.add_post("/v2/upload", upload)
+    app.router.add_post("/v2/transcript", create)
+    app.router.add_get("/v2/transcript/{transcript_id}", fetch)
+    return app
+
+
+# --- Vapi ---
+
+def vapi_app(vendor):
+    assistants = {}
+
+    async def get_assistant(request):
+        await vendor.delay()
+        assistant_id = request.match_info["assistant_id"]
+        return vendor.fault() or web.json_response(assistants.get(assistant_id, {"id": assistant_id}))
+
+    async def patch_assistant(request):
+        body = await request.json()
+        await vendor.delay()
+        fault = vendor.fault()
+        if fault:
+            return fault
+        assistant_id = request.match_info["assistant_id"]
+        assistants[assistant_id] = dict(assistants.get(assistant_id, {"id": assistant_id}), **body)
+        return web.json_response(assistants[assistant_id])
+
+    app = web.Application()
+    app.router.add_get("/assistant/{assistant_id}", get_assistant)
+    app.router.add_patch("/assistant/{assistant_id}", patch_assistant)
+    return app
+
+
+APPS = {
+    "openai": openai_app,
+    "elevenlabs": elevenlabs_app,
+    "assemblyai": assemblyai_app,
+    "vapi": vapi_app
+}
+
+
+async def serve(profile, host="127.0.0.1", port=8900):
+    """Start every mock plus a control app on `port`; returns the runners."""
+    vendors = {name: Vendor(name, profile[name]) for name in VENDORS}
+
+    async def health(request):
+        return web.json_response({"status": "ok"})
+
+    async def stats(request):
+        return web.json_response({name: v.stats() for name, v in vendors.items()})
+
+    control = web.Application()
+    control.router.add_get("/health", health)
+    control.router.add_get("/stats", stats)
+
+    runners = []
+    for offset, app in enumerate([control] + [APPS[name](vendors[name]) for name in VENDORS]):
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port + offset).start()
+        runners.append(runner)
+    return runners
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mock vendor APIs for offline benchmarks")
+    parser.add_argument("--profile", default="realistic", help=f"one of {', '.join(PROFILES)} or a JSON file")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900, help="control port; vendors use the next four")
+    parser.add_argument("--seed", type=int, help="seed the latency and fault injection")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.seed is not None:
+        random.seed(args.seed)
+    profile = load_profile(args.profile)
+
+    loop = asyncio.new_event_loop()
+    runners = loop.run_until_complete(serve(profile, args.host, args.port))
+    for key, value in env_for(args.host, args.port).items():
+        print(f"{key}={value}")
+    sys.stdout.flush()
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for runner in runners:
+            loop.run_until_complete(runner.cleanup())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
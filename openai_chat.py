@@ -1,32 +1,113 @@
 import os
+import time
 import logging
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 from openai.types.chat import ChatCompletionMessageParam
+import chat_cache
+import metrics
+import script_detect
+from utterance import Utterance
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+# Pre-rendered by phrase_bank.py so they play even while TTS is degraded
+FALLBACK_RESPONSES = {
+    'en': "Sorry, we're experiencing technical difficulties. Please try again later.",
+    'hi': "क्षमा करें, तकनीकी समस्या आई है। कृपया बाद में प्रयास करें।",
+    'te': "క్షమించండి, సాంకేతిక సమస్య ఉంది. దయచేసి తర్వాత ప్రయత్నించండి."
+}
+
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+async_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+def _completion_params():
+    return {
+        "model": os.getenv("OPENAI_MODEL", "gpt-4"),
+        "temperature": 0.7,
+        "max_tokens": 1000
+    }
+
+def _complete(messages, params):
+    with metrics.stage("llm", backend="openai", model=params["model"]):
+        response = client.chat.completions.create(messages=messages, **params)
+    return response.choices[0].message.content.strip()
+
+async def _complete_async(messages, params):
+    with metrics.stage("llm", backend="openai", model=params["model"]):
+        response = await async_client.chat.completions.create(messages=messages, **params)
+    return response.choices[0].message.content.strip()
 
 def get_ai_response(messages: list[ChatCompletionMessageParam]):
+    params = _completion_params()
     try:
-        response = client.chat.completions.create(
-            model=os.getenv("OPENAI_MODEL", "gpt-4"),
-            messages=messages,
-            temperature=0.7,
-            max_tokens=1000
-        )
-        return response.choices[0].message.content.strip()
+        if chat_cache.enabled():
+            # Identical concurrent prompts share one upstream call
+            key = chat_cache.cache_key(messages, **params)
+            return chat_cache.get_or_compute(key, lambda: _complete(messages, params))
+        return _complete(messages, params)
     except Exception as e:
         logger.error(f"OpenAI error: {str(e)}")
+        return fallback_response(messages)
+
+async def get_ai_response_async(messages: list[ChatCompletionMessageParam]):
+    params = _completion_params()
+    try:
+        if chat_cache.enabled():
+            key = chat_cache.cache_key(messages, **params)
+            return await chat_cache.get_or_compute_async(key, lambda: _complete_async(messages, params))
+        return await _complete_async(messages, params)
+    except Exception as e:
+        logger.error(f"OpenAI error: {str(e)}")
+        return fallback_response(messages)
+
+def stream_ai_response(messages: list[ChatCompletionMessageParam]):
+    """Yield the reply as text deltas while the model generates it."""
+    emitted = False
+    params = _completion_params()
+    start = time.perf_counter()
+    try:
+        response = client.chat.completions.create(messages=messages, stream=True, **params)
+        for chunk in response:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if not emitted:
+                    metrics.observe("stage_duration_seconds", time.perf_counter() - start,
+                                    stage="llm_first_token", backend="openai", model=params["model"], outcome="ok")
+                emitted = True
+                yield delta
+    except Exception as e:
+        logger.error(f"OpenAI stream error: {str(e)}")
+        # Once part of the reply is out, an apology would just be appended to it.
+        # Kept whole so the pipeline serves it from the phrase bank.
+        if not emitted:
+            yield Utterance(fallback_response(messages))
+
+def summarize_conversation(summary, turns):
+    """Fold older turns into a running summary. Raises on failure so callers can fall back."""
+    transcript = "\n".join(f"{t['role']}: {t['content']}" for t in turns)
+    response = client.chat.completions.create(
+        model=os.getenv("CALL_SUMMARY_MODEL", "gpt-3.5-turbo"),
+        messages=[
+            {"role": "system", "content": "Update the running summary of a phone conversation. "
+                                          "Keep names, numbers, requests and decisions. Reply with the summary only, "
+                                          "in the language of the conversation."},
+            {"role": "user", "content": f"Current summary:\n{summary or '(none)'}\n\nNew turns:\n{transcript}"}
+        ],
+        temperature=0.2,
+        max_tokens=int(os.getenv("CALL_SUMMARY_TOKEN_BUDGET", 300))
+    )
+    return response.choices[0].message.content.strip()
+
+def fallback_response(messages):
+    last_msg = next((m for m in reversed(messages) if m['role'] == 'user'), None)
+    if last_msg:
+        language = script_detect.strongest(last_msg.get('content') or '')
+        if language:
+            return FALLBACK_RESPONSES[language]
 
-        last_msg = next((m for m in reversed(messages) if m['role'] == 'user'), None)
-        if last_msg:
-            content = last_msg.get('content', '')
-            if any('\u0900' <= c <= '\u097F' for c in content):
-                return "क्षमा करें, तकनीकी समस्या आई है। कृपया बाद में प्रयास करें।"
-            elif any('\u0C00' <= c <= '\u0C7F' for c in content):
-                return "క్షమించండి, సాంకేతిక సమస్య ఉంది. దయచేసి తర్వాత ప్రయత్నించండి."
+    return FALLBACK_RESPONSES['en']
 
-        return "Sorry, we're experiencing technical difficulties. Please try again later."
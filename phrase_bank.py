@@ -0,0 +1,235 @@
+"""Pre-rendered audio for fixed phrases (greetings, fallbacks, apologies).
+
+    python phrase_bank.py render [--force]
+    python phrase_bank.py status
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import logging
+import argparse
+import threading
+from dotenv import load_dotenv
+import tts_cache
+import script_detect
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+PHRASE_MANIFEST = os.getenv("PHRASE_MANIFEST", "phrases.json")
+PHRASES_DIR = os.path.join(tts_cache.AUDIO_DIR, "phrases")
+CURRENT_FILE = os.path.join(PHRASES_DIR, "CURRENT")
+KEEP_VERSIONS = 2
+RELOAD_INTERVAL = 30
+
+_lock = threading.Lock()
+_index = None
+_checked_at = 0.0
+
+
+def voice_identity(language, text=None):
+    """(voice_id, model_id, voice_settings) that /tts would use for this text right now."""
+    if os.getenv("ELEVENLABS_API_KEY"):
+        from elevenlabs_tts import get_voice_id, get_voice_settings, MODEL_ID
+        return get_voice_id(language, text), MODEL_ID, get_voice_settings(language, text)
+    return "gtts", "gtts", None
+
+
+def _normalize(text):
+    return " ".join(text.split()).casefold()
+
+
+def _entry_id(language, text):
+    return f"{language}:{_normalize(text)}"
+
+
+def load_manifest(path=PHRASE_MANIFEST):
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    try:
+        from openai_chat import FALLBACK_RESPONSES
+    except Exception as e:
+        # openai_chat needs an API key to import; the manifest is still usable without it
+        logger.warning(f"Skipping chat fallback phrases: {str(e)}")
+        FALLBACK_RESPONSES = {}
+    for language, text in FALLBACK_RESPONSES.items():
+        texts = manifest.setdefault(language, [])
+        if text not in texts:
+            texts.append(text)
+    return manifest
+
+
+def current_version():
+    try:
+        with open(CURRENT_FILE, encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _read_index(version):
+    try:
+        with open(os.path.join(PHRASES_DIR, version, "index.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _render_one(text, language, path):
+    if os.getenv("ELEVENLABS_API_KEY"):
+        from elevenlabs_tts import generate_speech
+        if not generate_speech(text, language, path):
+            raise RuntimeError("TTS generation failed")
+    else:
+        from gtts import gTTS
+        gTTS(text=text, lang=language).save(path)
+
+
+def _reuse(filename, dest, search_dirs):
+    for directory in search_dirs:
+        src = os.path.join(directory, filename)
+        if os.path.exists(src):
+            try:
+                os.link(src, dest)
+            except OSError:
+                shutil.copyfile(src, dest)
+            return True
+    return False
+
+
+def render(force=False, manifest_path=PHRASE_MANIFEST):
+    """Render the manifest into a new version directory, reusing unchanged audio."""
+    entries = {}
+    for language, texts in load_manifest(manifest_path).items():
+        for text in texts:
+            voice_id, model_id, settings = voice_identity(language, text)
+            key = tts_cache.cache_key(text, language, voice_id, model_id, settings)
+            entries[_entry_id(language, text)] = {
+                "text": text,
+                "language": language,
+                "key": key,
+                "file": tts_cache.filename_for(key)
+            }
+
+    # Voices, settings and phrases all feed the keys, so any change gives a new version
+    version = hashlib.sha256("".join(sorted(e["key"] for e in entries.values())).encode()).hexdigest()[:12]
+    version_dir = os.path.join(PHRASES_DIR, version)
+    os.makedirs(version_dir, exist_ok=True)
+
+    previous = current_version()
+    search_dirs = [os.path.join(PHRASES_DIR, previous)] if previous and previous != version else []
+    search_dirs.append(tts_cache.AUDIO_DIR)
+
+    summary = {"version": version, "rendered": 0, "reused": 0, "failed": []}
+    for entry_id, entry in list(entries.items()):
+        dest = os.path.join(version_dir, entry["file"])
+        if os.path.exists(dest) and not force:
+            summary["reused"] += 1
+            continue
+        if not force and _reuse(entry["file"], dest, search_dirs):
+            summary["reused"] += 1
+            continue
+        tmp_path = f"{dest}.tmp"
+        try:
+            _render_one(entry["text"], entry["language"], tmp_path)
+            os.replace(tmp_path, dest)
+            summary["rendered"] += 1
+        except Exception as e:
+            logger.error(f"Failed to render {entry_id}: {str(e)}")
+            summary["failed"].append(entry_id)
+            del entries[entry_id]
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    with open(os.path.join(version_dir, "index.json"), "w", encoding="utf-8") as f:
+        json.dump({"version": version, "created_at": time.time(), "entries": entries}, f, ensure_ascii=False, indent=2)
+    tmp_current = f"{CURRENT_FILE}.tmp"
+    with open(tmp_current, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp_current, CURRENT_FILE)
+
+    _prune_versions(keep={version, previous})
+    return summary
+
+
+def _prune_versions(keep):
+    versions = [d for d in os.listdir(PHRASES_DIR) if os.path.isdir(os.path.join(PHRASES_DIR, d))]
+    versions.sort(key=lambda d: os.path.getmtime(os.path.join(PHRASES_DIR, d)), reverse=True)
+    for stale in versions[KEEP_VERSIONS:]:
+        if stale not in keep:
+            shutil.rmtree(os.path.join(PHRASES_DIR, stale), ignore_errors=True)
+
+
+def _current_index():
+    global _index, _checked_at
+    now = time.monotonic()
+    with _lock:
+        if now - _checked_at < RELOAD_INTERVAL:
+            return _index
+        _checked_at = now
+        cached = _index
+
+    version = current_version()
+    if version is None:
+        index = None
+    elif cached and cached.get("version") == version:
+        index = cached
+    else:
+        index = _read_index(version)
+    with _lock:
+        _index = index
+    return index
+
+
+def lookup(text, language):
+    """Return the phrase's audio path relative to audio_outputs, or None.
+
+    Callers such as the Vapi webhook ask for 'en' whatever the reply's script,
+    so the entry is found under the language whose voice would read the text.
+    """
+    index = _current_index()
+    if not index:
+        return None
+    entry = index["entries"].get(_entry_id(script_detect.voice_language(text, language), text))
+    if not entry:
+        return None
+    # Only serve audio rendered with the voice and settings in use now
+    voice_id, model_id, settings = voice_identity(entry["language"], entry["text"])
+    if tts_cache.cache_key(entry["text"], entry["language"], voice_id, model_id, settings) != entry["key"]:
+        return None
+    return f"phrases/{index['version']}/{entry['file']}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render and inspect the pre-rendered phrase bank")
+    sub = parser.add_subparsers(dest="command", required=True)
+    render_parser = sub.add_parser("render", help="render missing or changed phrases")
+    render_parser.add_argument("--force", action="store_true", help="re-render every phrase")
+    render_parser.add_argument("--manifest", default=PHRASE_MANIFEST)
+    sub.add_parser("status", help="show the active version")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "render":
+        summary = render(force=args.force, manifest_path=args.manifest)
+        print(f"✅ Phrase bank {summary['version']}: {summary['rendered']} rendered, {summary['reused']} reused")
+        if summary["failed"]:
+            print(f"❌ Failed: {', '.join(summary['failed'])}")
+            return 1
+        return 0
+
+    version = current_version()
+    index = _read_index(version) if version else None
+    if not index:
+        print("No phrase bank rendered yet. Run: python phrase_bank.py render")
+        return 1
+    print(f"Active version {version}: {len(index['entries'])} phrases")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+# Unicode blocks per script and the language we map each one to
+SCRIPTS = {
+    "latin": ("en", "A-Za-z\u00C0-\u024F"),
+    "devanagari": ("hi", "\u0900-\u097F"),
+    "bengali": ("bn", "\u0980-\u09FF"),
+    "gurmukhi": ("pa", "\u0A00-\u0A7F"),
+    "gujarati": ("gu", "\u0A80-\u0AFF"),
+    "oriya": ("or", "\u0B00-\u0B7F"),
+    "tamil": ("ta", "\u0B80-\u0BFF"),
+    "telugu": ("te", "\u0C00-\u0C7F"),
+    "kannada": ("kn", "\u0C80-\u0CFF"),
+    "malayalam": ("ml", "\u0D00-\u0D7F"),
+}
+LANGUAGE_SCRIPT = {lang: script for script, (lang, _) in SCRIPTS.items()}
+
+# One alternation, so a single regex pass over the string tags every run of letters
+_SCRIPT_RUNS = re.compile("|".join(f"(?P<{name}>[{ranges}]+)" for name, (_, ranges) in SCRIPTS.items()))
+_WORDS = re.compile(r"[a-z]+")
+
+# Frequent romanized Hindi words that rarely occur in English
+HINGLISH_MARKERS = frozenset("""
+    hai hain nahi nahin kya kyun kyon aap aapka aapko mera meri mere mujhe tum tumhara
+    kaise kaisa kab kahan yahan wahan acha accha theek thik bhai yaar karo karna kar raha
+    rahi rahe hoon hun tha thi bahut chahiye batao bataiye matlab lekin aur bhi abhi kuch
+""".split())
+MIN_MIXED_SHARE = 0.15
+MIN_HINGLISH_SHARE = 0.2
+
+ScriptProfile = namedtuple("ScriptProfile", ["counts", "proportions", "dominant", "code_mixed", "hinglish"])
+
+
+@lru_cache(maxsize=4096)
+def detect(text, default="en"):
+    """Script proportions for text, keyed by language code, in one pass.
+
+    Cached, so the STT, chat and TTS stages of one request share the work.
+    """
+    counts = {}
+    for match in _SCRIPT_RUNS.finditer(text):
+        lang = SCRIPTS[match.lastgroup][0]
+        counts[lang] = counts.get(lang, 0) + match.end() - match.start()
+
+    total = sum(counts.values())
+    proportions = {lang: n / total for lang, n in counts.items()} if total else {}
+    dominant = max(counts, key=counts.get) if counts else default
+
+    significant = [lang for lang, share in proportions.items() if share >= MIN_MIXED_SHARE]
+    code_mixed = len(significant) > 1
+
+    hinglish = code_mixed and "hi" in significant and "en" in significant
+    if not hinglish and dominant == "en":
+        words = _WORDS.findall(text.lower())
+        if words and sum(w in HINGLISH_MARKERS for w in words) / len(words) >= MIN_HINGLISH_SHARE:
+            hinglish = code_mixed = True
+
+    return ScriptProfile(counts, proportions, dominant, code_mixed, hinglish)
+
+
+def has_script(text, language):
+    """True if text contains any character of the language's script."""
+    return detect(text).counts.get(language, 0) > 0
+
+
+def dominant_language(text, default="en"):
+    return detect(text, default).dominant
+
+
+def strongest(text, languages=("hi", "te")):
+    """The language among `languages` with the most characters in text, or None."""
+    counts = detect(text).counts
+    best = max(languages, key=lambda lang: counts.get(lang, 0))
+    return best if counts.get(best, 0) else None
+
+
+def voice_language(text, language):
+    """Language whose voice should read text that was requested in `language`.
+
+    Mislabelled Devanagari/Telugu and Hinglish go to the Hindi/Telugu voice,
+    which handles the English words in them far better than the reverse.
+    """
+    profile = detect(text)
+    if language != "en" or profile.counts.get(language, 0) and not profile.code_mixed:
+        return language
+    if profile.hinglish:
+        return "hi"
+    return strongest(text) or language
@@ -0,0 +1,139 @@
+"""Incremental transcription for the /stt/stream WebSocket.
+
+Clients send 16 kHz mono 16-bit little-endian PCM; backends turn it into
+partial and final transcript events. A backend only needs feed(), finish()
+and close(), so a vendor realtime API can be registered in BACKENDS next to
+the local faster-whisper one.
+"""
+import os
+import asyncio
+import logging
+import numpy as np
+import admission
+from audio_io import AudioBuffer, SAMPLE_RATE, AUDIO_VAD_FRAME_MS, AUDIO_VAD_MIN_DB, frame_levels
+
+logger = logging.getLogger(__name__)
+
+STREAM_STT_BACKEND = os.getenv("STREAM_STT_BACKEND", "whisper")
+# Re-decode the current utterance after this much new audio
+STREAM_STT_STEP = float(os.getenv("STREAM_STT_STEP", 1.0))
+# Longest utterance decoded as one window before it is committed as final
+STREAM_STT_WINDOW = float(os.getenv("STREAM_STT_WINDOW", 15))
+# Trailing silence that ends an utterance
+STREAM_STT_ENDPOINT_SILENCE = float(os.getenv("STREAM_STT_ENDPOINT_SILENCE", 0.8))
+# Tail frames this far below the utterance's loud frames count as silence
+ENDPOINT_DROP_DB = 25
+
+
+class StreamingBackend:
+    """Interface for streaming STT backends.
+
+    feed() and finish() return lists of events:
+        {"type": "partial" | "final", "text": ..., "language": ..., "start": s, "end": s}
+    where start/end are seconds since the stream began.
+    """
+
+    async def feed(self, chunk):
+        raise NotImplementedError
+
+    async def finish(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class WhisperStreamingBackend(StreamingBackend):
+    """Sliding-window faster-whisper: re-decode the open utterance as it grows,
+    commit it on trailing silence or when it fills the window."""
+
+    def __init__(self, step=None, window=None, endpoint_silence=None):
+        self.step = int((STREAM_STT_STEP if step is None else step) * SAMPLE_RATE)
+        self.window = int((STREAM_STT_WINDOW if window is None else window) * SAMPLE_RATE)
+        self.endpoint_silence = STREAM_STT_ENDPOINT_SILENCE if endpoint_silence is None else endpoint_silence
+        self._pending = bytearray()  # odd trailing byte of a chunk
+        self._utterance = np.zeros(0, dtype=np.int16)
+        self._offset = 0  # samples committed or dropped before the open utterance
+        self._decoded_at = 0
+        self._partial = ""
+
+    async def feed(self, chunk):
+        self._pending.extend(chunk)
+        usable = len(self._pending) - len(self._pending) % 2
+        if usable:
+            samples = np.frombuffer(bytes(self._pending[:usable]), dtype=np.int16)
+            del self._pending[:usable]
+            self._utterance = np.concatenate([self._utterance, samples])
+
+        if len(self._utterance) - self._decoded_at < self.step:
+            return []
+        return await self._advance()
+
+    async def finish(self):
+        return await self._commit() if len(self._utterance) else []
+
+    async def _advance(self):
+        levels = frame_levels(self._utterance, SAMPLE_RATE * AUDIO_VAD_FRAME_MS // 1000)
+        loud = float(np.percentile(levels, 95)) if len(levels) else AUDIO_VAD_MIN_DB
+        if loud < AUDIO_VAD_MIN_DB:
+            # Nothing but silence so far; don't let whisper hallucinate on it
+            self._drop(len(self._utterance))
+            return []
+
+        tail = int(self.endpoint_silence * 1000 / AUDIO_VAD_FRAME_MS)
+        if len(levels) > tail and levels[-tail:].max() < max(AUDIO_VAD_MIN_DB, loud - ENDPOINT_DROP_DB):
+            return await self._commit()
+        if len(self._utterance) >= self.window:
+            return await self._commit()
+
+        self._decoded_at = len(self._utterance)
+        text, language = await self._decode(beam_size=1, vad_filter=False)
+        if not text or text == self._partial:
+            return []
+        self._partial = text
+        return [self._event("partial", text, language)]
+
+    async def _commit(self):
+        text, language = await self._decode()
+        event = self._event("final", text, language)
+        self._drop(len(self._utterance))
+        return [event] if text else []
+
+    async def _decode(self, **options):
+        from whisper_stt import submit
+        audio = AudioBuffer(self._utterance)
+        limiter = admission.backend_limiter("whisper")
+        if limiter is None:
+            text, language = await asyncio.wrap_future(submit(audio, **options))
+        else:
+            # Same whisper slots as /stt and jobs, at the socket's priority
+            async with limiter.slot_async():
+                text, language = await asyncio.wrap_future(submit(audio, **options))
+        return text.strip(), language
+
+    def _drop(self, samples):
+        self._utterance = self._utterance[samples:]
+        self._offset += samples
+        self._decoded_at = 0
+        self._partial = ""
+
+    def _event(self, kind, text, language):
+        return {
+            "type": kind,
+            "text": text,
+            "language": language,
+            "start": round(self._offset / SAMPLE_RATE, 2),
+            "end": round((self._offset + len(self._utterance)) / SAMPLE_RATE, 2)
+        }
+
+
+BACKENDS = {
+    "whisper": WhisperStreamingBackend
+}
+
+
+def create_backend(name=None):
+    name = (name or STREAM_STT_BACKEND).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown streaming STT backend: {name}")
+    return BACKENDS[name]()
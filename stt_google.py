@@ -1,60 +1,106 @@
 from google.cloud import speech
 from google.cloud import translate_v2 as translate
-import io
-from pydub import AudioSegment
-import re
-
-def is_hindi(text):
-    """Check for Hindi characters (Unicode range \u0900-\u097F)"""
-    return bool(re.search(r'[\u0900-\u097F]', text))
-
-def prepare_audio(input_path):
-    """Convert any audio to 16kHz mono WAV"""
-    audio = AudioSegment.from_file(input_path)
-    audio = audio.set_frame_rate(16000).set_channels(1)
-    prepared_path = "prepared.wav"
-    audio.export(prepared_path, format="wav")
-    return prepared_path
-
-def transcribe_audio(file_path):
-    client = speech.SpeechClient.from_service_account_file('google_creds.json')
-    prepared_path = prepare_audio(file_path)
-    
-    with io.open(prepared_path, "rb") as f:
-        content = f.read()
-
-    # PHASE 1: Try English with Hindi fallback
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from audio_io import load_audio
+import script_detect
+import metrics
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_CREDS = os.getenv("GOOGLE_APPLICATION_CREDENTIALS", "google_creds.json")
+# Recognition passes run concurrently; the first is the mixed-language pass
+GOOGLE_STT_LANGUAGES = [l.strip() for l in os.getenv("GOOGLE_STT_LANGUAGES", "en-US,hi-IN,te-IN").split(",") if l.strip()]
+GOOGLE_STT_EARLY_EXIT = float(os.getenv("GOOGLE_STT_EARLY_EXIT", 0.85))
+
+_client = None
+_client_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("GOOGLE_STT_WORKERS", 8)), thread_name_prefix="google-stt")
+
+def get_client():
+    """SpeechClient is thread-safe and expensive to build, so share one per process"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = speech.SpeechClient.from_service_account_file(GOOGLE_CREDS)
+    return _client
+
+def prepare_audio(audio):
+    """Convert any audio to 16kHz mono LINEAR16 bytes, in memory"""
+    if not hasattr(audio, "pcm_bytes"):
+        audio = load_audio(audio)
+    return audio.pcm_bytes()
+
+def _short_code(language_code):
+    return language_code.split("-")[0].lower()
+
+def _recognize(content, language_code, alternatives):
     config = speech.RecognitionConfig(
         encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
         sample_rate_hertz=16000,
-        language_code="en-US",
-        alternative_language_codes=["hi-IN"],
+        language_code=language_code,
+        alternative_language_codes=alternatives,
         enable_automatic_punctuation=True,
         model="latest_long"
     )
-    
-    response = client.recognize(config=config, audio={"content": content})
-    
-    if response.results:
-        transcript = " ".join(r.alternatives[0].transcript for r in response.results)
-        
-        # PHASE 2: Language verification
-        if is_hindi(transcript):
-            # Re-transcribe with Hindi focus if we detect Hindi chars
-            config.language_code = "hi-IN"
-            config.alternative_language_codes = []
-            response = client.recognize(config=config, audio={"content": content})
-            if response.results:
-                return " ".join(r.alternatives[0].transcript for r in response.results), "hi"
-        
-        return transcript, "en"
-    
-    # PHASE 3: Fallback to Hindi-only if English fails
-    config.language_code = "hi-IN"
-    config.alternative_language_codes = []
-    response = client.recognize(config=config, audio={"content": content})
-    if response.results:
-        transcript = " ".join(r.alternatives[0].transcript for r in response.results)
-        return transcript, "hi"
-    
-    return "", "en"  # Ultimate fallback
\ No newline at end of file
+    response = get_client().recognize(config=config, audio={"content": content})
+    if not response.results:
+        return None
+
+    transcript = " ".join(r.alternatives[0].transcript for r in response.results)
+    confidence = sum(r.alternatives[0].confidence for r in response.results) / len(response.results)
+
+    # Trust the script over the requested language code
+    lang = script_detect.strongest(transcript)
+    if lang is None:
+        detected = response.results[0].language_code
+        lang = _short_code(detected) if detected else _short_code(language_code)
+    return transcript, confidence, lang
+
+def transcribe_audio(audio):
+    with metrics.stage("stt", backend="google") as labels:
+        transcript, lang = _transcribe(audio)
+        labels["language"] = lang
+    return transcript, lang
+
+def _transcribe(audio):
+    content = prepare_audio(audio)
+    metrics.count_bytes("stt", "in", len(content), backend="google")
+
+    # All candidate languages at once instead of one re-transcription after another
+    primary, others = GOOGLE_STT_LANGUAGES[0], GOOGLE_STT_LANGUAGES[1:]
+    futures = {_executor.submit(_recognize, content, primary, others): primary}
+    for language_code in others:
+        futures[_executor.submit(_recognize, content, language_code, [])] = language_code
+
+    best = None
+    error = None
+    for future in as_completed(futures):
+        try:
+            result = future.result()
+        except Exception as e:
+            logger.error(f"Google STT pass {futures[future]} failed: {str(e)}")
+            error = e
+            continue
+        if result is None:
+            continue
+
+        transcript, confidence, lang = result
+        if best is None or confidence > best[1]:
+            best = result
+        # A confident pass in a script-consistent language is good enough; don't wait on the rest
+        if confidence >= GOOGLE_STT_EARLY_EXIT and lang == _short_code(futures[future]):
+            logger.info(f"Google STT early exit on {futures[future]} ({confidence:.2f})")
+            break
+
+    for future in futures:
+        future.cancel()
+
+    if best is None:
+        # A failed pass (bad credentials, outage) isn't silence; let the router fail over
+        if error is not None:
+            raise error
+        return "", "en"  # Every pass ran and heard nothing
+    return best[0], best[2]
@@ -0,0 +1,240 @@
+"""Background transcription jobs for long recordings (voicemail, recorded calls).
+
+The audio is split at silences into chunks of about STT_JOB_CHUNK_SECONDS,
+the chunks are transcribed in parallel and stitched back in order with their
+offsets in the original recording. Job state is a JSON file per job, so any
+worker on the host can answer status requests.
+"""
+import os
+import json
+import time
+import uuid
+import shutil
+import asyncio
+import logging
+import threading
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import numpy as np
+import admission
+import metrics
+from audio_io import AudioBuffer, SAMPLE_RATE, load_audio, speech_spans
+
+logger = logging.getLogger(__name__)
+
+STT_JOBS_DIR = os.getenv("STT_JOBS_DIR", "stt_jobs")
+STT_JOB_CHUNK_SECONDS = float(os.getenv("STT_JOB_CHUNK_SECONDS", 60))
+# Speech that runs longer than this without a pause is cut anyway
+STT_JOB_MAX_CHUNK_SECONDS = float(os.getenv("STT_JOB_MAX_CHUNK_SECONDS", 120))
+STT_JOB_PROCESSES = int(os.getenv("STT_JOB_PROCESSES", 2))
+STT_JOB_CONCURRENCY = int(os.getenv("STT_JOB_CONCURRENCY", 8))
+STT_JOB_TTL = float(os.getenv("STT_JOB_TTL", 86400))
+JOB_BACKENDS = ("assemblyai", "whisper")
+# Pauses shorter than this never become chunk boundaries
+SPLIT_MIN_SILENCE = 0.3
+
+_jobs = ThreadPoolExecutor(max_workers=int(os.getenv("STT_JOB_WORKERS", 2)), thread_name_prefix="stt-job")
+_processes = None
+_processes_lock = threading.Lock()
+
+
+def _path(job_id, suffix=".json"):
+    # Job ids come from callers, so keep them out of other directories
+    return os.path.join(STT_JOBS_DIR, f"{os.path.basename(job_id)}{suffix}")
+
+
+def _save(job):
+    job["updated_at"] = time.time()
+    path = _path(job["id"])
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(job, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def load_job(job_id):
+    try:
+        with open(_path(job_id), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def split_at_silence(audio, target=STT_JOB_CHUNK_SECONDS, limit=STT_JOB_MAX_CHUNK_SECONDS):
+    """(start, end) sample ranges of about `target` seconds, cut in pauses.
+
+    Silence between chunks is left out, so the ranges don't cover the whole
+    recording, but their offsets are positions in the original audio.
+    """
+    target, limit = int(target * SAMPLE_RATE), int(limit * SAMPLE_RATE)
+    spans = speech_spans(audio, max_silence=SPLIT_MIN_SILENCE)
+
+    pieces = []
+    for a, b in spans:
+        # Continuous speech longer than the limit gets hard cuts
+        while b - a > limit:
+            pieces.append((a, a + limit))
+            a += limit
+        pieces.append((a, b))
+
+    chunks = []
+    for a, b in pieces:
+        if chunks and b - chunks[-1][0] <= target:
+            chunks[-1] = (chunks[-1][0], b)
+        else:
+            chunks.append((a, b))
+    return chunks
+
+
+def _init_process(cpu_threads):
+    # Read by whisper_stt at import; keeps the pool from oversubscribing cores
+    os.environ["WHISPER_CPU_THREADS"] = str(cpu_threads)
+
+
+def _whisper_chunk(pcm):
+    from whisper_stt import transcribe_with_confidence
+    return transcribe_with_confidence(AudioBuffer(pcm))
+
+
+def _get_processes():
+    """Whisper chunks run in their own processes, each with its own model, so a
+    long job isn't limited to one interpreter or one pooled instance."""
+    global _processes
+    with _processes_lock:
+        if _processes is None:
+            processes = max(1, STT_JOB_PROCESSES)
+            _processes = ProcessPoolExecutor(
+                max_workers=processes,
+                # spawn: forking a process that holds loaded models and locks isn't safe
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_process,
+                initargs=(max(1, (os.cpu_count() or 1) // processes),)
+            )
+    return _processes
+
+
+def _transcribe_whisper(chunks, on_result):
+    # The process pool has its own limiter, shared by every job in this worker;
+    # the in-process whisper slots stay free for live decodes
+    def one(index, pcm):
+        with admission.batch_slot("whisper-jobs"):
+            result = _get_processes().submit(_whisper_chunk, pcm).result()
+        on_result(index, *result)
+
+    with ThreadPoolExecutor(max_workers=max(1, STT_JOB_PROCESSES), thread_name_prefix="stt-job-chunk") as pool:
+        for future in [pool.submit(metrics.copy_context().run, one, i, pcm) for i, pcm in enumerate(chunks)]:
+            future.result()
+
+
+def _transcribe_assemblyai(chunks, on_result):
+    from assemblyai_stt import run_sync, transcribe_audio_async
+
+    async def run_all():
+        semaphore = asyncio.Semaphore(STT_JOB_CONCURRENCY)
+
+        async def one(index, pcm):
+            async with semaphore, admission.batch_slot_async("assemblyai"):
+                # Each chunk gets a poll timeout sized to its own duration
+                text, language = await transcribe_audio_async(AudioBuffer(pcm))
+            on_result(index, text, language)
+
+        await asyncio.gather(*(one(i, pcm) for i, pcm in enumerate(chunks)))
+
+    run_sync(run_all())
+
+
+TRANSCRIBERS = {
+    "whisper": _transcribe_whisper,
+    "assemblyai": _transcribe_assemblyai
+}
+
+
+def pick_backend(requested=None):
+    if requested:
+        if requested not in JOB_BACKENDS:
+            raise ValueError(f"Unsupported job backend: {requested}")
+        return requested
+    # Follow the STT router so a tripped breaker also steers new jobs
+    from backend_router import get_router
+    for backend in get_router("stt").order():
+        if backend.name in JOB_BACKENDS:
+            return backend.name
+    return "whisper"
+
+
+def _run(job_id):
+    job = load_job(job_id)
+    audio_path = _path(job_id, ".audio")
+    try:
+        job["status"] = "running"
+        _save(job)
+
+        with load_audio(audio_path, trim=False) as audio:
+            job["duration"] = round(audio.duration, 2)
+            ranges = split_at_silence(audio)
+            chunks = [np.array(audio.pcm[a:b]) for a, b in ranges]
+        job["segments"] = [{"start": round(a / SAMPLE_RATE, 2), "end": round(b / SAMPLE_RATE, 2), "text": None}
+                           for a, b in ranges]
+        job["chunks_total"] = len(chunks)
+        _save(job)
+
+        lock = threading.Lock()
+
+        def on_result(index, text, language):
+            with lock:
+                job["segments"][index].update(text=text.strip(), language=language)
+                job["chunks_done"] += 1
+                _save(job)
+
+        started = time.perf_counter()
+        TRANSCRIBERS[job["backend"]](chunks, on_result)
+
+        # Language of the job is the one covering the most audio
+        spoken = Counter()
+        for segment in job["segments"]:
+            spoken[segment.get("language")] += segment["end"] - segment["start"]
+        job["language"] = spoken.most_common(1)[0][0] if spoken else None
+        job["text"] = " ".join(s["text"] for s in job["segments"] if s["text"])
+        job["transcribe_seconds"] = round(time.perf_counter() - started, 2)
+        job["status"] = "completed"
+        logger.info(f"STT job {job_id}: {job['duration']}s of audio in {len(chunks)} chunks, "
+                    f"{job['transcribe_seconds']}s on {job['backend']}")
+    except Exception as e:
+        logger.error(f"STT job {job_id} failed: {str(e)}", exc_info=True)
+        job["status"] = "error"
+        job["error"] = str(e)
+    finally:
+        _save(job)
+        if os.path.exists(audio_path):
+            os.remove(audio_path)
+
+
+def submit(stream, backend=None):
+    """Store the upload and start transcribing it in the background; returns the job."""
+    os.makedirs(STT_JOBS_DIR, exist_ok=True)
+    purge_expired()
+    job = {
+        "id": uuid.uuid4().hex,
+        "status": "queued",
+        "backend": pick_backend(backend),
+        "created_at": time.time(),
+        "chunks_total": None,
+        "chunks_done": 0
+    }
+    with open(_path(job["id"], ".audio"), "wb") as f:
+        shutil.copyfileobj(stream, f)
+    _save(job)
+    _jobs.submit(metrics.copy_context().run, _run, job["id"])
+    return job
+
+
+def purge_expired():
+    cutoff = time.time() - STT_JOB_TTL
+    for name in os.listdir(STT_JOBS_DIR):
+        path = os.path.join(STT_JOBS_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
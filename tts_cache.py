@@ -0,0 +1,245 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+AUDIO_DIR = "audio_outputs"
+# Re-encoded copies served by audio_delivery.py, removed here once their source is gone
+VARIANTS_DIR = os.path.join(AUDIO_DIR, "variants")
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", 500 * 1024 * 1024))
+TTS_CACHE_MAX_AGE = float(os.getenv("TTS_CACHE_MAX_AGE", 30 * 24 * 3600))
+TTS_CACHE_SWEEP_INTERVAL = float(os.getenv("TTS_CACHE_SWEEP_INTERVAL", 60))
+TTS_PLAYLIST_MAX_AGE = float(os.getenv("TTS_PLAYLIST_MAX_AGE", 24 * 3600))
+STALE_TMP_AGE = 3600
+
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+_last_sweep = 0.0
+
+
+def cache_key(text, language, voice_id, model_id, voice_settings):
+    """Stable across processes and restarts, unlike hash()."""
+    payload = json.dumps({
+        "text": text,
+        "language": language,
+        "voice_id": voice_id,
+        "model_id": model_id,
+        "voice_settings": voice_settings or {}
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def filename_for(key):
+    return f"tts_{key}.mp3"
+
+
+def _count(name):
+    with _lock:
+        _stats[name] += 1
+
+
+def lookup(key):
+    filename = filename_for(key)
+    path = os.path.join(AUDIO_DIR, filename)
+    try:
+        # mtime doubles as the LRU clock so every worker sees the same recency
+        os.utime(path)
+    except FileNotFoundError:
+        _count("misses")
+        return None
+    _count("hits")
+    return filename
+
+
+def get_or_create(text, language, voice_id, model_id, voice_settings, render):
+    """Return the cached filename for this phrase, calling render(path) on a miss.
+
+    render must write the audio to the given path or raise.
+    """
+    key = cache_key(text, language, voice_id, model_id, voice_settings)
+    filename = lookup(key)
+    if filename:
+        logger.info(f"TTS cache hit: {filename}")
+        return filename
+
+    os.makedirs(AUDIO_DIR, exist_ok=True)
+    filename = filename_for(key)
+    path = os.path.join(AUDIO_DIR, filename)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        render(tmp_path)
+        # Atomic, so other workers never serve a half-written file
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    maybe_sweep()
+    return filename
+
+
+async def get_or_create_async(text, language, voice_id, model_id, voice_settings, render):
+    """get_or_create() for event-loop callers; render is a coroutine function."""
+    key = cache_key(text, language, voice_id, model_id, voice_settings)
+    filename = lookup(key)
+    if filename:
+        logger.info(f"TTS cache hit: {filename}")
+        return filename
+
+    os.makedirs(AUDIO_DIR, exist_ok=True)
+    filename = filename_for(key)
+    path = os.path.join(AUDIO_DIR, filename)
+    tmp_path = f"{path}.{os.getpid()}.{id(asyncio.current_task())}.tmp"
+    try:
+        await render(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    # Directory scans can be slow on a big cache; keep them off the loop
+    await asyncio.get_running_loop().run_in_executor(None, maybe_sweep)
+    return filename
+
+
+def stream_or_create(text, language, voice_id, model_id, voice_settings, stream, chunk_size=4096):
+    """Return (filename, chunks) for this phrase.
+
+    On a hit the chunks are read from disk. On a miss stream(path) must return
+    an iterator of audio bytes that also writes them to path; the file only
+    enters the cache once the iterator is fully consumed.
+    """
+    key = cache_key(text, language, voice_id, model_id, voice_settings)
+    filename = lookup(key)
+    if filename:
+        logger.info(f"TTS cache hit: {filename}")
+        return filename, iter_file(os.path.join(AUDIO_DIR, filename), chunk_size)
+
+    os.makedirs(AUDIO_DIR, exist_ok=True)
+    filename = filename_for(key)
+    return filename, _tee(stream, os.path.join(AUDIO_DIR, filename))
+
+
+def iter_file(path, chunk_size=4096):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def _tee(stream, path):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        yield from stream(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        # A disconnected client or upstream error leaves a partial file behind
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    maybe_sweep()
+
+
+def maybe_sweep():
+    global _last_sweep
+    now = time.time()
+    with _lock:
+        if now - _last_sweep < TTS_CACHE_SWEEP_INTERVAL:
+            return
+        _last_sweep = now
+    try:
+        sweep()
+    except Exception as e:
+        logger.error(f"TTS cache sweep failed: {str(e)}")
+
+
+def sweep():
+    now = time.time()
+    entries = []
+    removed = 0
+    try:
+        names = os.listdir(AUDIO_DIR)
+    except FileNotFoundError:
+        return 0
+
+    for name in names:
+        path = os.path.join(AUDIO_DIR, name)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        if name.endswith(".tmp"):
+            if now - st.st_mtime > STALE_TMP_AGE:
+                _remove(path)
+            continue
+        if name.startswith("playlist_") and name.endswith(".m3u"):
+            if now - st.st_mtime > TTS_PLAYLIST_MAX_AGE:
+                _remove(path)
+            continue
+        if not (name.startswith("tts_") and name.endswith(".mp3")):
+            continue
+        if TTS_CACHE_MAX_AGE and now - st.st_mtime > TTS_CACHE_MAX_AGE:
+            removed += _remove(path)
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    if TTS_CACHE_MAX_BYTES and total > TTS_CACHE_MAX_BYTES:
+        entries.sort()
+        for _, size, path in entries:
+            if total <= TTS_CACHE_MAX_BYTES:
+                break
+            removed += _remove(path)
+            total -= size
+
+    if removed:
+        with _lock:
+            _stats["evictions"] += removed
+        logger.info(f"TTS cache evicted {removed} file(s)")
+    _sweep_variants(now)
+    return removed
+
+
+def _sweep_variants(now):
+    """Remove variants/<format>/<name> files whose <name>.mp3 source no longer exists."""
+    removed = 0
+    for root, _, names in os.walk(VARIANTS_DIR):
+        parts = os.path.relpath(root, VARIANTS_DIR).split(os.sep)
+        if parts[0] == ".":
+            continue
+        for name in names:
+            path = os.path.join(root, name)
+            if name.endswith(".tmp"):
+                try:
+                    if now - os.stat(path).st_mtime > STALE_TMP_AGE:
+                        _remove(path)
+                except FileNotFoundError:
+                    pass
+                continue
+            source = os.path.join(AUDIO_DIR, *parts[1:], os.path.splitext(name)[0] + ".mp3")
+            if not os.path.exists(source):
+                removed += _remove(path)
+    if removed:
+        logger.info(f"Removed {removed} audio variant(s) of evicted files")
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+        return 1
+    except FileNotFoundError:
+        return 0
+
+
+def stats():
+    with _lock:
+        result = dict(_stats)
+    lookups = result["hits"] + result["misses"]
+    result["hit_rate"] = round(result["hits"] / lookups, 4) if lookups else 0.0
+    return result
@@ -0,0 +1,9 @@
+"""Marker for text that must be spoken as one unit.
+
+Chat streams yield it for fixed replies (fallback apologies) and the TTS
+pipeline never splits or merges it, so it still matches its phrase bank entry.
+"""
+
+
+class Utterance(str):
+    """A delta to synthesize as one segment, e.g. a fallback the phrase bank has pre-rendered."""
@@ -0,0 +1,208 @@
+import os
+import re
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+from utterance import Utterance
+
+logger = logging.getLogger(__name__)
+
+AUDIO_DIR = "audio_outputs"
+TTS_PIPELINE_WORKERS = int(os.getenv("TTS_PIPELINE_WORKERS", 4))
+MIN_SENTENCE_CHARS = int(os.getenv("TTS_PIPELINE_MIN_CHARS", 20))
+
+_executor = ThreadPoolExecutor(max_workers=TTS_PIPELINE_WORKERS, thread_name_prefix="tts-pipeline")
+_punkt_available = None
+
+# Punkt's English model doesn't know the Devanagari danda
+_DANDA_SPLIT = re.compile(r'(?<=[।॥])\s+')
+_FALLBACK_SPLIT = re.compile(r'(?<=[.!?।॥])\s+')
+
+
+def _has_punkt():
+    """Whether nltk punkt is on disk. A miss only sticks once warm-up, which may
+    still be downloading it, has finished."""
+    global _punkt_available
+    if _punkt_available is not None:
+        return _punkt_available
+    from warmup import settled
+    final = settled()  # before looking, so a download finishing in between is seen next time
+    try:
+        import nltk
+        nltk.data.find('tokenizers/punkt')
+        _punkt_available = True
+    except (ImportError, LookupError):
+        if final:
+            logger.warning("nltk punkt not available, splitting sentences on punctuation")
+            _punkt_available = False
+        return False
+    return True
+
+
+def _split(text):
+    pieces = [p for p in _DANDA_SPLIT.split(text) if p.strip()]
+    if not _has_punkt():
+        return [s for p in pieces for s in _FALLBACK_SPLIT.split(p) if s.strip()]
+
+    from nltk.tokenize import sent_tokenize
+    return [s for p in pieces for s in sent_tokenize(p)]
+
+
+def iter_sentences(deltas, min_chars=MIN_SENTENCE_CHARS):
+    """Group streamed text deltas into sentences as soon as they are complete.
+
+    A sentence only counts as complete once the next one has started, and
+    sentences shorter than min_chars are merged into the following one so
+    "Hi." doesn't become its own TTS request. An Utterance is never split or
+    merged, so it still matches its phrase bank entry.
+    """
+    buffer = ""
+    pending = ""
+    for delta in deltas:
+        if isinstance(delta, Utterance):
+            head = f"{pending} {buffer.strip()}".strip()
+            if head:
+                yield head
+            buffer = pending = ""
+            yield str(delta)
+            continue
+        buffer += delta
+        sentences = _split(buffer)
+        if len(sentences) < 2:
+            continue
+        for sentence in sentences[:-1]:
+            pending = f"{pending} {sentence}".strip()
+            if len(pending) >= min_chars:
+                yield pending
+                pending = ""
+        # Keep the trailing whitespace so the next delta joins correctly
+        buffer = buffer[buffer.rfind(sentences[-1]):]
+
+    tail = f"{pending} {buffer.strip()}".strip()
+    if tail:
+        yield tail
+
+
+class Segment:
+    def __init__(self, index, text):
+        self.index = index
+        self.text = text
+        self.filename = None
+        self.error = None
+
+
+class SpeechPipeline:
+    """Synthesizes sentence N while the LLM is still generating sentence N+1."""
+
+    def __init__(self, deltas, language, synthesize):
+        self.language = language
+        self.playlist_file = f"playlist_{uuid.uuid4().hex}.m3u"
+        self._deltas = deltas
+        self._synthesize = synthesize
+        self._segments = []
+        self._flushed = 0
+        self._lock = threading.Lock()
+        self._first_ready = threading.Event()
+        self._generated = threading.Event()
+        self._done = threading.Event()
+        self._generation_done = False
+
+    def start(self):
+        threading.Thread(target=metrics.copy_context().run, args=(self._run,), name="tts-pipeline-producer", daemon=True).start()
+        return self
+
+    def _run(self):
+        try:
+            for text in iter_sentences(self._deltas):
+                with self._lock:
+                    segment = Segment(len(self._segments), text)
+                    self._segments.append(segment)
+                future = _executor.submit(metrics.copy_context().run, self._synthesize, text, self.language)
+                future.add_done_callback(lambda f, seg=segment: self._on_done(seg, f))
+        except Exception as e:
+            logger.error(f"Pipeline generation failed: {str(e)}", exc_info=True)
+        finally:
+            with self._lock:
+                self._generation_done = True
+            self._generated.set()
+            self._flush()
+
+    def _on_done(self, segment, future):
+        try:
+            segment.filename = future.result()
+        except Exception as e:
+            logger.error(f"Pipeline TTS failed for segment {segment.index}: {str(e)}")
+            segment.error = e
+        self._flush()
+
+    def _flush(self):
+        # Only publish the contiguous prefix of finished segments so the
+        # playlist always plays in order.
+        with self._lock:
+            while self._flushed < len(self._segments):
+                segment = self._segments[self._flushed]
+                if segment.filename is None and segment.error is None:
+                    break
+                self._flushed += 1
+            finished = self._generation_done and self._flushed == len(self._segments)
+            ready = [s for s in self._segments[:self._flushed] if s.filename]
+            self._write_playlist(ready, finished)
+
+        if ready or finished:
+            self._first_ready.set()
+        if finished:
+            self._done.set()
+
+    def _write_playlist(self, segments, finished):
+        lines = ["#EXTM3U"] + [s.filename for s in segments]
+        if finished:
+            lines.append("#EXT-X-ENDLIST")
+        os.makedirs(AUDIO_DIR, exist_ok=True)
+        path = os.path.join(AUDIO_DIR, self.playlist_file)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+
+    def first_segment(self, timeout=None):
+        """Block until the first segment is synthesized and return it."""
+        if not self._first_ready.wait(timeout):
+            raise TimeoutError("No audio segment ready in time")
+        with self._lock:
+            flushed = self._segments[:self._flushed]
+        for segment in flushed:
+            if segment.filename:
+                return segment
+        errors = [s.error for s in flushed if s.error]
+        if errors:
+            raise errors[0]
+        raise RuntimeError("Model returned no text")
+
+    def wait(self, timeout=None):
+        self._done.wait(timeout)
+        return self.segments()
+
+    def segments(self):
+        with self._lock:
+            return list(self._segments)
+
+    def text(self):
+        """The reply generated so far."""
+        return " ".join(s.text for s in self.segments())
+
+    def generated(self):
+        """Whether the model has finished the reply."""
+        return self._generated.is_set()
+
+    def full_text(self, timeout=None):
+        """The whole reply once the model has finished it; later segments may still be in TTS."""
+        if not self._generated.wait(timeout):
+            logger.warning("Reply still generating, returning the text so far")
+        return self.text()
+
+
+def start_pipeline(messages, language, synthesize):
+    from openai_chat import stream_ai_response
+    return SpeechPipeline(stream_ai_response(messages), language, synthesize).start()
@@ -0,0 +1,142 @@
+import os
+import time
+import logging
+import importlib
+import multiprocessing
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# auto: warm whatever the configured API keys enable; or a comma list of step names; or "none"
+WARMUP_BACKENDS = os.getenv("WARMUP_BACKENDS", "auto").lower()
+# auto: download punkt if missing and the network allows; never: only use what's on disk
+NLTK_DOWNLOAD = os.getenv("NLTK_DOWNLOAD", "auto").lower()
+STARTUP_IMPORT_BUDGET = float(os.getenv("STARTUP_IMPORT_BUDGET", 2.0))
+
+_lock = threading.Lock()
+_status = {"state": "pending", "steps": {}, "errors": {}, "import_seconds": None, "warmup_seconds": None}
+_ready = threading.Event()
+_started = False
+
+
+def ensure_nltk_punkt():
+    """Make punkt available without touching the network when it's already on disk."""
+    import nltk
+    try:
+        nltk.data.find('tokenizers/punkt')
+        return True
+    except LookupError:
+        pass
+    if NLTK_DOWNLOAD == "never":
+        logger.warning("nltk punkt missing and NLTK_DOWNLOAD=never; sentence splitting will use punctuation")
+        return False
+    if not nltk.download('punkt', quiet=True, raise_on_error=False):
+        logger.warning("nltk punkt download failed; sentence splitting will use punctuation")
+        return False
+    return True
+
+
+def _import(*modules):
+    def step():
+        for module in modules:
+            importlib.import_module(module)
+    return step
+
+
+def _warm_whisper():
+    from whisper_stt import warm_up
+    warm_up(instances=int(os.getenv("WHISPER_PRELOAD_INSTANCES", 1)))
+
+
+STEPS = {
+    "audio": _import("audio_io"),
+    "assemblyai": _import("assemblyai_stt", "http_transport"),
+    "whisper": _warm_whisper,
+    "elevenlabs": _import("elevenlabs_tts", "tts_cache"),
+    "gtts": _import("gtts", "tts_cache"),
+    "openai": _import("openai_chat"),
+    "nltk": ensure_nltk_punkt,
+    "pipeline": _import("voice_pipeline"),
+}
+
+
+def enabled_steps():
+    if WARMUP_BACKENDS == "none":
+        return []
+    if WARMUP_BACKENDS != "auto":
+        return [s.strip() for s in WARMUP_BACKENDS.split(",") if s.strip() in STEPS]
+
+    steps = ["audio", "assemblyai" if os.getenv("ASSEMBLYAI_API_KEY") else "whisper"]
+    steps.append("elevenlabs" if os.getenv("ELEVENLABS_API_KEY") else "gtts")
+    if os.getenv("OPENAI_API_KEY"):
+        steps.append("openai")
+    if os.getenv("VAPI_TTS_PIPELINE", "off").lower() in ("first", "playlist"):
+        steps += ["nltk", "pipeline"]
+    return steps
+
+
+def record_import_time(seconds, module="app"):
+    with _lock:
+        _status["import_seconds"] = round(seconds, 3)
+    if seconds > STARTUP_IMPORT_BUDGET:
+        logger.warning(f"Importing {module} took {seconds:.2f}s, over the {STARTUP_IMPORT_BUDGET:.2f}s budget")
+    else:
+        logger.info(f"Imported {module} in {seconds:.2f}s")
+
+
+def run():
+    start = time.perf_counter()
+    with _lock:
+        _status["state"] = "warming"
+    for name in enabled_steps():
+        step_start = time.perf_counter()
+        try:
+            STEPS[name]()
+        except Exception as e:
+            # A failed step only costs the first request its latency; don't hold readiness
+            logger.error(f"Warm-up step {name} failed: {str(e)}", exc_info=True)
+            with _lock:
+                _status["errors"][name] = str(e)
+        with _lock:
+            _status["steps"][name] = round(time.perf_counter() - step_start, 3)
+
+    with _lock:
+        _status["state"] = "ready"
+        _status["warmup_seconds"] = round(time.perf_counter() - start, 3)
+    _ready.set()
+    logger.info(f"Warm-up finished: {_status['steps']}")
+
+
+def start():
+    """Warm up in a background thread. Call once per worker process (after fork)."""
+    global _started
+    if multiprocessing.parent_process() is not None:
+        # A pool child (e.g. stt_jobs' whisper processes) re-importing app; it serves no requests
+        return
+    with _lock:
+        if _started:
+            return
+        _started = True
+    threading.Thread(target=run, name="warmup", daemon=True).start()
+
+
+def is_ready():
+    return _ready.is_set()
+
+
+def settled():
+    """True once warm-up has finished, or when it was never started in this process."""
+    return _ready.is_set() or not _started
+
+
+def status():
+    with _lock:
+        return {
+            "state": _status["state"],
+            "steps": dict(_status["steps"]),
+            "errors": dict(_status["errors"]),
+            "import_seconds": _status["import_seconds"],
+            "warmup_seconds": _status["warmup_seconds"]
+        }
@@ -1,31 +1,272 @@
 import os
+import time
 import logging
+import threading
+from contextlib import contextmanager
 from faster_whisper import WhisperModel
+import metrics
 
 logger = logging.getLogger(__name__)
 
-def transcribe_with_confidence(file_path):
+MODELS_DIR = "./models"
+WHISPER_MODEL_SIZE = os.getenv("WHISPER_MODEL_SIZE", "small")
+WHISPER_COMPUTE_TYPE = os.getenv("WHISPER_COMPUTE_TYPE", "int8")
+WHISPER_POOL_SIZE = int(os.getenv("WHISPER_POOL_SIZE", 1))
+WHISPER_POOL_MIN = int(os.getenv("WHISPER_POOL_MIN", 1))
+WHISPER_IDLE_TIMEOUT = float(os.getenv("WHISPER_IDLE_TIMEOUT", 900))
+WHISPER_ACQUIRE_TIMEOUT = float(os.getenv("WHISPER_ACQUIRE_TIMEOUT", 120))
+WHISPER_CPU_THREADS = int(os.getenv("WHISPER_CPU_THREADS", 0))
+WHISPER_NUM_WORKERS = int(os.getenv("WHISPER_NUM_WORKERS", 1))
+
+# "latency" trades a little accuracy for much faster CPU decoding
+PROFILES = {
+    "latency": {"beam_size": 1, "vad_filter": True},
+    "quality": {"beam_size": 5, "vad_filter": False}
+}
+WHISPER_PROFILE = os.getenv("WHISPER_PROFILE", "quality")
+
+_pools = {}
+_pools_lock = threading.Lock()
+# Loads are serialized so the RSS delta of each load can be attributed to
+# one instance and two workers never download the same model at once.
+_load_lock = threading.Lock()
+_reaper = None
+
+
+def decode_options(beam_size=None, vad_filter=None):
+    options = dict(PROFILES.get(WHISPER_PROFILE, PROFILES["quality"]))
+    if os.getenv("WHISPER_BEAM_SIZE"):
+        options["beam_size"] = int(os.getenv("WHISPER_BEAM_SIZE"))
+    if os.getenv("WHISPER_VAD_FILTER"):
+        options["vad_filter"] = os.getenv("WHISPER_VAD_FILTER").lower() in ("1", "true", "yes")
+    if beam_size is not None:
+        options["beam_size"] = beam_size
+    if vad_filter is not None:
+        options["vad_filter"] = vad_filter
+    return options
+
+
+def cpu_threads_per_instance(max_instances):
+    """Split the cores between pooled instances so concurrent decodes don't oversubscribe."""
+    if WHISPER_CPU_THREADS:
+        return WHISPER_CPU_THREADS
+    return max(1, (os.cpu_count() or 1) // max(1, max_instances))
+
+
+def _rss_bytes():
     try:
-        logger.debug(f"Starting Whisper processing: {file_path}")
-        
-        # Create models directory if not exists
-        os.makedirs("./models", exist_ok=True)
-        
-        model = WhisperModel(
-            "small",
-            device="cpu",
-            compute_type="int8",
-            download_root="./models"
-        )
-        
-        # Add explicit audio file check
-        if not os.path.exists(file_path):
-            raise FileNotFoundError(f"Audio file not found: {file_path}")
-            
-        segments, info = model.transcribe(file_path, beam_size=5)
-        transcript = " ".join([segment.text for segment in segments])
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class ModelPool:
+    """Bounded pool of WhisperModel instances for one (size, compute_type)."""
+
+    def __init__(self, size, compute_type, max_instances=WHISPER_POOL_SIZE):
+        self.size = size
+        self.compute_type = compute_type
+        self.max_instances = max(1, max_instances)
+        self.cpu_threads = cpu_threads_per_instance(self.max_instances)
+        self._cond = threading.Condition()
+        self._idle = []  # [(model, instance_id, last_used)]
+        self._loaded = 0
+        self._next_id = 0
+        self._memory = {}  # instance_id -> bytes
+        self.load_seconds = 0.0
+
+    def _load(self):
+        os.makedirs(MODELS_DIR, exist_ok=True)
+        with _load_lock:
+            rss_before = _rss_bytes()
+            start = time.monotonic()
+            model = WhisperModel(
+                self.size,
+                device="cpu",
+                compute_type=self.compute_type,
+                cpu_threads=self.cpu_threads,
+                num_workers=WHISPER_NUM_WORKERS,
+                download_root=MODELS_DIR
+            )
+            elapsed = time.monotonic() - start
+            rss_after = _rss_bytes()
+
+        with self._cond:
+            instance_id = self._next_id
+            self._next_id += 1
+            if rss_before is not None and rss_after is not None:
+                self._memory[instance_id] = max(0, rss_after - rss_before)
+            self.load_seconds += elapsed
+
+        logger.info(f"Loaded Whisper {self.size}/{self.compute_type} "
+                    f"instance {instance_id} in {elapsed:.1f}s")
+        return model, instance_id
+
+    @contextmanager
+    def acquire(self, timeout=WHISPER_ACQUIRE_TIMEOUT):
+        deadline = time.monotonic() + timeout
+        need_load = False
+        with self._cond:
+            while not self._idle and self._loaded >= self.max_instances:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"No Whisper {self.size} instance free after {timeout}s")
+                self._cond.wait(remaining)
+            if self._idle:
+                model, instance_id, _ = self._idle.pop()
+            else:
+                self._loaded += 1
+                need_load = True
+
+        if need_load:
+            try:
+                model, instance_id = self._load()
+            except Exception:
+                with self._cond:
+                    self._loaded -= 1
+                    self._cond.notify()
+                raise
+
+        try:
+            yield model
+        finally:
+            with self._cond:
+                self._idle.append((model, instance_id, time.monotonic()))
+                self._cond.notify()
+
+    def warm_up(self, instances=1):
+        instances = min(instances, self.max_instances)
+        while True:
+            with self._cond:
+                if self._loaded >= instances:
+                    return
+                self._loaded += 1
+            try:
+                model, instance_id = self._load()
+            except Exception:
+                with self._cond:
+                    self._loaded -= 1
+                raise
+            with self._cond:
+                self._idle.append((model, instance_id, time.monotonic()))
+                self._cond.notify()
+
+    def evict_idle(self, max_idle=WHISPER_IDLE_TIMEOUT, keep=WHISPER_POOL_MIN):
+        now = time.monotonic()
+        evicted = 0
+        with self._cond:
+            # Oldest first, so the most recently used instances stay warm
+            self._idle.sort(key=lambda item: item[2])
+            while self._idle and self._loaded > keep and now - self._idle[0][2] > max_idle:
+                _, instance_id, _ = self._idle.pop(0)
+                self._memory.pop(instance_id, None)
+                self._loaded -= 1
+                evicted += 1
+        if evicted:
+            logger.info(f"Evicted {evicted} idle Whisper {self.size}/{self.compute_type} instance(s)")
+        return evicted
+
+    def stats(self):
+        with self._cond:
+            return {
+                "model_size": self.size,
+                "compute_type": self.compute_type,
+                "loaded": self._loaded,
+                "idle": len(self._idle),
+                "in_use": self._loaded - len(self._idle),
+                "max_instances": self.max_instances,
+                "cpu_threads": self.cpu_threads,
+                "memory_bytes": sum(self._memory.values()),
+                "memory_bytes_per_instance": dict(self._memory),
+                "load_seconds": round(self.load_seconds, 3)
+            }
+
+
+def _reap_forever():
+    interval = max(5.0, min(60.0, WHISPER_IDLE_TIMEOUT / 2))
+    while True:
+        time.sleep(interval)
+        with _pools_lock:
+            pools = list(_pools.values())
+        for pool in pools:
+            try:
+                pool.evict_idle()
+            except Exception as e:
+                logger.error(f"Whisper eviction failed: {str(e)}")
+
+
+def get_model_pool(model_size=None, compute_type=None):
+    global _reaper
+    key = (model_size or WHISPER_MODEL_SIZE, compute_type or WHISPER_COMPUTE_TYPE)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ModelPool(*key)
+        if _reaper is None and WHISPER_IDLE_TIMEOUT > 0:
+            _reaper = threading.Thread(target=_reap_forever, name="whisper-reaper", daemon=True)
+            _reaper.start()
+    return pool
+
+
+def warm_up(model_size=None, compute_type=None, instances=1):
+    pool = get_model_pool(model_size, compute_type)
+    pool.warm_up(instances)
+    return pool.stats()
+
+
+def model_stats():
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [pool.stats() for pool in pools]
+
+
+def transcribe_with_confidence(audio, model_size=None, compute_type=None, beam_size=None, vad_filter=None):
+    """Transcribe a file path or an already decoded audio_io.AudioBuffer."""
+    try:
+        if hasattr(audio, "float_samples"):
+            logger.debug(f"Starting Whisper processing: {audio.duration:.1f}s buffer")
+            audio = audio.float_samples()
+        else:
+            logger.debug(f"Starting Whisper processing: {audio}")
+
+            # Add explicit audio file check
+            if not os.path.exists(audio):
+                raise FileNotFoundError(f"Audio file not found: {audio}")
+            # Same decode and silence trimming as buffers from /stt
+            from audio_io import load_audio
+            with load_audio(audio) as buffer:
+                audio = buffer.float_samples()
+
+        options = decode_options(beam_size, vad_filter)
+        # As 16-bit PCM, to be comparable with the other backends
+        metrics.count_bytes("stt", "in", len(audio) * 2, backend="whisper")
+        with metrics.stage("stt", backend="whisper") as labels:
+            with get_model_pool(model_size, compute_type).acquire() as model:
+                segments, info = model.transcribe(audio, **options)
+                # segments is lazy; decode while we still hold the instance
+                transcript = " ".join([segment.text for segment in segments])
+            labels["language"] = info.language
         return transcript, info.language
-        
+
     except Exception as e:
         logger.error(f"Whisper error: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def submit(audio, **kwargs):
+    """Run transcribe_with_confidence on a bounded inference pool and return a Future.
+
+    The pool has one thread per model instance, so extra requests queue here
+    instead of piling up on the CPU.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _executor = ThreadPoolExecutor(max_workers=max(1, WHISPER_POOL_SIZE), thread_name_prefix="whisper")
+    return _executor.submit(metrics.copy_context().run, transcribe_with_confidence, audio, **kwargs)